@@ -0,0 +1,203 @@
+"""
+IVF approximate nearest-neighbour index over the ALS item factors (pure NumPy).
+
+A k-means coarse quantizer splits the items into `n_lists` inverted lists.
+A query only scans the `nprobe` lists whose centroids score best against it,
+so the per-request cost scales with nprobe / n_lists of the catalog.
+
+The index is built next to the other artifacts as ivf_ip.npz and ranks items by inner
+product, like the warm ALS recommendations it serves.
+
+Usage:
+    python ann.py build --n-lists 256
+    python ann.py report --nprobe 1,2,4,8,16 --k 10
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from scoring import ScoringEngine
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=42, chunk_size=65536):
+    """Plain Lloyd k-means. Returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    n_clusters = min(n_clusters, n)
+    centroids = vectors[rng.choice(n, n_clusters, replace=False)].copy()
+    assignments = np.zeros(n, dtype=np.int64)
+
+    for _ in range(n_iter):
+        assignments = assign(vectors, centroids, chunk_size)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        # Re-seed empty clusters with random points
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(n, int(empty.sum()), replace=False)]
+    return centroids, assign(vectors, centroids, chunk_size)
+
+
+def assign(vectors, centroids, chunk_size=65536):
+    """Nearest centroid (L2) for every vector, computed in chunks to bound memory."""
+    centroid_sq = (centroids ** 2).sum(axis=1)
+    out = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = vectors[start:start + chunk_size]
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 (||x||^2 is constant per row)
+        dist = centroid_sq[None, :] - 2.0 * block.dot(centroids.T)
+        out[start:start + chunk_size] = dist.argmin(axis=1)
+    return out
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_items, list_vectors, nprobe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_items = np.asarray(list_items, dtype=np.int64)
+        # Item vectors reordered by list so that probing a list is a contiguous slice
+        self.list_vectors = np.ascontiguousarray(list_vectors, dtype=np.float32)
+        self.nprobe = nprobe
+
+    @property
+    def n_lists(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, item_factors, n_lists=None, nprobe=8, n_iter=20, seed=42):
+        vectors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(vectors.shape[0])))
+
+        centroids, assignments = kmeans(vectors, n_lists, n_iter=n_iter, seed=seed)
+        return cls.from_assignments(centroids, assignments, vectors, nprobe=nprobe)
+
+    @classmethod
+    def reassign(cls, index, item_factors, changed=None):
+        """
+        Same centroids, lists rebuilt for new item factors (e.g. after an incremental update).
+        With `changed` (indices of items whose factors changed), only those items and the items
+        the index does not cover yet are re-assigned; the others keep their list.
+        """
+        vectors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        if changed is None:
+            assignments = assign(vectors, index.centroids)
+        else:
+            assignments = np.empty(len(vectors), dtype=np.int64)
+            assignments[index.list_items] = np.repeat(np.arange(index.n_lists), np.diff(index.list_offsets))
+            changed = np.union1d(np.asarray(changed, dtype=np.int64), np.arange(len(index.list_items), len(vectors)))
+            if len(changed):
+                assignments[changed] = assign(vectors[changed], index.centroids)
+        return cls.from_assignments(index.centroids, assignments, vectors, nprobe=index.nprobe)
+
+    @classmethod
+    def from_assignments(cls, centroids, assignments, vectors, nprobe=8):
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=centroids.shape[0])
+        list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, list_offsets, order, vectors[order], nprobe=nprobe)
+
+    def search(self, query, k=10, nprobe=None, exclude=None):
+        """
+        Approximate top-k for one query vector.
+        Returns (item_indices, scores), best first; may return fewer than k items
+        when the probed lists are small or mostly excluded.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        query = np.asarray(query, dtype=np.float32)
+        probe = ScoringEngine.top_k(self.centroids.dot(query), nprobe)
+        starts = self.list_offsets[probe]
+        stops = self.list_offsets[probe + 1]
+        positions = np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+        if not len(positions):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        items = self.list_items[positions]
+        scores = self.list_vectors[positions].dot(query)
+        if exclude is not None and len(exclude):
+            scores[np.isin(items, exclude)] = -np.inf
+
+        top = ScoringEngine.top_k(scores, k)
+        top = top[np.isfinite(scores[top])]
+        return items[top], scores[top]
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_items=self.list_items, list_vectors=self.list_vectors, nprobe=np.array(self.nprobe))
+
+    @classmethod
+    def load(cls, path, nprobe=None):
+        with np.load(path) as data:
+            return cls(data['centroids'], data['list_offsets'], data['list_items'], data['list_vectors'],
+                       nprobe=nprobe or int(data['nprobe']))
+
+
+def index_path(artifacts_dir):
+    return os.path.join(artifacts_dir, "ivf_ip.npz")
+
+
+def recall_report(item_factors, user_vectors, index, nprobes, k=10):
+    """Recall@k against exact search and mean/p95 query latency for each nprobe."""
+    engine = ScoringEngine(item_factors)
+
+    exact, exact_times = [], []
+    for u in user_vectors:
+        start = time.perf_counter()
+        top = engine.top_k(engine.score(u), k)
+        exact_times.append(time.perf_counter() - start)
+        exact.append(set(top.tolist()))
+
+    rows = [{'nprobe': 'exact', 'recall': 1.0,
+             'mean_ms': 1000 * np.mean(exact_times), 'p95_ms': 1000 * np.percentile(exact_times, 95)}]
+    for nprobe in nprobes:
+        hits, times = 0, []
+        for u, truth in zip(user_vectors, exact):
+            start = time.perf_counter()
+            items, _ = index.search(u, k, nprobe=nprobe)
+            times.append(time.perf_counter() - start)
+            hits += len(truth.intersection(items.tolist()))
+        rows.append({'nprobe': nprobe, 'recall': hits / max(1, k * len(user_vectors)),
+                     'mean_ms': 1000 * np.mean(times), 'p95_ms': 1000 * np.percentile(times, 95)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the IVF item-factor index.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--artifacts-dir", default="artifacts")
+    parser.add_argument("--n-lists", type=int, default=None, help="Defaults to sqrt(n_items).")
+    parser.add_argument("--nprobe", default="8", help="Default nprobe (build) or comma-separated list (report).")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sample-users", type=int, default=500)
+    args = parser.parse_args()
+
+    from recommender import Recommender
+    recommender = Recommender(artifacts_dir=args.artifacts_dir)
+    item_factors = recommender.engine.item_factors
+    nprobes = [int(x) for x in args.nprobe.split(',')]
+    path = index_path(args.artifacts_dir)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(item_factors, n_lists=args.n_lists, nprobe=nprobes[0])
+        index.save(path)
+        print(f"{index.n_lists} lists over {item_factors.shape[0]} items "
+              f"built in {time.perf_counter() - start:.2f}s -> {path}")
+        return
+
+    index = IVFIndex.load(path)
+    rng = np.random.default_rng(0)
+    user_factors = np.asarray(recommender.als_model.user_factors, dtype=np.float32)
+    sample = user_factors[rng.choice(len(user_factors), min(args.sample_users, len(user_factors)), replace=False)]
+    print(f"recall@{args.k} vs exact ({index.n_lists} lists, {len(sample)} queries)")
+    print(f"{'nprobe':>8} {'recall':>8} {'mean ms':>9} {'p95 ms':>9}")
+    for row in recall_report(item_factors, sample, index, nprobes, k=args.k):
+        print(f"{row['nprobe']:>8} {row['recall']:>8.3f} {row['mean_ms']:>9.3f} {row['p95_ms']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,54 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, render_template, redirect, url_for, flash, request, abort, jsonify, Response, g
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from models import db, User, Product, Interaction, CartItem, WishlistItem, Review
-from recommender import Recommender
+from models import db, User, Product, CartItem, WishlistItem, Review
+from registry import ModelRegistry
+from rec_cache import RecommendationCache, InMemoryBackend
+from catalog import CatalogBrowser, missing_indexes
+from events import InteractionLog
+from batching import RecommendationBatcher
+from search import SearchIndex, SearchPagination, catalog_records, product_record
+import instrumentation
+from instrumentation import metrics, stats_metrics
+import logging
 import os
+import threading
+import time
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev_secret_key'
 # MySQL Configuration (XAMPP default)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'mysql+pymysql://root:@localhost/beauty_reco'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Recommendation cache (per user, k and mode)
+app.config['REC_CACHE_TTL'] = 300
+app.config['REC_CACHE_SIZE'] = 4096
+# Model hot reload: versioned artifacts root (one sub-directory per version) and manual trigger token
+app.config['MODEL_ROOT'] = os.environ.get('MODEL_ROOT')
+app.config['MODEL_POLL_INTERVAL'] = 30
+app.config['RELOAD_TOKEN'] = os.environ.get('RELOAD_TOKEN')
+# Fraction of requests whose stage timings are logged as a JSON trace (logger 'recommender.trace')
+app.config['TRACE_SAMPLE_RATE'] = float(os.environ.get('TRACE_SAMPLE_RATE', 0.0))
+# Personalized scoring: 'als' or 'hybrid' (ALS + SBERT content, needs the item_embeddings artifact)
+app.config['RECOMMENDATION_MODE'] = os.environ.get('RECOMMENDATION_MODE', 'als')
+# Catalog browsing: products per page and refresh interval of the cached facets / page anchors
+app.config['PRODUCTS_PER_PAGE'] = 20
+app.config['CATALOG_CACHE_TTL'] = 600
+# Write-behind interaction logging: batch size / max seconds between flushes / queue bound
+app.config['INTERACTION_BATCH_SIZE'] = 500
+app.config['INTERACTION_FLUSH_INTERVAL'] = 1.0
+app.config['INTERACTION_QUEUE_SIZE'] = 10000
+# Events the database still rejects at shutdown are appended here and written on the next start
+app.config['INTERACTION_SPILL_PATH'] = os.environ.get(
+    'INTERACTION_SPILL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'interactions.spill.jsonl'))
+# Micro-batching of concurrent recommend calls into one GEMM: max wait (seconds) / max batch.
+# Pays off for large catalogs under concurrent load; off by default (one GEMV per request).
+app.config['RECOMMEND_BATCHING'] = os.environ.get('RECOMMEND_BATCHING', '0') == '1'
+app.config['RECOMMEND_BATCH_WINDOW'] = 0.002
+app.config['RECOMMEND_BATCH_SIZE'] = 64
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+instrumentation.TRACE_SAMPLE_RATE = app.config['TRACE_SAMPLE_RATE']
 
 # Initialize extensions
 db.init_app(app)
@@ -17,8 +56,120 @@ bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# Initialize Recommender
-recommender = Recommender()
+# Initialize Recommender (through the registry, so new model versions can be swapped in live)
+registry = ModelRegistry(root=app.config['MODEL_ROOT'], poll_interval=app.config['MODEL_POLL_INTERVAL']).start()
+
+# Each model version scores through its own batcher; the old one finishes its queue and stops
+def attach_batcher(old, new):
+    if old is not None and old.engine.batcher is not None:
+        old.engine.batcher.stop()
+    if app.config['RECOMMEND_BATCHING']:
+        new.engine.attach_batcher(RecommendationBatcher(new.engine, window=app.config['RECOMMEND_BATCH_WINDOW'],
+                                                        max_batch=app.config['RECOMMEND_BATCH_SIZE']).start())
+
+attach_batcher(None, registry.current)
+registry.add_listener(attach_batcher)
+
+# Initialize Recommendation Cache (swap the backend for a shared store with multiple workers)
+rec_cache = RecommendationCache(InMemoryBackend(max_entries=app.config['REC_CACHE_SIZE']),
+                                ttl=app.config['REC_CACHE_TTL'])
+# Cached recommendations were produced by the previous model version
+registry.add_listener(lambda old, new: rec_cache.invalidate_all())
+
+# Interaction events are buffered and written in batches by a background thread
+events = InteractionLog(app, batch_size=app.config['INTERACTION_BATCH_SIZE'],
+                        flush_interval=app.config['INTERACTION_FLUSH_INTERVAL'],
+                        max_queue=app.config['INTERACTION_QUEUE_SIZE'],
+                        spill_path=app.config['INTERACTION_SPILL_PATH']).start()
+
+# New events update the user's live profile in place (profiles of the serving model version)
+events.add_listener(lambda event: registry.current.profiles.record(event))
+
+def live_profile(recommender, user_id):
+    """
+    The user's live profile; rebuilt from their recent interactions on a miss, and caught up
+    with rows other worker processes wrote (at most once every profiles.refresh_interval seconds).
+    """
+    profiles = recommender.profiles
+    return profiles.get(user_id, lambda: events.recent_interactions(user_id, limit=20),
+                        newer=lambda after_id: events.interactions_after(user_id, after_id,
+                                                                         limit=profiles.max_items))
+
+def owned_asins(user_id):
+    """ASINs in the user's cart or wishlist (never recommended back to them)."""
+    rows = (db.session.query(CartItem.product_asin).filter_by(user_id=user_id)
+            .union(db.session.query(WishlistItem.product_asin).filter_by(user_id=user_id)).all())
+    return [asin for asin, in rows]
+
+def personalized(recommender, user, k, profile, category=None, brand=None):
+    exclude_asins = owned_asins(user.id)
+    if app.config['RECOMMENDATION_MODE'] == 'hybrid':
+        return recommender.recommend_hybrid(user.username, k=k, profile=profile, category=category, brand=brand,
+                                            exclude_asins=exclude_asins)
+    return recommender.recommend(user.username, k=k, profile=profile, category=category, brand=brand,
+                                 exclude_asins=exclude_asins)
+
+# Export cache / hydration / registry / event log / batcher state on /metrics
+def collect_app_metrics():
+    yield from stats_metrics('rec_cache', rec_cache.stats())
+    yield from stats_metrics('product_cache', registry.current.products.stats())
+    info = registry.metrics()
+    yield 'model_reloads_total', 'counter', {}, info['reloads']
+    yield 'model_reload_failures_total', 'counter', {}, info['failures']
+    yield 'model_last_load_seconds', 'gauge', {}, info['last_load_s']
+    yield 'model_last_warmup_seconds', 'gauge', {}, info['last_warmup_s']
+    yield 'model_info', 'gauge', {'version': info['version']}, 1
+    yield from stats_metrics('interaction_log', events.stats(), gauges=('queued',))
+    yield from stats_metrics('live_profiles', registry.current.profiles.stats())
+    batcher = registry.current.engine.batcher
+    if batcher is not None:
+        yield from stats_metrics('recommend_batcher', batcher.stats(),
+                                 gauges=('queue_depth', 'mean_batch_size', 'largest_batch'))
+
+metrics.register_collector(collect_app_metrics)
+
+# Product search index (built on first search, from the products table + item metadata)
+search_index = None
+search_lock = threading.Lock()
+
+def get_search_index():
+    global search_index
+    if search_index is None:
+        with search_lock:
+            if search_index is None:
+                search_index = SearchIndex.build(catalog_records(registry.current.catalog, db.session))
+    return search_index
+
+def index_product(product):
+    """Make a newly inserted Product searchable and count it in the category facets."""
+    if product is None:
+        return
+    if search_index is not None:
+        search_index.add(product_record(product))
+    catalog.product_added(product)
+
+# Rebuild lazily against the new model's metadata
+def reset_search_index(old, new):
+    global search_index
+    search_index = None
+
+registry.add_listener(reset_search_index)
+
+# Category facets and keyset page anchors for /products
+catalog = CatalogBrowser(per_page=app.config['PRODUCTS_PER_PAGE'], ttl=app.config['CATALOG_CACHE_TTL'])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    instrumentation.start_trace(request.endpoint or request.path)
+
+@app.after_request
+def record_request_time(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        metrics.observe('http_request_seconds', time.perf_counter() - start, endpoint=request.endpoint or 'unknown')
+    instrumentation.end_trace()
+    return response
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -31,20 +182,16 @@ def inject_user():
 
 @app.route('/')
 def index():
+    recommender = registry.current
     recommendations = []
     if current_user.is_authenticated:
-        # Fetch recent interactions for Live Recommendations
-        recent_interactions = Interaction.query.filter_by(user_id=current_user.id)\
-            .order_by(Interaction.timestamp.desc())\
-            .limit(20).all()
-        recent_asins = [i.product_asin for i in recent_interactions]
-        
-        if recent_asins:
-            print(f"DEBUG: User {current_user.username} has interactions: {recent_asins[:5]}...")
-            recommendations = recommender.recommend(current_user.username, recent_asins=recent_asins, k=8)
-            print(f"DEBUG: Generated {len(recommendations)} recommendations.")
-        else:
-            print("DEBUG: No recent interactions found for user.")
+        def compute():
+            # Live profile (recent interactions), kept up to date as events are logged
+            profile = live_profile(recommender, current_user.id)
+            if profile.asins:
+                return personalized(recommender, current_user, k=8, profile=profile)
+            return []
+        recommendations = rec_cache.get_or_compute(current_user.id, 8, 'home', compute)
     
     # Cold start / Popular items for homepage (always shown as Trending)
     products = recommender.get_cold_start_items(12)
@@ -99,16 +246,18 @@ def logout():
 
 @app.route('/recommend')
 def recommend():
+    recommender = registry.current
     if current_user.is_authenticated:
-        # Fetch recent interactions (Live Data)
-        recent_interactions = Interaction.query.filter_by(user_id=current_user.id)\
-            .order_by(Interaction.timestamp.desc())\
-            .limit(20).all()
-        
-        recent_asins = [i.product_asin for i in recent_interactions]
-        
-        # Personalized recommendations
-        products = recommender.recommend(current_user.username, recent_asins=recent_asins, k=12)
+        # Optional constraints, e.g. /recommend?category=All+Beauty&brand=Olay (masked top-k, still personalized)
+        category = request.args.get('category') or None
+        brand = request.args.get('brand') or None
+        mode = ('recommend', category, brand) if category or brand else 'recommend'
+        def compute():
+            # Live profile (Live Data)
+            profile = live_profile(recommender, current_user.id)
+            # Personalized recommendations
+            return personalized(recommender, current_user, k=12, profile=profile, category=category, brand=brand)
+        products = rec_cache.get_or_compute(current_user.id, 12, mode, compute)
         return render_template('recommend.html', products=products, title="Your Recommendations")
         flash('Log in to see personalized recommendations!', 'info')
         return render_template('index.html', products=products, title="Popular Products")
@@ -119,25 +268,38 @@ def products():
     search_query = request.args.get('q', '')
     category = request.args.get('category', '')
     
-    query = Product.query
+    per_page = app.config['PRODUCTS_PER_PAGE']
     
-    if search_query:
-        query = query.filter(Product.title.ilike(f'%{search_query}%'))
-        
-    if category:
-        query = query.filter(Product.main_cat == category)
-        
-    # Fetch unique categories for filter
-    categories = [r[0] for r in db.session.query(Product.main_cat).distinct().order_by(Product.main_cat).all() if r[0]]
+    # Categories for the filter, with product counts (cached)
+    facets = catalog.facets()
+    categories = [main_cat for main_cat, _ in facets]
     
-    # Fetch paginated products from DB
-    products_pagination = query.order_by(Product.popularity.desc()).paginate(page=page, per_page=20)
+    if search_query:
+        # Ranked full-text search (BM25 + popularity), then hydrate only the requested page
+        asins = get_search_index().search(search_query, main_cat=category or None)
+        page = max(page, 1)
+        page_asins = asins[(page - 1) * per_page:page * per_page]
+        items = registry.current.get_product_details(page_asins)
+        products_pagination = SearchPagination(items, page, per_page, len(asins))
+    else:
+        # Keyset page on (popularity, asin): no COUNT(*) or OFFSET scan
+        products_pagination = catalog.page(page, main_cat=category or None)
     
     return render_template('products.html', products=products_pagination, title="Shop All",
-                           categories=categories, current_category=category, search_query=search_query)
+                           categories=categories, category_counts=dict(facets),
+                           current_category=category, search_query=search_query)
+
+@app.route('/products/suggest')
+def products_suggest():
+    """Typeahead: best matches for a partial query (the last word is matched as a prefix)."""
+    search_query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    asins = get_search_index().search(search_query, main_cat=request.args.get('category') or None, limit=limit)
+    return jsonify([{'asin': p['asin'], 'title': p['title']} for p in registry.current.get_product_details(asins)])
 
 @app.route('/product/<asin>')
 def product_detail(asin):
+    recommender = registry.current
     # Ensure product exists in DB (Lazy Loading) to satisfy Foreign Key
     product_db = Product.query.get(asin)
     if not product_db:
@@ -156,16 +318,15 @@ def product_detail(asin):
             try:
                 db.session.add(product_db)
                 db.session.commit()
+                index_product(product_db)
             except Exception as e:
                 db.session.rollback()
                 print(f"Error adding product to DB: {e}")
 
-    # Log interaction
-    # Log interaction
+    # Log interaction (written in the background)
     if current_user.is_authenticated and product_db:
-        interaction = Interaction(user_id=current_user.id, product_asin=asin, interaction_type='view')
-        db.session.add(interaction)
-        db.session.commit()
+        events.log(current_user.id, asin, 'view')
+        rec_cache.invalidate(current_user.id)
     
     # Get product details (using recommender helper)
     products = recommender.get_product_details([asin])
@@ -200,18 +361,12 @@ def add_review(asin):
         comment=comment
     )
     db.session.add(review)
+    db.session.commit()
     
     # If high rating, count as implicit Positive Interaction
     if rating >= 4:
-        # Create interaction
-        interaction = Interaction(
-             user_id=current_user.id,
-             product_asin=asin,
-             interaction_type='like'
-        )
-        db.session.add(interaction)
-        
-    db.session.commit()
+        events.log(current_user.id, asin, 'like')
+        rec_cache.invalidate(current_user.id)
     flash('Thank you for your review!', 'success')
     return redirect(url_for('product_detail', asin=asin))
 
@@ -225,6 +380,7 @@ def cart():
 @app.route('/add_to_cart/<asin>')
 @login_required
 def add_to_cart(asin):
+    recommender = registry.current
     # Check if item exists in cart
     item = CartItem.query.filter_by(user_id=current_user.id, product_asin=asin).first()
     if item:
@@ -240,12 +396,14 @@ def add_to_cart(asin):
                 prod = Product(asin=asin, title=p_info.get('title'), image_url=p_info.get('image_url'))
                 db.session.add(prod)
                 db.session.commit()
+                index_product(prod)
         
         if prod:
             item = CartItem(user_id=current_user.id, product_asin=asin)
             db.session.add(item)
     
     db.session.commit()
+    rec_cache.invalidate(current_user.id)
     flash('Item added to cart', 'success')
     return redirect(request.referrer or url_for('products'))
 
@@ -256,6 +414,7 @@ def remove_from_cart(id):
     if item.user_id == current_user.id:
         db.session.delete(item)
         db.session.commit()
+        rec_cache.invalidate(current_user.id)
         flash('Item removed from cart', 'info')
     return redirect(url_for('cart'))
 
@@ -268,6 +427,7 @@ def wishlist():
 @app.route('/add_to_wishlist/<asin>')
 @login_required
 def add_to_wishlist(asin):
+    recommender = registry.current
     exists = WishlistItem.query.filter_by(user_id=current_user.id, product_asin=asin).first()
     if not exists:
         # Ensure product exists
@@ -279,17 +439,32 @@ def add_to_wishlist(asin):
                  prod = Product(asin=asin, title=p_info.get('title'), image_url=p_info.get('image_url'))
                  db.session.add(prod)
                  db.session.commit()
+                 index_product(prod)
         
         if prod:
             item = WishlistItem(user_id=current_user.id, product_asin=asin)
             db.session.add(item)
             db.session.commit()
+            rec_cache.invalidate(current_user.id)
             flash('Added to wishlist', 'success')
     else:
         flash('Already in wishlist', 'info')
         
     return redirect(request.referrer or url_for('products'))
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # Disabled unless a token is configured
+    token = app.config['RELOAD_TOKEN']
+    if not token or request.headers.get('X-Reload-Token') != token:
+        abort(403)
+    started = registry.reload()
+    return jsonify(started=started, **registry.metrics())
+
 @app.route('/remove_from_wishlist/<int:id>')
 @login_required
 def remove_from_wishlist(id):
@@ -297,12 +472,19 @@ def remove_from_wishlist(id):
     if item.user_id == current_user.id:
         db.session.delete(item)
         db.session.commit()
+        rec_cache.invalidate(current_user.id)
         flash('Item removed from wishlist', 'info')
     return redirect(url_for('wishlist'))
 
 # Setup Database
 with app.app_context():
     db.create_all()
+    # create_all() does not add new indexes to existing tables (see catalog.py)
+    missing = missing_indexes(db.engine)
+    if missing:
+        logging.getLogger(__name__).warning(
+            "Missing product indexes %s: /products pages scan the table; run `python catalog.py create-indexes`",
+            ", ".join(missing))
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,233 @@
+"""
+Micro-batching of concurrent recommend calls into one GEMM.
+
+    batcher = RecommendationBatcher(engine, window=0.002, max_batch=64).start()
+    engine.attach_batcher(batcher)      # engine.recommend() now goes through it
+    items = engine.recommend(user_vector, k=10, exclude=seen)           # from a thread
+    items = await batcher.recommend_async(user_vector, k=10, exclude=seen)  # from an asyncio task
+
+Each call enqueues its user vector and waits. A worker thread takes the first waiting
+request, collects whatever else arrives within `window` seconds (up to `max_batch`),
+scores the whole block as one (batch, factors) x (factors, items) product, masks each
+row's excluded items and hands every caller its own top-k. One pass over the item
+factors then serves the whole batch instead of one pass per request. Batches smaller
+than `min_gemm_batch` are scored with matrix-vector products, which are faster there.
+
+A request never waits longer than `window` for others to arrive. When the previous
+batch was a single request (low traffic) nothing is waited for at all: the batch is
+just whatever queued up meanwhile. A call made after stop() is scored inline, so
+callers holding an old model version still finish.
+
+Usage:
+    python batching.py bench --items 100000 --threads 16 --requests 2000
+"""
+import argparse
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from instrumentation import metrics, span
+
+logger = logging.getLogger(__name__)
+
+metrics.describe('recommender_batch_size', 'Requests scored together in one micro-batch.')
+metrics.set_buckets('recommender_batch_size', (1, 2, 4, 8, 16, 32, 64, 128, 256))
+metrics.describe('recommender_batch_wait_seconds', 'Time a request waited in the micro-batch queue.')
+
+
+class PendingRequest:
+    __slots__ = ('vector', 'k', 'exclude', 'future', 'enqueued_at')
+
+    def __init__(self, vector, k, exclude):
+        self.vector = np.asarray(vector, dtype=np.float32)
+        self.k = int(k)
+        self.exclude = np.empty(0, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class RecommendationBatcher:
+    def __init__(self, engine, window=0.002, max_batch=64, min_gemm_batch=4):
+        self.engine = engine
+        self.window = window
+        self.max_batch = max_batch
+        self.min_gemm_batch = min_gemm_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.inline = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="recommend-batcher", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=5.0):
+        """Score everything still queued and stop the worker."""
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, user_vector, k=10, exclude=None):
+        """Queue one request; returns a concurrent.futures.Future of its top-k item indices."""
+        request = PendingRequest(user_vector, k, exclude)
+        with self._lock:
+            if not self._stopped:
+                self._queue.put(request)
+                return request.future
+        # Stopped (e.g. this model version was replaced): score on the caller's thread
+        self.inline += 1
+        self._score([request])
+        return request.future
+
+    def recommend(self, user_vector, k=10, exclude=None):
+        """Top-k item indices for one user vector; blocks until its batch has been scored."""
+        return self.submit(user_vector, k, exclude).result()
+
+    async def recommend_async(self, user_vector, k=10, exclude=None):
+        return await asyncio.wrap_future(self.submit(user_vector, k, exclude))
+
+    def _run(self):
+        stopping = False
+        last_size = 0
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.monotonic() + (self.window if last_size > 1 else 0)
+            while len(batch) < self.max_batch:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+            self._score(batch)
+            last_size = len(batch)
+        # Requests queued right before stop()
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                self._score([request])
+
+    def _score(self, batch):
+        now = time.perf_counter()
+        for request in batch:
+            metrics.observe('recommender_batch_wait_seconds', now - request.enqueued_at)
+        metrics.observe('recommender_batch_size', len(batch))
+        self.requests += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            if len(batch) >= self.min_gemm_batch:
+                with span('batch_scoring'):
+                    scores = self.engine.score_batch(np.stack([r.vector for r in batch]))
+            else:
+                # A GEMM with only a couple of rows is slower than the matrix-vector products
+                with span('scoring'):
+                    scores = [self.engine.score(r.vector) for r in batch]
+        except Exception as e:
+            logger.exception("Scoring a batch of %d requests failed", len(batch))
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        # Row by row, so each caller is released as soon as its own top-k is ready
+        for row, request in enumerate(batch):
+            try:
+                self.engine.mask(scores[row], request.exclude)
+                request.future.set_result(self.engine.top_k(scores[row], request.k))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'inline': self.inline,
+        }
+
+
+def benchmark(n_items=100000, factors=64, n_threads=16, n_requests=2000, k=10, window=0.002, max_batch=64,
+              seed=0):
+    """Throughput of concurrent engine.recommend calls, one GEMV each vs micro-batched."""
+    from scoring import ScoringEngine
+
+    rng = np.random.default_rng(seed)
+    engine = ScoringEngine(rng.normal(0, 0.1, (n_items, factors)).astype(np.float32))
+    vectors = rng.normal(0, 0.1, (n_requests, factors)).astype(np.float32)
+    excludes = [rng.choice(n_items, 20, replace=False) for _ in range(n_requests)]
+
+    def run(fn):
+        latencies = [0.0] * n_requests
+
+        def worker(offset):
+            for i in range(offset, n_requests, n_threads):
+                t0 = time.perf_counter()
+                fn(vectors[i], k, excludes[i])
+                latencies[i] = time.perf_counter() - t0
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        return {'rps': n_requests / elapsed, 'p50_ms': 1000 * float(np.percentile(latencies, 50)),
+                'p99_ms': 1000 * float(np.percentile(latencies, 99))}
+
+    single = run(engine.recommend)
+    batcher = RecommendationBatcher(engine, window=window, max_batch=max_batch).start()
+    batched = run(batcher.recommend)
+    batcher.stop()
+    return {'single': single, 'batched': batched, **batcher.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching tools.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    args = parser.parse_args()
+
+    r = benchmark(args.items, args.factors, args.threads, args.requests,
+                  window=args.window_ms / 1000, max_batch=args.max_batch)
+    print(f"{args.items} items, {args.threads} threads, {args.requests} requests")
+    for name in ('single', 'batched'):
+        print(f"{name:>8}: {r[name]['rps']:8.0f} req/s  p50 {r[name]['p50_ms']:7.2f} ms  "
+              f"p99 {r[name]['p99_ms']:7.2f} ms")
+    print(f"mean batch {r['mean_batch_size']:.1f}, largest {r['largest_batch']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Latency benchmark for every Recommender path on synthetic data (runs fully offline).
+
+For each scale point (users x items x factors) synthetic artifacts and a SQLite
+products table are generated, a Recommender is loaded, and each path is timed:
+
+    recommend_warm        recommend() for users known to the model
+    recommend_live        recommend() for unknown users with session history
+    recommend_from_history
+    recommend_by_category
+    get_cold_start_items
+
+Reported per path: p50/p95/p99 latency, throughput and peak traced memory.
+Results are saved as JSON; pass --compare with an earlier file to flag regressions.
+
+Usage:
+    python benchmark.py --scales 2000x1000x64,20000x10000x64 --out bench.json
+    python benchmark.py --scales 2000x1000x64 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+import synthetic
+
+PATHS = ('recommend_warm', 'recommend_live', 'recommend_from_history',
+         'recommend_by_category', 'get_cold_start_items')
+
+
+def parse_scales(text):
+    scales = []
+    for part in text.split(','):
+        users, items, factors = (int(x) for x in part.lower().split('x'))
+        scales.append((users, items, factors))
+    return scales
+
+
+def make_calls(recommender, rng, n_calls, k=10, history=5):
+    """One zero-argument callable per timed call, for every path."""
+    user_ids = recommender.user_ids.ids
+    item_ids = recommender.item_ids.ids
+
+    def history_sample():
+        return [item_ids[i] for i in rng.choice(len(item_ids), history, replace=False)]
+
+    calls = {}
+    users = rng.choice(len(user_ids), n_calls)
+    calls['recommend_warm'] = [lambda u=user_ids[u]: recommender.recommend(u, k=k) for u in users]
+    calls['recommend_live'] = [lambda h=history_sample(): recommender.recommend("__bench_new_user__", recent_asins=h, k=k)
+                               for _ in range(n_calls)]
+    calls['recommend_from_history'] = [lambda h=history_sample(): recommender.recommend_from_history(h, k=k)
+                                       for _ in range(n_calls)]
+    calls['recommend_by_category'] = [lambda h=history_sample(): recommender.recommend_by_category(h, k=k)
+                                      for _ in range(n_calls)]
+    calls['get_cold_start_items'] = [lambda: recommender.get_cold_start_items(k) for _ in range(n_calls)]
+    return calls
+
+
+def time_path(calls, warmup=5, memory_calls=20):
+    for fn in calls[:warmup]:
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    for fn in calls:
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+
+    # Peak memory is traced on a separate short pass (tracemalloc slows the calls down)
+    tracemalloc.start()
+    for fn in calls[:memory_calls]:
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ms = np.array(latencies) * 1000
+    return {
+        'calls': len(calls),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'throughput_rps': len(calls) / total if total > 0 else float('inf'),
+        'peak_mem_kb': peak / 1024.0,
+    }
+
+
+def run_scale(users, items, factors, n_calls=200, seed=0, paths=PATHS):
+    from recommender import Recommender
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifacts = os.path.join(tmp, "artifacts")
+        meta = synthetic.generate(artifacts, users, items, factors, seed=seed)
+        app = synthetic.populate_products(meta, f"sqlite:///{os.path.join(tmp, 'products.db')}")
+
+        # Keep stray output from the recommender out of the report
+        with app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            load_start = time.perf_counter()
+            recommender = Recommender(artifacts_dir=artifacts)
+            load_s = time.perf_counter() - load_start
+            calls = make_calls(recommender, np.random.default_rng(seed), n_calls)
+            results = {path: time_path(calls[path]) for path in paths}
+    return {'users': users, 'items': items, 'factors': factors, 'load_s': load_s, 'paths': results}
+
+
+def compare(current, baseline, threshold=0.2):
+    """Print p95 changes vs a baseline run; returns the number of regressions above `threshold`."""
+    def key(r):
+        return (r['users'], r['items'], r['factors'])
+    base = {key(r): r for r in baseline['results']}
+    regressions = 0
+    for r in current['results']:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        for path, stats in r['paths'].items():
+            if path not in b['paths']:
+                continue
+            old, new = b['paths'][path]['p95_ms'], stats['p95_ms']
+            change = (new - old) / old if old > 0 else 0.0
+            flag = "REGRESSION" if change > threshold else ""
+            regressions += bool(flag)
+            print(f"{'x'.join(map(str, key(r))):>18} {path:<24} p95 {old:8.3f} -> {new:8.3f} ms "
+                  f"({change:+.0%}) {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Recommender paths on synthetic data.")
+    parser.add_argument("--scales", default="2000x1000x64,20000x10000x64",
+                        help="Comma-separated users x items x factors points.")
+    parser.add_argument("--calls", type=int, default=200, help="Timed calls per path.")
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--out", default=None, help="Write results JSON here.")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare p95 latencies against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative p95 increase flagged as regression.")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    report = {
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': [],
+    }
+    print(f"{'scale':>18} {'path':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>9} {'peak KB':>9}")
+    for users, items, factors in parse_scales(args.scales):
+        result = run_scale(users, items, factors, n_calls=args.calls, paths=args.paths.split(','))
+        report['results'].append(result)
+        for path, s in result['paths'].items():
+            print(f"{f'{users}x{items}x{factors}':>18} {path:<24} {s['p50_ms']:>8.3f} {s['p95_ms']:>8.3f} "
+                  f"{s['p99_ms']:>8.3f} {s['throughput_rps']:>9.0f} {s['peak_mem_kb']:>9.0f}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            raise SystemExit(f"{regressions} path(s) regressed by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
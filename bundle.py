@@ -0,0 +1,288 @@
+"""
+Pickle-free, memory-mappable artifact bundle.
+
+A bundle is a directory holding a JSON manifest plus raw .npy arrays:
+
+    manifest.json            format/model version, config, array index
+    user_factors.npy         float32 (n_users, f)
+    item_factors.npy         float32 (n_items, f)
+    item_factors_norm.npy    float32 (n_items, f) L2-normalized rows
+    train_indptr.npy         CSR train_matrix
+    train_indices.npy
+    train_data.npy
+    user_ids.npy             fixed-width unicode id tables (index -> id)
+    item_ids.npy
+    recent_items.npy         int64 popularity list (cold start)
+    items_metadata.parquet   copied as-is
+
+Arrays are opened with np.load(mmap_mode='r'), so every worker process maps the
+same files and shares their pages through the OS page cache. A bundle is never
+modified once written, so a version can hard-link the files it shares with the
+version it was derived from (see incremental.py).
+
+Usage:
+    python bundle.py convert --src artifacts --dst artifacts_bundle
+    python bundle.py compare --src artifacts --dst artifacts_bundle
+"""
+import argparse
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+import scipy.sparse
+
+from idmap import IdMap
+from scoring import ScoringEngine
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+COPIED_FILES = ("items_metadata.parquet", "ivf_ip.npz", "item_embeddings.npy", "item_embeddings_scales.npy",
+                "quantized_ip.npz")
+
+
+class FactorModel:
+    """Minimal stand-in for the pickled implicit model: just the factor matrices."""
+
+    def __init__(self, user_factors, item_factors, **params):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        for name, value in params.items():
+            setattr(self, name, value)
+
+    @property
+    def factors(self):
+        return self.item_factors.shape[1]
+
+
+class ArtifactBundle:
+    def __init__(self, path, manifest, arrays):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+
+    @property
+    def version(self):
+        return self.manifest.get('model_version')
+
+    @property
+    def config(self):
+        return dict(self.manifest.get('config', {}))
+
+    @property
+    def model(self):
+        return FactorModel(self.arrays['user_factors'], self.arrays['item_factors'],
+                           **self.manifest.get('model_params', {}))
+
+    @property
+    def train_matrix(self):
+        a = self.arrays
+        return scipy.sparse.csr_matrix((a['train_data'], a['train_indices'], a['train_indptr']),
+                                       shape=tuple(self.manifest['train_shape']), copy=False)
+
+    @property
+    def user_ids(self):
+        return self.arrays['user_ids']
+
+    @property
+    def item_ids(self):
+        return self.arrays['item_ids']
+
+    @property
+    def recent_items(self):
+        return self.arrays['recent_items'].tolist()
+
+
+def is_bundle(path):
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+
+def load_bundle(path, mmap_mode='r'):
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported bundle format {manifest.get('format_version')} in {path}")
+    arrays = {name: np.load(os.path.join(path, spec['file']), mmap_mode=mmap_mode, allow_pickle=False)
+              for name, spec in manifest['arrays'].items()}
+    return ArtifactBundle(path, manifest, arrays)
+
+
+def link_or_copy(src, dst):
+    """Hard-link an immutable file into another bundle (a copy across filesystems)."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+# The model arrays of an artifacts directory, without the serving state a Recommender builds on top
+ModelState = namedtuple('ModelState', ['version', 'model', 'train_matrix', 'user_ids', 'item_ids',
+                                       'recent_items', 'config', 'item_factors_norm'])
+
+
+def load_model(path, mmap_mode='r'):
+    """ModelState of a bundle (memory-mapped) or of a legacy pickle-based artifacts directory."""
+    if is_bundle(path):
+        bundle = load_bundle(path, mmap_mode=mmap_mode)
+        return ModelState(bundle.version, bundle.model, bundle.train_matrix, IdMap(bundle.user_ids),
+                          IdMap(bundle.item_ids), bundle.recent_items, bundle.config,
+                          bundle.arrays.get('item_factors_norm'))
+
+    def load_pickle(name):
+        with open(os.path.join(path, name), "rb") as f:
+            return pickle.load(f)
+
+    return ModelState(None, load_pickle("als_weighted.pkl"),
+                      scipy.sparse.load_npz(os.path.join(path, "train_matrix.npz")),
+                      IdMap.from_encoder(load_pickle("user_encoder.pkl")),
+                      IdMap.from_encoder(load_pickle("item_encoder.pkl")),
+                      load_pickle("recent_items.pkl"), load_pickle("config.pkl"), None)
+
+
+def write_bundle(dst, user_factors, item_factors, train_matrix, user_ids, item_ids, recent_items,
+                 config, model_params=None, model_version=None, extra_files=(), item_factors_norm=None,
+                 link_from=None):
+    """
+    Write a bundle directory. The manifest is written last, so a half-written bundle is never loadable.
+    With `link_from` (another bundle), arrays passed as None and the `extra_files` are hard-linked from it
+    instead of written, so versions share the files they do not change. Bundles are never modified in place.
+    """
+    os.makedirs(dst, exist_ok=True)
+    train_matrix = scipy.sparse.csr_matrix(train_matrix)
+    if item_factors is not None and item_factors_norm is None:
+        item_factors_norm = ScoringEngine.normalize_rows(np.asarray(item_factors, dtype=np.float32))
+    arrays = {
+        'user_factors': None if user_factors is None else np.ascontiguousarray(user_factors, dtype=np.float32),
+        'item_factors': None if item_factors is None else np.ascontiguousarray(item_factors, dtype=np.float32),
+        'item_factors_norm': None if item_factors_norm is None else np.ascontiguousarray(item_factors_norm,
+                                                                                          dtype=np.float32),
+        'train_indptr': train_matrix.indptr,
+        'train_indices': train_matrix.indices,
+        'train_data': train_matrix.data,
+        'user_ids': None if user_ids is None else np.asarray(user_ids).astype(str),
+        'item_ids': None if item_ids is None else np.asarray(item_ids).astype(str),
+        'recent_items': None if recent_items is None else np.asarray(recent_items, dtype=np.int64),
+    }
+    linked = {}
+    if link_from is not None:
+        with open(os.path.join(link_from, MANIFEST)) as f:
+            linked = json.load(f)['arrays']
+    index = {}
+    for name, array in arrays.items():
+        if array is None:
+            if name not in linked:
+                raise ValueError(f"No '{name}' array given and none to link from")
+            index[name] = linked[name]
+            link_or_copy(os.path.join(link_from, linked[name]['file']), os.path.join(dst, linked[name]['file']))
+            continue
+        np.save(os.path.join(dst, f"{name}.npy"), array, allow_pickle=False)
+        index[name] = {'file': f"{name}.npy", 'dtype': str(array.dtype), 'shape': list(array.shape)}
+
+    for src in extra_files:
+        if os.path.exists(src):
+            target = os.path.join(dst, os.path.basename(src))
+            if link_from is not None:
+                link_or_copy(src, target)
+            else:
+                shutil.copy2(src, target)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'model_version': model_version or time.strftime("%Y%m%d%H%M%S"),
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'config': config,
+        'model_params': model_params or {},
+        'train_shape': list(train_matrix.shape),
+        'arrays': index,
+    }
+    tmp = os.path.join(dst, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(dst, MANIFEST))
+    return manifest
+
+
+def convert(src, dst, model_version=None):
+    """Convert a legacy pickle-based artifacts directory into a bundle."""
+    def load_pickle(name):
+        with open(os.path.join(src, name), "rb") as f:
+            return pickle.load(f)
+
+    model = load_pickle("als_weighted.pkl")
+    recent_items = load_pickle("recent_items.pkl")
+    params = {name: getattr(model, name) for name in ('regularization', 'alpha', 'iterations')
+              if isinstance(getattr(model, name, None), (int, float))}
+    return write_bundle(
+        dst,
+        user_factors=model.user_factors,
+        item_factors=model.item_factors,
+        train_matrix=scipy.sparse.load_npz(os.path.join(src, "train_matrix.npz")),
+        user_ids=load_pickle("user_encoder.pkl").classes_,
+        item_ids=load_pickle("item_encoder.pkl").classes_,
+        recent_items=[int(i) for i in recent_items],
+        config=load_pickle("config.pkl"),
+        model_params=params,
+        model_version=model_version,
+        extra_files=[os.path.join(src, name) for name in COPIED_FILES],
+    )
+
+
+def resident_memory_mb():
+    """Current resident set size in MB (Linux /proc, falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def measure(path):
+    """Load a Recommender from `path` and report load time and RSS growth as JSON."""
+    import warnings
+    warnings.filterwarnings("ignore")
+    import contextlib
+    import io
+    from recommender import Recommender
+
+    before = resident_memory_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        Recommender(artifacts_dir=path)
+    elapsed = time.perf_counter() - start
+    return {'path': path, 'load_s': elapsed, 'rss_mb': resident_memory_mb() - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and benchmark artifact bundles.")
+    parser.add_argument("command", choices=["convert", "compare", "measure"])
+    parser.add_argument("--src", default="artifacts")
+    parser.add_argument("--dst", default="artifacts_bundle")
+    parser.add_argument("--model-version", default=None)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        manifest = convert(args.src, args.dst, model_version=args.model_version)
+        print(f"Wrote bundle version {manifest['model_version']} to {args.dst}")
+    elif args.command == "measure":
+        print(json.dumps(measure(args.src)))
+    else:
+        # Each format is measured in a fresh interpreter so imports and caches don't leak between runs
+        print(f"{'format':<8} {'load s':>8} {'RSS MB':>8}  path")
+        for label, path in (("legacy", args.src), ("bundle", args.dst)):
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "measure", "--src", path],
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{label:<8} {result['load_s']:>8.3f} {result['rss_mb']:>8.1f}  {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Catalog browsing for /products: cached category facets and keyset pagination.
+
+Category names and per-category counts come from one GROUP BY query that is cached
+and updated in place when products are inserted, instead of a SELECT DISTINCT per hit.
+
+Pages are ordered by (popularity DESC, asin DESC) and fetched by key range instead of
+OFFSET: the first key of every page ("anchors") is collected once per category, and page
+p is the rows between anchor p and anchor p+1, at most `per_page` of them. Each page
+request is then one range read on the (main_cat, popularity, asin) index, so latency
+does not grow with the page number. The anchors come from one ROW_NUMBER() window query
+that returns only every per_page-th key, so building them transfers rows / per_page keys
+(the database still walks the index once).
+
+A product inserted after the anchors were built lands inside an existing page's range.
+That page would then hold more than per_page rows and push its last row out of view, so
+anchors are rebuilt: when this process inserts the product (product_added), when a page
+read finds more than per_page rows in its range (an insert by another worker) and after
+`ttl` seconds.
+
+The pagination indexes are declared on models.Product, but db.create_all() does not add
+indexes to a table that already exists. On an existing database run
+`python catalog.py create-indexes`, or the equivalent DDL:
+
+    CREATE INDEX ix_products_popularity_asin ON products (popularity, asin);
+    CREATE INDEX ix_products_main_cat_popularity_asin ON products (main_cat, popularity, asin);
+
+Assumes products.popularity is not NULL (the model defaults it to 0).
+
+Usage:
+    python catalog.py bench --items 200000
+    python catalog.py create-indexes --database-uri mysql+pymysql://root:@localhost/beauty_reco
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import func, tuple_
+
+from search import SearchPagination
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogBrowser:
+    def __init__(self, per_page=20, ttl=600, clock=time.monotonic):
+        self.per_page = per_page
+        self.ttl = ttl
+        self.clock = clock
+        self._counts = None       # main_cat -> product count
+        self._counts_at = 0.0
+        self._anchors = {}        # main_cat (None = whole catalog) -> (loaded_at, rows, [(popularity, asin)])
+        self._lock = threading.Lock()
+
+    def _expired(self, loaded_at):
+        return self.ttl is not None and self.clock() - loaded_at > self.ttl
+
+    def facets(self):
+        """[(main_cat, count)] sorted by name."""
+        from models import db, Product
+
+        with self._lock:
+            counts = self._counts
+            if counts is not None and not self._expired(self._counts_at):
+                return sorted(counts.items())
+        rows = db.session.query(Product.main_cat, func.count(Product.asin)).group_by(Product.main_cat).all()
+        counts = {main_cat: n for main_cat, n in rows if main_cat}
+        with self._lock:
+            self._counts = counts
+            self._counts_at = self.clock()
+        return sorted(counts.items())
+
+    def categories(self):
+        return [main_cat for main_cat, _ in self.facets()]
+
+    def anchors(self, main_cat=None):
+        """First (popularity, asin) key of every page, and the row count they were built from."""
+        from models import db, Product
+
+        with self._lock:
+            cached = self._anchors.get(main_cat)
+        if cached is not None and not self._expired(cached[0]):
+            return cached[1], cached[2]
+
+        # Every per_page-th key in page order, plus the total row count, in one query
+        order = (Product.popularity.desc(), Product.asin.desc())
+        ranked = db.session.query(Product.popularity, Product.asin,
+                                  func.row_number().over(order_by=order).label('position'),
+                                  func.count().over().label('total'))
+        if main_cat:
+            ranked = ranked.filter(Product.main_cat == main_cat)
+        ranked = ranked.subquery()
+        keys = db.session.query(ranked.c.popularity, ranked.c.asin, ranked.c.total)\
+            .filter((ranked.c.position - 1) % self.per_page == 0)\
+            .order_by(ranked.c.position).all()
+        anchors = [(popularity, asin) for popularity, asin, _ in keys]
+        rows = keys[0][2] if keys else 0
+        with self._lock:
+            self._anchors[main_cat] = (self.clock(), rows, anchors)
+        return rows, anchors
+
+    def page(self, page, main_cat=None):
+        """One page of Product rows, as a pagination object for templates/products.html."""
+        from models import Product
+
+        rows, anchors = self.anchors(main_cat)
+        if not anchors:
+            return SearchPagination([], 1, self.per_page, 0)
+        page = min(max(page, 1), len(anchors))
+
+        # Keys at or after this page's anchor and before the next page's anchor (the first page
+        # is open at the top, for rows inserted ahead of its anchor).
+        # Row-value comparisons, so the database does a single range scan on the index
+        key = tuple_(Product.popularity, Product.asin)
+        query = Product.query
+        if page > 1:
+            query = query.filter(key <= tuple_(*anchors[page - 1]))
+        if page < len(anchors):
+            query = query.filter(key > tuple_(*anchors[page]))
+        if main_cat:
+            query = query.filter(Product.main_cat == main_cat)
+        items = query.order_by(Product.popularity.desc(), Product.asin.desc()).limit(self.per_page + 1).all()
+        if len(items) > self.per_page:
+            # Rows were inserted into this range since the anchors were built: rebuild them
+            # on the next request, so the row pushed off this page is not skipped
+            self.invalidate_anchors(main_cat)
+            items = items[:self.per_page]
+        return SearchPagination(items, page, self.per_page, rows)
+
+    def product_added(self, product):
+        """Count a newly inserted Product in its category facet and drop the anchors it shifts."""
+        with self._lock:
+            if self._counts is not None and product.main_cat:
+                self._counts[product.main_cat] = self._counts.get(product.main_cat, 0) + 1
+        self.invalidate_anchors(product.main_cat)
+
+    def invalidate_anchors(self, main_cat=None):
+        """Drop the anchors of a category and of the whole catalog."""
+        with self._lock:
+            self._anchors.pop(None, None)
+            if main_cat:
+                self._anchors.pop(main_cat, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._counts = None
+            self._anchors.clear()
+
+
+def missing_indexes(engine):
+    """Names of the models.Product indexes that the products table does not have."""
+    from sqlalchemy import inspect
+    from models import Product
+
+    existing = {index['name'] for index in inspect(engine).get_indexes(Product.__tablename__)}
+    return [index.name for index in Product.__table__.indexes if index.name not in existing]
+
+
+def create_indexes(engine):
+    """Create the missing models.Product indexes (db.create_all() skips existing tables). Returns their names."""
+    from models import Product
+
+    missing = missing_indexes(engine)
+    for index in Product.__table__.indexes:
+        if index.name in missing:
+            index.create(bind=engine)
+    return missing
+
+
+def benchmark(n_items=200000, per_page=20, pages=(1, 10, 100, 1000, 5000), repeats=5):
+    """Page latency of paginate() (COUNT + OFFSET) vs keyset ranges on a synthetic SQLite catalog."""
+    import os
+    import tempfile
+
+    import numpy as np
+    import pandas as pd
+
+    import synthetic
+    from models import Product
+
+    rng = np.random.default_rng(0)
+    meta = pd.DataFrame({
+        'asin': synthetic.make_ids("B", n_items),
+        'title': [f"Product {i}" for i in range(n_items)],
+        'brand': "Brand",
+        'main_cat': rng.choice([f"Category {c}" for c in range(synthetic.N_CATEGORIES)], n_items),
+        'image_url': "",
+        'popularity': rng.zipf(1.5, n_items).clip(max=100000),
+    })
+    pages = [p for p in pages if (p - 1) * per_page < n_items]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = synthetic.populate_products(meta, f"sqlite:///{os.path.join(tmp, 'products.db')}")
+        with app.app_context():
+            browser = CatalogBrowser(per_page=per_page, ttl=None)
+            start = time.perf_counter()
+            browser.anchors()
+            anchors_s = time.perf_counter() - start
+
+            def timed(fn):
+                fn()
+                t0 = time.perf_counter()
+                for _ in range(repeats):
+                    fn()
+                return (time.perf_counter() - t0) / repeats * 1000
+
+            for page in pages:
+                offset_ms = timed(lambda: Product.query.order_by(Product.popularity.desc(), Product.asin.desc())
+                                  .paginate(page=page, per_page=per_page))
+                keyset_ms = timed(lambda: browser.page(page))
+                results.append({'page': page, 'offset_ms': offset_ms, 'keyset_ms': keyset_ms})
+    return {'items': n_items, 'anchors_s': anchors_s, 'pages': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog browsing tools.")
+    parser.add_argument("command", choices=["bench", "create-indexes"])
+    parser.add_argument("--items", type=int, default=200000)
+    parser.add_argument("--pages", default="1,10,100,1000,5000")
+    parser.add_argument("--database-uri", default=os.environ.get(
+        'DATABASE_URI', 'mysql+pymysql://root:@localhost/beauty_reco'))
+    args = parser.parse_args()
+
+    if args.command == "create-indexes":
+        from sqlalchemy import create_engine
+
+        created = create_indexes(create_engine(args.database_uri))
+        print(f"Created {', '.join(created)}" if created else "All product indexes exist.")
+        return
+
+    result = benchmark(args.items, pages=[int(p) for p in args.pages.split(',')])
+    print(f"{result['items']} products, page anchors built in {result['anchors_s']:.2f}s")
+    print(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+    for row in result['pages']:
+        print(f"{row['page']:>8} {row['offset_ms']:>10.3f} {row['keyset_ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Precomputed SBERT item embeddings (all-MiniLM-L6-v2, L2-normalized) for hybrid scoring.
+
+The notebook encodes every item once; serving never runs the model. Embeddings are
+aligned to the model's item indices and stored quantized next to the other artifacts:
+
+    item_embeddings.npy         int8 codes (or float16 values), one row per model item
+    item_embeddings_scales.npy  float32 per-row scale (0 for items without an embedding)
+
+int8 rows are scaled by max|x| / 127, so a row dequantizes as codes * scale. Both files
+are memory-mapped at load time; only the rows of a request's candidates are touched.
+
+Usage:
+    python embeddings.py build --embeddings item_embeddings.npy --ids item_ids.csv --dtype int8
+    python embeddings.py report --candidates 300
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+CODES_FILE = "item_embeddings.npy"
+SCALES_FILE = "item_embeddings_scales.npy"
+DTYPES = ('int8', 'float16', 'float32')
+
+
+def quantize(embeddings, dtype='int8'):
+    """(codes, scales) for a float embedding matrix; all-zero rows get scale 0."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    present = np.abs(embeddings).max(axis=1) > 0 if len(embeddings) else np.zeros(0, dtype=bool)
+    if dtype == 'int8':
+        scales = np.abs(embeddings).max(axis=1) / 127.0
+        safe = np.where(scales > 0, scales, 1.0)
+        codes = np.clip(np.rint(embeddings / safe[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    return embeddings.astype(dtype), present.astype(np.float32)
+
+
+class EmbeddingStore:
+    def __init__(self, codes, scales):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.n_items, self.dim = codes.shape
+
+    @classmethod
+    def from_float(cls, embeddings, dtype='int8'):
+        return cls(*quantize(embeddings, dtype))
+
+    @classmethod
+    def load(cls, artifacts_dir, mmap_mode='r'):
+        codes = np.load(os.path.join(artifacts_dir, CODES_FILE), mmap_mode=mmap_mode)
+        scales = np.load(os.path.join(artifacts_dir, SCALES_FILE))
+        return cls(codes, scales)
+
+    @staticmethod
+    def exists(artifacts_dir):
+        return all(os.path.exists(os.path.join(artifacts_dir, name)) for name in (CODES_FILE, SCALES_FILE))
+
+    def save(self, artifacts_dir):
+        np.save(os.path.join(artifacts_dir, CODES_FILE), np.asarray(self.codes))
+        np.save(os.path.join(artifacts_dir, SCALES_FILE), self.scales)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def has_embedding(self, indices):
+        return self.scales[indices] > 0
+
+    def rows(self, indices):
+        """Dequantized float32 rows."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return self.codes[indices].astype(np.float32) * self.scales[indices, None]
+
+    def score(self, query, indices=None):
+        """Dot products of `query` with the given rows (all rows when indices is None)."""
+        query = np.asarray(query, dtype=np.float32)
+        if indices is None:
+            return self.codes.astype(np.float32).dot(query) * self.scales
+        indices = np.asarray(indices, dtype=np.int64)
+        return self.codes[indices].astype(np.float32).dot(query) * self.scales[indices]
+
+    def profile(self, indices, weights=None):
+        """Normalized (weighted) mean embedding of the items a user interacted with (zeros if none have one)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        present = self.has_embedding(indices)
+        if not present.any():
+            return np.zeros(self.dim, dtype=np.float32)
+        weights = np.ones(len(indices)) if weights is None else np.asarray(weights, dtype=np.float64)
+        vector = np.average(self.rows(indices[present]), axis=0, weights=weights[present])
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).astype(np.float32)
+
+
+def align(embeddings, asins, item_ids):
+    """Reorder notebook embeddings (rows keyed by `asins`) to the model's item indices; unknown items get zeros."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    aligned = np.zeros((len(item_ids), embeddings.shape[1]), dtype=np.float32)
+    indices = item_ids.encode(list(asins))
+    known = indices >= 0
+    aligned[indices[known]] = embeddings[known]
+    return aligned, int(known.sum())
+
+
+def report(embeddings, n_candidates=300, k=10, n_queries=200, seed=0):
+    """Memory, candidate scoring latency and top-k agreement with float32 for each storage dtype."""
+    rng = np.random.default_rng(seed)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n_items = len(embeddings)
+    queries = embeddings[rng.choice(n_items, n_queries)] + rng.normal(0, 0.05, (n_queries, embeddings.shape[1]))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    candidates = [rng.choice(n_items, min(n_candidates, n_items), replace=False) for _ in range(n_queries)]
+    exact = EmbeddingStore.from_float(embeddings, 'float32')
+    exact_top = [set(cand[np.argsort(-exact.score(q, cand))[:k]]) for q, cand in zip(queries, candidates)]
+
+    rows = []
+    for dtype in DTYPES:
+        store = EmbeddingStore.from_float(embeddings, dtype)
+        tops = []
+        start = time.perf_counter()
+        for q, cand in zip(queries, candidates):
+            tops.append(cand[np.argsort(-store.score(q, cand))[:k]])
+        elapsed = time.perf_counter() - start
+        overlap = [len(set(top) & ref) / k for top, ref in zip(tops, exact_top)]
+        rows.append({'dtype': dtype, 'mb': store.nbytes / 2 ** 20,
+                     'ms_per_query': elapsed / n_queries * 1000, 'overlap': float(np.mean(overlap))})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate quantized item embeddings.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--artifacts-dir", default="artifacts")
+    parser.add_argument("--embeddings", help="float embeddings .npy from the notebook (build).")
+    parser.add_argument("--ids", help="CSV with the `asin` of each embedding row (build).")
+    parser.add_argument("--dtype", choices=DTYPES, default='int8')
+    parser.add_argument("--candidates", type=int, default=300)
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="report: use N random normalized 384-d embeddings instead of the artifacts.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not args.embeddings or not args.ids:
+            parser.error("build needs --embeddings and --ids")
+        from recommender import Recommender
+        recommender = Recommender(artifacts_dir=args.artifacts_dir)
+        asins = pd.read_csv(args.ids)['asin'].astype(str).tolist()
+        aligned, matched = align(np.load(args.embeddings), asins, recommender.item_ids)
+        store = EmbeddingStore.from_float(aligned, args.dtype)
+        store.save(args.artifacts_dir)
+        print(f"{matched}/{len(recommender.item_ids)} model items have an embedding; "
+              f"{args.dtype} store {store.nbytes / 2 ** 20:.1f} MB -> {args.artifacts_dir}")
+        return
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(args.synthetic, 384)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    else:
+        store = EmbeddingStore.load(args.artifacts_dir)
+        present = store.scales > 0
+        embeddings = store.rows(np.flatnonzero(present))
+    print(f"{'dtype':<8} {'MB':>8} {'ms/query':>9} {'overlap@10':>11}")
+    for row in report(embeddings, n_candidates=args.candidates):
+        print(f"{row['dtype']:<8} {row['mb']:>8.2f} {row['ms_per_query']:>9.3f} {row['overlap']:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Offline evaluation: Precision / Recall / NDCG@k of the Recommender strategies on a held-out split.
+
+The held-out truth is a CSR matrix (test users x items). Recommendations are produced
+for blocks of users at once (one GEMM per block), and hits are found with a single
+searchsorted over the sorted (user, item) keys of the truth matrix, so no Python loop
+runs per user. Blocks can be spread over a process pool.
+
+Strategies (all on the same split):
+    warm        ALS scores of the trained user vectors, training items excluded
+    history     user vector re-derived from the training row by exact fold-in (live/history path)
+    cold_start  popularity list (recent_items), same for every user
+    cold_aware  cold_start below the config's cold_threshold, warm otherwise (the notebook's policy)
+    served      Recommender.rank on the trained user vector, re-ranking included when enabled
+    hybrid      Recommender.rank_hybrid (ALS candidates blended with content similarity), or
+                served when no embeddings are loaded
+
+served is what Recommender.recommend returns for a known user without session data (below the
+cold_threshold too: the live path needs session items); hybrid is the same under
+RECOMMENDATION_MODE=hybrid. Both go through the Recommender one user at a time in this process,
+so they are slower than the block strategies and ignore --workers. --rerank enables the
+re-ranking stage with its default parameters even when the model config leaves it off.
+
+The test file is a parquet or CSV with the notebook's `user_id` / `item_id` columns
+(`username` / `asin` are accepted too).
+
+Usage:
+    python evaluation.py --test test.parquet --k 10 --workers 4
+    python evaluation.py --test test.parquet --strategies warm,served,hybrid --rerank
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from foldin import FoldIn
+from recommender import ARTIFACTS_DIR, Recommender
+from scoring import ScoringEngine
+
+STRATEGIES = ('warm', 'history', 'cold_start', 'cold_aware', 'served', 'hybrid')
+
+# Strategies run through the Recommender itself, one user at a time
+SERVED_STRATEGIES = ('served', 'hybrid')
+
+# Per-process state for pool workers (set once by _init_worker)
+_worker = {}
+
+
+def load_split(path):
+    """Read a test split and return (usernames, asins) lists."""
+    if path.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_parquet(path)
+    user_col = 'user_id' if 'user_id' in df.columns else 'username'
+    item_col = 'item_id' if 'item_id' in df.columns else 'asin'
+    return df[user_col].astype(str).tolist(), df[item_col].astype(str).tolist()
+
+
+def build_truth(recommender, usernames, asins):
+    """Held-out truth as (eval_users, CSR matrix of shape (len(eval_users), n_items)); unknown ids are dropped."""
+    user_idx = recommender.user_ids.encode(usernames)
+    item_idx = recommender.item_ids.encode(asins)
+    known = (user_idx >= 0) & (item_idx >= 0)
+    eval_users, rows = np.unique(user_idx[known], return_inverse=True)
+    truth = scipy.sparse.csr_matrix((np.ones(known.sum(), dtype=np.float32), (rows, item_idx[known])),
+                                    shape=(len(eval_users), len(recommender.item_ids)))
+    truth.sum_duplicates()
+    truth.sort_indices()
+    return eval_users, truth
+
+
+def ranking_metrics(recs, truth, k):
+    """
+    Per-user precision, recall and NDCG@k.
+    `recs` is (n_users, k) item indices (-1 = padding), `truth` the aligned CSR truth matrix.
+    """
+    n_users, n_items = truth.shape
+    recs = recs[:, :k]
+    rows = np.repeat(np.arange(n_users, dtype=np.int64), np.diff(truth.indptr))
+    keys = rows * n_items + truth.indices  # sorted, since CSR rows are sorted
+    rec_keys = np.arange(n_users, dtype=np.int64)[:, None] * n_items + recs
+    pos = np.minimum(np.searchsorted(keys, rec_keys), max(len(keys) - 1, 0))
+    hits = (recs >= 0) & (keys[pos] == rec_keys) if len(keys) else np.zeros(recs.shape, dtype=bool)
+
+    n_truth = np.diff(truth.indptr)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(n_truth, k)]
+    n_hits = hits.sum(axis=1)
+    precision = n_hits / k
+    recall = np.divide(n_hits, n_truth, out=np.zeros(n_users), where=n_truth > 0)
+    ndcg = np.divide((hits * discounts).sum(axis=1), ideal, out=np.zeros(n_users), where=ideal > 0)
+    return precision, recall, ndcg
+
+
+def _init_worker(user_factors, item_factors, train_matrix, recent_items, cold_threshold, regularization, alpha):
+    _worker['user_factors'] = user_factors
+    _worker['engine'] = ScoringEngine(item_factors)
+    _worker['foldin'] = FoldIn(item_factors, regularization=regularization, alpha=alpha)
+    _worker['train_matrix'] = train_matrix
+    _worker['recent_items'] = np.asarray(recent_items, dtype=np.int64)
+    _worker['cold_threshold'] = cold_threshold
+
+
+def _recommend_block(args):
+    strategy, users, k = args
+    engine = _worker['engine']
+    train = _worker['train_matrix'][users]
+
+    if strategy in ('cold_start', 'cold_aware'):
+        popular = np.full(k, -1, dtype=np.int64)
+        top = _worker['recent_items'][:k]
+        popular[:len(top)] = top
+        recs = np.tile(popular, (len(users), 1))
+        if strategy == 'cold_start':
+            return recs
+        warm = np.diff(train.indptr) >= _worker['cold_threshold']
+        if warm.any():
+            recs[warm], _ = engine.recommend_batch(_worker['user_factors'][users[warm]], k=k,
+                                                   exclude_rows=train[warm])
+        return recs
+
+    if strategy == 'warm':
+        vectors = _worker['user_factors'][users]
+    else:
+        vectors = _worker['foldin'].solve_many(train)
+    recs, _ = engine.recommend_batch(vectors, k=k, exclude_rows=train)
+    return recs
+
+
+def _serve_block(recommender, strategy, users, k):
+    """Recommendations for a block of known users through the serving path (no session data)."""
+    recs = np.full((len(users), k), -1, dtype=np.int64)
+    train = recommender.train_matrix[users]
+    hybrid = strategy == 'hybrid' and recommender.embeddings is not None
+    for row, user in enumerate(users):
+        seen = train.indices[train.indptr[row]:train.indptr[row + 1]]
+        vector = recommender.als_model.user_factors[user]
+        if hybrid:
+            top = recommender.rank_hybrid(vector, seen, k=k, exclude=seen)
+        else:
+            top = recommender.rank(vector, k=k, exclude=seen, n_interactions=len(seen))
+        recs[row, :len(top)] = top[:k]
+    return recs
+
+
+def evaluate(recommender, usernames, asins, strategies=STRATEGIES, k=10, block_size=1024, workers=0):
+    """Evaluate each strategy on the split. Returns one result dict per strategy."""
+    eval_users, truth = build_truth(recommender, usernames, asins)
+    blocks = [eval_users[start:start + block_size] for start in range(0, len(eval_users), block_size)]
+    init_args = (np.asarray(recommender.als_model.user_factors, dtype=np.float32),
+                 recommender.engine.item_factors,
+                 recommender.train_matrix.tocsr(),
+                 recommender.recent_items,
+                 recommender.config.get('cold_threshold', 3),
+                 recommender.foldin.regularization,
+                 recommender.foldin.alpha)
+
+    pool = None
+    if workers and workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+    else:
+        _init_worker(*init_args)
+
+    results = []
+    try:
+        for strategy in strategies:
+            start = time.perf_counter()
+            if strategy in SERVED_STRATEGIES:
+                parts = [_serve_block(recommender, strategy, block, k) for block in blocks]
+            else:
+                tasks = [(strategy, block, k) for block in blocks]
+                parts = list(pool.map(_recommend_block, tasks)) if pool else [_recommend_block(t) for t in tasks]
+            recs = np.vstack(parts) if parts else np.empty((0, k), dtype=np.int64)
+            precision, recall, ndcg = ranking_metrics(recs, truth, k)
+            results.append({
+                'strategy': strategy,
+                'users': len(eval_users),
+                'precision': float(precision.mean()) if len(precision) else 0.0,
+                'recall': float(recall.mean()) if len(recall) else 0.0,
+                'ndcg': float(ndcg.mean()) if len(ndcg) else 0.0,
+                'wall_s': time.perf_counter() - start,
+            })
+    finally:
+        if pool:
+            pool.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate Recommender strategies on a held-out split.")
+    parser.add_argument("--test", required=True, help="Parquet/CSV with user_id and item_id columns.")
+    parser.add_argument("--artifacts-dir", default=ARTIFACTS_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--strategies", default=",".join(STRATEGIES))
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=0, help="Process pool size (0 = run in-process).")
+    parser.add_argument("--rerank", action="store_true",
+                        help="Enable the re-ranking stage for served / hybrid even if the model config does not.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.test):
+        parser.error(f"Test split not found: {args.test}")
+    recommender = Recommender(artifacts_dir=args.artifacts_dir)
+    if args.rerank:
+        recommender.configure_rerank(**{**recommender.config.get('rerank', {}), 'enabled': True})
+    usernames, asins = load_split(args.test)
+    results = evaluate(recommender, usernames, asins, strategies=args.strategies.split(','),
+                       k=args.k, block_size=args.block_size, workers=args.workers)
+
+    k = args.k
+    print(f"{'strategy':<12} {'users':>7} {'P@' + str(k):>8} {'R@' + str(k):>8} {'NDCG@' + str(k):>8} {'wall s':>8}")
+    for r in results:
+        print(f"{r['strategy']:<12} {r['users']:>7} {r['precision']:>8.4f} {r['recall']:>8.4f} "
+              f"{r['ndcg']:>8.4f} {r['wall_s']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
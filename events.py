@@ -0,0 +1,374 @@
+"""
+Write-behind interaction logging: routes enqueue events, a background thread writes them.
+
+    events = InteractionLog(app).start()
+    events.log(user_id, asin, 'view')                # returns immediately
+    recent = events.recent_interactions(user_id)     # DB rows + this process's unflushed events
+
+Events are buffered in a bounded queue and flushed to the `interactions` table as one
+multi-row INSERT when `batch_size` events are waiting or `flush_interval` seconds have
+passed, whichever comes first.
+
+Delivery is at-least-once: a batch stays pending until its commit succeeds, failed
+commits are retried with backoff, and `stop()` (registered with atexit) drains the queue.
+While stopping, retries continue until the shutdown deadline (`stop(timeout)`); batches
+still unwritten then are appended to `spill_path` (JSON lines) and written by the next
+`start()`, before new events. A batch rejected by the database (e.g. a foreign-key
+violation) is retried row by row and only the offending rows are dropped. When the queue
+is full the caller writes its event synchronously, which slows producers down instead of
+losing events.
+
+Until an event is flushed, `recent_interactions` serves it from an in-memory overlay,
+so a user's own fresh events are visible to the recommender right away.
+
+Usage:
+    python events.py bench --events 5000
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Same attribute names as Interaction rows, so callers (e.g. weights_from_interactions) accept both
+InteractionEvent = namedtuple('InteractionEvent', ['user_id', 'product_asin', 'interaction_type', 'timestamp'])
+
+
+def event_key(event):
+    # MySQL DATETIME drops microseconds, so compare at second resolution
+    return (event.product_asin, event.interaction_type, event.timestamp.replace(microsecond=0))
+
+
+class InteractionLog:
+    def __init__(self, app, batch_size=500, flush_interval=1.0, max_queue=10000,
+                 enqueue_timeout=0.05, overlay_size=50, max_backoff=30.0, spill_path=None):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.overlay_size = overlay_size
+        self.max_backoff = max_backoff
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._overlay = {}       # user_id -> deque of unflushed events, oldest first
+        self._overlay_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._deadline = None    # monotonic time after which stopping stops retrying
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self.listeners = []
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.retries = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._replay_spill()
+            self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self, timeout=10.0):
+        """
+        Flush everything still queued and stop the worker. Failed writes are retried until
+        `timeout` seconds from now; what is still unwritten then goes to the spill file.
+        """
+        if self._deadline is None:
+            self._deadline = time.monotonic() + timeout
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)  # wake the worker if it is waiting for events
+        except queue.Full:
+            pass  # not waiting then
+        if self._thread is not None:
+            self._thread.join(max(self._deadline - time.monotonic(), 0) + 1.0)
+            self._thread = None
+        # Anything enqueued after the worker exited
+        self._drain_now()
+
+    def add_listener(self, fn):
+        """fn(event) is called for every logged event, before it is written."""
+        self.listeners.append(fn)
+
+    def log(self, user_id, product_asin, interaction_type='view', timestamp=None):
+        event = InteractionEvent(user_id, product_asin, interaction_type, timestamp or datetime.utcnow())
+        with self._overlay_lock:
+            pending = self._overlay.setdefault(user_id, deque(maxlen=self.overlay_size))
+            pending.append(event)
+        for fn in self.listeners:
+            try:
+                fn(event)
+            except Exception:
+                logger.exception("Interaction listener failed")
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+            self.enqueued += 1
+        except queue.Full:
+            # Backpressure: the caller pays for its own write rather than dropping it
+            self.sync_writes += 1
+            try:
+                self._write([event])
+            except Exception:
+                self._forget([event])
+                raise
+        return event
+
+    def pending(self, user_id):
+        """This user's unflushed events, newest first."""
+        with self._overlay_lock:
+            return list(reversed(self._overlay.get(user_id, ())))
+
+    def recent_interactions(self, user_id, limit=20):
+        """Newest `limit` interactions of a user: unflushed events merged with Interaction rows."""
+        from models import Interaction
+
+        rows = Interaction.query.filter_by(user_id=user_id)\
+            .order_by(Interaction.timestamp.desc())\
+            .limit(limit).all()
+        fresh = self.pending(user_id)
+        if not fresh:
+            return rows
+        # An event flushed between the query and the overlay read shows up in both
+        seen = {event_key(e) for e in fresh}
+        merged = fresh + [r for r in rows if event_key(r) not in seen]
+        merged.sort(key=lambda e: e.timestamp, reverse=True)
+        return merged[:limit]
+
+    def interactions_after(self, user_id, after_id, limit=50):
+        """A user's Interaction rows with id > `after_id`, oldest first (written by any process)."""
+        from models import Interaction
+
+        return Interaction.query.filter(Interaction.user_id == user_id, Interaction.id > after_id)\
+            .order_by(Interaction.id)\
+            .limit(limit).all()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            try:
+                event = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                if event is not None:
+                    batch.append(event)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+        if batch:
+            self._flush(batch)
+        self._drain_now()
+
+    def _drain_now(self):
+        drained = False
+        while not drained:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get_nowait()
+                except queue.Empty:
+                    drained = True
+                    break
+                if event is not None:
+                    batch.append(event)
+            if batch:
+                self._flush(batch)
+
+    def _flush(self, batch):
+        """Write one batch, retrying with backoff until it commits or, once stopping, the deadline passes."""
+        backoff = 0.1
+        while True:
+            try:
+                self._write(batch)
+                return
+            except Exception:
+                deadline = self._deadline
+                if deadline is not None and time.monotonic() + backoff > deadline:
+                    logger.exception("Flushing %d interactions failed at shutdown", len(batch))
+                    self._spill(batch)
+                    return
+                self.retries += 1
+                logger.exception("Flushing %d interactions failed, retrying in %.1fs", len(batch), backoff)
+                if deadline is None:
+                    self._stop.wait(backoff)  # cut short by stop(), which sets the deadline
+                else:
+                    time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def _write(self, events):
+        from models import db, Interaction
+
+        rows = [e._asdict() for e in events]
+        written = len(rows)
+        with self.app.app_context():
+            try:
+                db.session.execute(Interaction.__table__.insert(), rows)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                # Permanent for the offending rows only: insert one by one and skip those
+                for row in rows:
+                    try:
+                        db.session.execute(Interaction.__table__.insert(), [row])
+                        db.session.commit()
+                    except IntegrityError:
+                        db.session.rollback()
+                        written -= 1
+                        self.dropped += 1
+                        logger.warning("Dropping interaction rejected by the database: %s", row)
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+        self.flushed += written
+        self.batches += 1
+        self._forget(events)
+
+    def _spill(self, batch):
+        """Append an unwritable batch to the spill file (replayed by the next start())."""
+        self._forget(batch)
+        if not self.spill_path:
+            logger.error("No spill file configured; %d interactions lost", len(batch))
+            self.dropped += len(batch)
+            return
+        lines = ''.join(json.dumps({**e._asdict(), 'timestamp': e.timestamp.isoformat()}) + '\n' for e in batch)
+        try:
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(lines)  # one append per batch, so several processes can share the file
+        except OSError:
+            logger.exception("Spilling %d interactions to %s failed; events lost", len(batch), self.spill_path)
+            self.dropped += len(batch)
+            return
+        self.spilled += len(batch)
+        logger.warning("Spilled %d unwritten interactions to %s", len(batch), self.spill_path)
+
+    def _replay_spill(self):
+        """Write the events a previous process spilled; the file is removed only once they are committed."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        # Claim the file first so that concurrent workers don't replay it twice
+        claimed = f"{self.spill_path}.{os.getpid()}"
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return
+        with open(claimed, encoding='utf-8') as f:
+            events = []
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                    events.append(InteractionEvent(**row))
+        try:
+            for i in range(0, len(events), self.batch_size):
+                self._write(events[i:i + self.batch_size])
+        except Exception:
+            logger.exception("Replaying %d spilled interactions failed; kept in %s", len(events), self.spill_path)
+            # Back into the spill file for the next start (rows already committed are written twice)
+            with self._spill_lock, open(claimed, encoding='utf-8') as src, \
+                    open(self.spill_path, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(claimed)
+            return
+        os.remove(claimed)
+        self.replayed += len(events)
+        logger.info("Replayed %d spilled interactions from %s", len(events), self.spill_path)
+
+    def _forget(self, events):
+        with self._overlay_lock:
+            for event in events:
+                pending = self._overlay.get(event.user_id)
+                if pending is None:
+                    continue
+                try:
+                    pending.remove(event)
+                except ValueError:
+                    pass
+                if not pending:
+                    del self._overlay[event.user_id]
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'sync_writes': self.sync_writes,
+            'retries': self.retries,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+        }
+
+
+def benchmark(n_events=5000, n_users=50, batch_size=500):
+    """Single-row commits vs the write-behind log on a SQLite database."""
+    import os
+    import tempfile
+
+    import synthetic
+    from models import db, Interaction, User
+
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = synthetic.generate(os.path.join(tmp, "artifacts"), n_users=10, n_items=200)
+        app = synthetic.populate_products(meta, f"sqlite:///{os.path.join(tmp, 'products.db')}")
+        asins = meta['asin'].tolist()
+        with app.app_context():
+            db.session.add_all([User(username=f"u{i}", password="x") for i in range(n_users)])
+            db.session.commit()
+            user_ids = [u.id for u in User.query.all()]
+
+            start = time.perf_counter()
+            for i in range(n_events):
+                db.session.add(Interaction(user_id=user_ids[i % n_users], product_asin=asins[i % len(asins)]))
+                db.session.commit()
+            sync_s = time.perf_counter() - start
+
+            sync_rows = Interaction.query.count()
+
+            log = InteractionLog(app, batch_size=batch_size).start()
+            start = time.perf_counter()
+            for i in range(n_events):
+                log.log(user_ids[i % n_users], asins[i % len(asins)])
+            enqueue_s = time.perf_counter() - start
+            log.stop()
+            total_s = time.perf_counter() - start
+            write_behind_rows = Interaction.query.count() - sync_rows
+    return {'events': n_events, 'sync_s': sync_s, 'sync_rows': sync_rows, 'enqueue_s': enqueue_s,
+            'write_behind_s': total_s, 'write_behind_rows': write_behind_rows, **log.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction log tools.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    r = benchmark(args.events, batch_size=args.batch_size)
+    print(f"{r['events']} events")
+    print(f"  single-row commits: {r['sync_s']:.2f}s, {r['sync_rows']} rows written")
+    print(f"  write-behind:       enqueue {r['enqueue_s']:.3f}s, drained {r['write_behind_s']:.2f}s "
+          f"in {r['batches']} batches, {r['write_behind_rows']} rows written")
+
+
+if __name__ == '__main__':
+    main()
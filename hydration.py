@@ -0,0 +1,103 @@
+import ast
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER_IMAGE = "https://via.placeholder.com/300x300?text=No+Image"
+
+
+def normalize_image_url(img):
+    """Unwrap legacy "['url', ...]" strings and fall back to the placeholder image."""
+    if isinstance(img, str) and img.startswith("['") and img.endswith("']"):
+        try:
+            actual_list = ast.literal_eval(img)
+            if actual_list:
+                img = actual_list[0]
+        except (ValueError, SyntaxError):
+            pass
+    return img or PLACEHOLDER_IMAGE
+
+
+def product_to_dict(p):
+    return {
+        'asin': p.asin,
+        'title': p.title,
+        'brand': p.brand,
+        'main_cat': p.main_cat,
+        'image_url': normalize_image_url(p.image_url),
+        'price': None, # SQL model doesn't have price yet
+        'avg_rating': p.avg_rating,
+        'popularity': p.popularity
+    }
+
+
+class ProductHydrator:
+    """
+    Read-through LRU cache of ready-to-render product dicts keyed by ASIN.
+    Misses are fetched from the SQL database in a single IN query per call.
+    Only products found in the database are cached, so rows inserted later are picked up.
+    """
+
+    def __init__(self, max_entries=20000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.evictions = 0
+
+    def get_many(self, asins):
+        """Product dicts for the given ASINs, in input order, skipping unknown ASINs."""
+        found = {}
+        missing = []
+        seen = set()
+        with self._lock:
+            for asin in asins:
+                if asin in seen:
+                    continue
+                seen.add(asin)
+                p = self._entries.get(asin)
+                if p is None:
+                    missing.append(asin)
+                else:
+                    self._entries.move_to_end(asin)
+                    found[asin] = p
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = self._load(missing)
+            found.update(loaded)
+            with self._lock:
+                for asin, p in loaded.items():
+                    self._entries[asin] = p
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return [found[asin] for asin in asins if asin in found]
+
+    def _load(self, asins):
+        # Lazy import to avoid circular dependency
+        from models import Product
+
+        self.queries += 1
+        products_db = Product.query.filter(Product.asin.in_(asins)).all()
+        return {p.asin: product_to_dict(p) for p in products_db}
+
+    def invalidate(self, asin=None):
+        """Drop one cached product (or everything when asin is None)."""
+        with self._lock:
+            if asin is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(asin, None)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'queries': self.queries,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class IdMap:
+    """
+    Bidirectional id <-> index map.
+    Replaces LabelEncoder lookups on the hot path: `in` and encode are O(1) dict hits,
+    decode is a single fancy-index into the id array.
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=object)
+        self.index = {id_: i for i, id_ in enumerate(self.ids.tolist())}
+
+    @classmethod
+    def from_encoder(cls, encoder):
+        return cls(encoder.classes_)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, id_):
+        return id_ in self.index
+
+    def get(self, id_, default=None):
+        return self.index.get(id_, default)
+
+    def encode(self, ids):
+        """Encode a list of ids into an int64 array, with -1 for unknown ids."""
+        get = self.index.get
+        return np.fromiter((get(i, -1) for i in ids), dtype=np.int64, count=len(ids))
+
+    def decode(self, indices):
+        """Decode an array of indices back into a list of ids."""
+        return self.ids[np.asarray(indices, dtype=np.int64)].tolist()
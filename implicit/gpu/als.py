@@ -1,3 +1,26 @@
-class AlternatingLeastSquares:
-    def __init__(self, *args, **kwargs):
-        pass
+# Unpickling target for als_weighted.pkl (trained with implicit on GPU in the notebook).
+# Backed by the in-repo CPU trainer, so an unpickled model can also be refit.
+# The trainer is loaded from the repo root by path, so unpickling works from any working directory.
+import importlib.util
+import os
+import sys
+
+_ALS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "als.py")
+
+
+def _load_trainer():
+    module = sys.modules.get("als")
+    if module is not None and os.path.realpath(getattr(module, "__file__", "")) == _ALS_PATH:
+        return module
+    spec = importlib.util.spec_from_file_location("als", _ALS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules.setdefault("als", module)
+    spec.loader.exec_module(module)
+    return module
+
+
+class AlternatingLeastSquares(_load_trainer().AlternatingLeastSquares):
+    def __setstate__(self, state):
+        # Trainer settings the pickled implicit model does not have keep their defaults
+        self.__init__()
+        self.__dict__.update(state)
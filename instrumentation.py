@@ -0,0 +1,193 @@
+"""
+Low-overhead in-process instrumentation for the recommendation hot path.
+
+    with span('scoring'):            # stage timing -> histogram (+ sampled trace)
+        ...
+    metrics.inc('recommender_requests_total', strategy='warm_als')
+
+Everything is aggregated in memory and rendered in the Prometheus text format by
+`metrics.render()` (served at /metrics). A fraction of requests (TRACE_SAMPLE_RATE)
+also collect their spans into a per-request trace that is logged as one JSON line
+on the 'recommender.trace' logger.
+"""
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds (0.1 ms .. 10 s)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+trace_logger = logging.getLogger('recommender.trace')
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._help = {}
+        self._buckets = {}     # name -> bucket bounds, for histograms that are not latencies
+        self._collectors = []
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def set_buckets(self, name, buckets):
+        self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            hist.observe(value)
+
+    def register_collector(self, fn):
+        """fn() -> iterable of (name, type, labels_dict, value), evaluated at render time (gauges, cache stats...)."""
+        self._collectors.append(fn)
+
+    def counter_value(self, name, **labels):
+        return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda kv: kv[0])
+            histograms = [(key, (list(h.counts), h.sum, h.count, h.buckets)) for key, h in histograms]
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for fn in self._collectors:
+            for name, kind, labels, value in fn():
+                if value is None:
+                    continue
+                header(name, kind)
+                lines.append(f"{name}{format_labels(tuple(sorted(labels.items())))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def stats_metrics(prefix, stats, gauges=('size',)):
+    """
+    Collector rows for a component's stats() dict: the names in `gauges` are point-in-time values,
+    every other entry is a running count and is exported as a `_total` counter.
+    """
+    for name, value in stats.items():
+        if name in gauges:
+            yield f'{prefix}_{name}', 'gauge', {}, value
+        else:
+            yield f'{prefix}_{name}_total', 'counter', {}, value
+
+
+metrics = Metrics()
+metrics.describe('recommender_stage_seconds', 'Time spent in each recommendation stage.')
+metrics.describe('recommender_requests_total', 'Recommendation requests by serving strategy.')
+metrics.describe('recommender_errors_total', 'Recommendation requests that failed and fell back to cold start.')
+metrics.describe('http_request_seconds', 'Request latency by endpoint.')
+
+# Sampled per-request traces
+TRACE_SAMPLE_RATE = 0.0
+_local = threading.local()
+
+
+@contextmanager
+def span(stage):
+    """Time a stage: always aggregated into the histogram, also recorded in the current trace if sampled."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('recommender_stage_seconds', elapsed, stage=stage)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace['spans'].append((stage, round(elapsed * 1000, 3)))
+
+
+def start_trace(name, sample_rate=None, **fields):
+    """Begin a per-request trace on this thread (kept only for a sampled fraction of requests)."""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate > 0 and random.random() < rate:
+        _local.trace = {'name': name, 'start': time.perf_counter(), 'spans': [], **fields}
+    else:
+        _local.trace = None
+
+
+def annotate(**fields):
+    """Attach fields (e.g. the serving strategy) to the current trace, if any."""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.update(fields)
+
+
+def end_trace():
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    if trace is None:
+        return None
+    trace['total_ms'] = round((time.perf_counter() - trace.pop('start')) * 1000, 3)
+    trace_logger.info(json.dumps(trace, default=str))
+    return trace
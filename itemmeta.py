@@ -0,0 +1,377 @@
+"""
+Compact columnar item metadata (items_metadata.parquet), aligned with the model's item indices.
+
+Row i is model item i. Metadata rows for ASINs the model doesn't know are appended after
+the model's items (rows >= n_items); model items without metadata have empty values.
+All columns are numpy arrays, built once when the model loads:
+
+    main_cat, brand    dictionary-encoded: int32 code per row (-1 = missing) + one name per code,
+                       case-insensitive (the first spelling seen is kept as the name)
+    title, image_url   offset-encoded UTF-8: one bytes buffer + int64 offsets per row. Titles have
+                       their whitespace collapsed and image URLs are unwrapped from the legacy
+                       "['url', ...]" form here, once, instead of on every render
+    category           CSR: per-row range of codes into the category names
+    main_cat members   CSR inverse of main_cat: the rows of every main_cat (replaces category_map)
+
+price and the raw image_x / image_y columns are not loaded. Lookups take arrays of rows and
+are vectorized; strings are decoded only for the rows asked for.
+
+Usage:
+    python itemmeta.py report --artifacts-dir artifacts
+    python itemmeta.py bench --items 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from hydration import normalize_image_url
+from idmap import IdMap
+
+# Values that are not a group of their own (after stripping and lower-casing)
+MISSING = ('', 'unknown', 'nan', 'none')
+COLUMNS = ('asin', 'title', 'brand', 'main_cat', 'category', 'image_url')
+
+
+def encode_values(values, missing=MISSING):
+    """Dictionary-encode strings case-insensitively: (int32 codes, object array of names); -1 = missing."""
+    values = pd.Series(values, dtype=object)
+    cleaned = values.where(values.notna(), '').astype(str).str.strip()
+    keys = cleaned.str.lower()
+    codes, _ = pd.factorize(keys.where(~keys.isin(missing)))
+    # factorize numbers codes in order of first appearance, so np.unique's first indices line up with them
+    valid = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[valid], return_index=True)
+    return codes.astype(np.int32), cleaned.to_numpy(dtype=object)[valid[first]]
+
+
+def clean_titles(values):
+    """Titles with runs of whitespace collapsed ('' where missing)."""
+    return [' '.join(v.split()) if isinstance(v, str) else '' for v in values]
+
+
+def clean_image_urls(values):
+    """Image URLs unwrapped from the legacy "['url', ...]" strings ('' where missing)."""
+    values = pd.Series(values, dtype=object)
+    urls = values.where(values.apply(type) == str, '').str.strip()
+    legacy = urls.str.startswith("['")
+    urls[legacy] = urls[legacy].map(normalize_image_url)
+    return urls.tolist()
+
+
+def as_list(value):
+    """A list-typed cell (list / numpy array) as a list; None, NaN and '' are empty, a bare string is one value."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return list(value)
+    if isinstance(value, str):
+        return [value] if value else []
+    return []
+
+
+class StringColumn:
+    """Offset-encoded UTF-8 strings: row i is data[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def build(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8))
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, row):
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+
+    def take(self, rows):
+        return [self.get(row) for row in np.asarray(rows, dtype=np.int64).tolist()]
+
+
+class ItemMetadata:
+    def __init__(self, item_ids, extra_ids, has_metadata, main_cat_codes, main_cat_names, brand_codes,
+                 brand_names, title, image_url, category_indptr, category_codes, category_names):
+        """Use from_frame / load; `item_ids` is the model's IdMap, `extra_ids` the metadata-only ASINs."""
+        self.item_ids = item_ids
+        self.extra_ids = extra_ids
+        self.n_items = len(item_ids)
+        self.n_rows = self.n_items + len(extra_ids)
+        self.has_metadata = has_metadata
+        self.main_cat_codes = main_cat_codes
+        self.main_cat_names = main_cat_names
+        self.brand_codes = brand_codes
+        self.brand_names = brand_names
+        self.title = title
+        self.image_url = image_url
+        self.category_indptr = category_indptr
+        self.category_codes = category_codes
+        self.category_names = category_names
+
+        # Rows of each main_cat, grouped by code (one stable sort, rows ascending within a group)
+        order = np.argsort(main_cat_codes, kind='stable')
+        order = order[main_cat_codes[order] >= 0]
+        self.main_cat_rows = order.astype(np.int32)
+        self.main_cat_indptr = np.searchsorted(main_cat_codes[order], np.arange(len(main_cat_names) + 1))
+        self._main_cat_lookup = {str(name).lower(): code for code, name in enumerate(main_cat_names)}
+
+    @classmethod
+    def from_frame(cls, meta, item_ids):
+        """Build from an items_metadata DataFrame (with an 'asin' column or index) for the model's IdMap."""
+        if 'asin' in meta.columns:
+            meta = meta.set_index('asin')
+        meta = meta[~meta.index.duplicated()]
+        asins = meta.index.to_numpy(dtype=object)
+
+        # 1. Row of every metadata entry: the model's item index, or a new row after the model's items
+        n_items = len(item_ids)
+        positions = item_ids.encode(asins.tolist())
+        unknown = positions < 0
+        extra_ids = IdMap(asins[unknown])
+        positions[unknown] = n_items + np.arange(unknown.sum())
+        n_rows = n_items + len(extra_ids)
+        has_metadata = np.zeros(n_rows, dtype=bool)
+        has_metadata[positions] = True
+
+        def column(name):
+            aligned = np.full(n_rows, None, dtype=object)
+            if name in meta.columns:
+                aligned[positions] = meta[name].to_numpy(dtype=object)
+            return aligned
+
+        # 2. Dictionary-encoded attributes
+        main_cat_codes, main_cat_names = encode_values(column('main_cat'))
+        brand_codes, brand_names = encode_values(column('brand'))
+
+        # 3. Offset-encoded strings, normalized once
+        title = StringColumn.build(clean_titles(column('title')))
+        image_url = StringColumn.build(clean_image_urls(column('image_url')))
+
+        # 4. category lists as CSR rows of codes
+        lists = [as_list(c) for c in column('category')]
+        codes, category_names = encode_values([v for c in lists for v in c], missing=('',))
+        owner = np.repeat(np.arange(n_rows), [len(c) for c in lists])
+        keep = codes >= 0
+        category_indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owner[keep], minlength=n_rows), out=category_indptr[1:])
+        return cls(item_ids, extra_ids, has_metadata, main_cat_codes, main_cat_names, brand_codes, brand_names,
+                   title, image_url, category_indptr, codes[keep], category_names)
+
+    @classmethod
+    def load(cls, path, item_ids):
+        """Read only the columns kept here from items_metadata.parquet."""
+        import pyarrow.parquet as pq
+
+        available = pq.read_schema(path).names
+        meta = pd.read_parquet(path, columns=[c for c in COLUMNS if c in available])
+        return cls.from_frame(meta, item_ids)
+
+    @property
+    def nbytes(self):
+        arrays = (self.has_metadata, self.main_cat_codes, self.brand_codes, self.category_indptr,
+                  self.category_codes, self.main_cat_rows, self.main_cat_indptr)
+        names = sum(sys.getsizeof(n) for names in (self.main_cat_names, self.brand_names, self.category_names)
+                    for n in names.tolist())
+        # The model's IdMap is shared with the Recommender; only the metadata-only ASINs are extra
+        extra = sys.getsizeof(self.extra_ids.index) + sum(sys.getsizeof(a) for a in self.extra_ids.ids.tolist())
+        return sum(a.nbytes for a in arrays) + self.title.nbytes + self.image_url.nbytes + names + extra
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, asin):
+        row = self.row(asin)
+        return row >= 0 and bool(self.has_metadata[row])
+
+    def row(self, asin):
+        row = self.item_ids.get(asin)
+        if row is None:
+            extra = self.extra_ids.get(asin)
+            return -1 if extra is None else self.n_items + extra
+        return row
+
+    def rows(self, asins):
+        """Row of every ASIN as an int64 array (-1 for ASINs with neither a model index nor metadata)."""
+        asins = list(asins)
+        rows = self.item_ids.encode(asins)
+        for i in np.flatnonzero(rows < 0).tolist():
+            extra = self.extra_ids.get(asins[i])
+            if extra is not None:
+                rows[i] = self.n_items + extra
+        return rows
+
+    def asins(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        in_model = rows < self.n_items
+        result = np.empty(len(rows), dtype=object)
+        result[in_model] = self.item_ids.ids[rows[in_model]]
+        result[~in_model] = self.extra_ids.ids[rows[~in_model] - self.n_items]
+        return result.tolist()
+
+    def known(self, rows):
+        """Boolean mask of the rows (-1 allowed) that have metadata."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return (rows >= 0) & self.has_metadata[np.maximum(rows, 0)]
+
+    def main_cats(self, rows):
+        """main_cat names of the rows (None where missing)."""
+        codes = self.main_cat_codes[np.asarray(rows, dtype=np.int64)]
+        return np.where(codes >= 0, self.main_cat_names[np.maximum(codes, 0)], None)
+
+    def brands(self, rows):
+        codes = self.brand_codes[np.asarray(rows, dtype=np.int64)]
+        return np.where(codes >= 0, self.brand_names[np.maximum(codes, 0)], None)
+
+    def categories(self, rows):
+        """category list of every row."""
+        return [self.category_names[self.category_codes[self.category_indptr[r]:self.category_indptr[r + 1]]]
+                .tolist() for r in np.asarray(rows, dtype=np.int64).tolist()]
+
+    def main_cat_code(self, name):
+        return self._main_cat_lookup.get(str(name).strip().lower(), -1)
+
+    def members(self, main_cat):
+        """Rows of a main_cat (ascending; model items first), empty for unknown names."""
+        code = self.main_cat_code(main_cat)
+        if code < 0:
+            return np.empty(0, dtype=np.int32)
+        return self.main_cat_rows[self.main_cat_indptr[code]:self.main_cat_indptr[code + 1]]
+
+    def most_common_main_cat(self, rows):
+        """Most frequent main_cat among the rows (ties: the first one seen), None if they have none."""
+        rows = np.asarray(rows, dtype=np.int64)
+        codes = self.main_cat_codes[rows[rows >= 0]]
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return None
+        counts = np.bincount(codes)
+        best = np.flatnonzero(counts == counts.max())
+        return self.main_cat_names[codes[np.isin(codes, best)][0]]
+
+    def records(self, asins):
+        """{asin: {'title', 'brand', 'main_cat', 'category'}} for the ASINs that have metadata."""
+        asins = list(asins)
+        rows = self.rows(asins)
+        known = np.flatnonzero(self.known(rows))
+        rows = rows[known]
+        fields = zip(self.title.take(rows), self.brands(rows).tolist(), self.main_cats(rows).tolist(),
+                     self.categories(rows))
+        return {asins[i]: {'title': title or None, 'brand': brand, 'main_cat': main_cat, 'category': category}
+                for i, (title, brand, main_cat, category) in zip(known.tolist(), fields)}
+
+
+def legacy_frame(meta):
+    """The DataFrame and category_map the Recommender used to keep, for comparisons."""
+    meta = meta.set_index('asin') if 'asin' in meta.columns else meta
+    category_map = {}
+    if 'main_cat' in meta.columns:
+        for cat, group in meta.groupby('main_cat'):
+            category_map[cat] = group.index.tolist()
+    return meta, category_map
+
+
+def compare(meta, item_ids, popular, repeats=200, seed=0):
+    """Memory and lookup latency: legacy DataFrame + category_map vs ItemMetadata."""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    meta_df, category_map = legacy_frame(meta.copy())
+    legacy_build = time.perf_counter() - start
+    start = time.perf_counter()
+    catalog = ItemMetadata.from_frame(meta, item_ids)
+    build = time.perf_counter() - start
+
+    legacy_bytes = int(meta_df.memory_usage(deep=True).sum())
+    legacy_bytes += sum(sys.getsizeof(v) for v in category_map.values())  # the lists (their strings are shared)
+    asins = meta_df.index.to_numpy(dtype=object)
+    samples = [rng.choice(asins, 20).tolist() for _ in range(repeats)]
+    popular_asins = item_ids.decode(popular[:300])
+
+    def timed(fn):
+        start = time.perf_counter()
+        for i in range(repeats):
+            fn(i)
+        return (time.perf_counter() - start) / repeats * 1000
+
+    cats = list(category_map)
+    rows = [
+        ('cold start: metadata check of 300 items',
+         timed(lambda i: [a for a in popular_asins if a in meta_df.index]),
+         timed(lambda i: popular[:300][catalog.has_metadata[popular[:300]]])),
+        ('main_cat of 20 ASINs',
+         timed(lambda i: [meta_df.loc[a, 'main_cat'] for a in samples[i]]),
+         timed(lambda i: catalog.main_cats(catalog.rows(samples[i])))),
+        ('title + image of 20 ASINs',
+         timed(lambda i: meta_df.loc[samples[i], ['title', 'image_url']].to_dict('records')),
+         timed(lambda i: (lambda r: (catalog.title.take(r), catalog.image_url.take(r)))(catalog.rows(samples[i])))),
+        ('members of a main_cat',
+         timed(lambda i: category_map[cats[i % len(cats)]] if cats else None),
+         timed(lambda i: catalog.members(cats[i % len(cats)]) if cats else None)),
+    ]
+    return {'rows': catalog.n_rows, 'legacy_mb': legacy_bytes / 2 ** 20, 'mb': catalog.nbytes / 2 ** 20,
+            'legacy_build_s': legacy_build, 'build_s': build,
+            'lookups': [{'lookup': name, 'legacy_ms': a, 'ms': b} for name, a, b in rows]}
+
+
+def synthetic_metadata(n_items, n_brands=2000, n_categories=12, seed=0):
+    """A metadata frame shaped like items_metadata.parquet (titles, brands, list-typed category...)."""
+    rng = np.random.default_rng(seed)
+    words = np.array(['cream', 'serum', 'oil', 'mask', 'brush', 'gel', 'lotion', 'spray', 'hair', 'skin',
+                      'natural', 'organic', 'set', 'pack', 'for', 'women', 'men', 'dry', 'sensitive', 'daily'])
+    titles = [' '.join(words[rng.integers(0, len(words), 10)]) for _ in range(n_items)]
+    brand_weights = 1.0 / np.arange(1, n_brands + 1)
+    brands = np.array([f"Brand {b}" for b in range(n_brands)] + [''], dtype=object)
+    brand_idx = np.where(rng.random(n_items) < 0.3, n_brands,
+                         rng.choice(n_brands, n_items, p=brand_weights / brand_weights.sum()))
+    return pd.DataFrame({
+        'asin': [f"B{i:09d}" for i in range(n_items)],
+        'title': titles,
+        'brand': brands[brand_idx],
+        'image_x': [f"https://images.example.com/{i}._SS40_.jpg" for i in range(n_items)],
+        'price': np.where(rng.random(n_items) < 0.5, '', '$9.99'),
+        'category': [np.array(['Beauty', f"Sub {c}"], dtype=object) if c % 2 else np.array([], dtype=object)
+                     for c in rng.integers(0, 40, n_items)],
+        'main_cat': [f"Category {c}" for c in rng.integers(0, n_categories, n_items)],
+        'image_url': [f"https://images.example.com/{i}.jpg" for i in range(n_items)],
+    })
+
+
+def print_comparison(r):
+    print(f"{r['rows']} rows: DataFrame + category_map {r['legacy_mb']:.2f} MB -> {r['mb']:.2f} MB "
+          f"(built in {r['legacy_build_s']:.2f}s -> {r['build_s']:.2f}s)")
+    print(f"{'lookup':<40} {'DataFrame ms':>12} {'columnar ms':>12}")
+    for row in r['lookups']:
+        print(f"{row['lookup']:<40} {row['legacy_ms']:>12.4f} {row['ms']:>12.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar item metadata tools.")
+    parser.add_argument("command", choices=["report", "bench"])
+    parser.add_argument("--artifacts-dir", default="artifacts")
+    parser.add_argument("--items", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        from recommender import Recommender
+        recommender = Recommender(artifacts_dir=args.artifacts_dir)
+        meta = pd.read_parquet(os.path.join(args.artifacts_dir, "items_metadata.parquet"))
+        print_comparison(compare(meta, recommender.item_ids, recommender.popular_items))
+        return
+
+    meta = synthetic_metadata(args.items)
+    # Half of the catalog known to the model, like a model trained on a subset of the products
+    item_ids = IdMap(meta['asin'].to_numpy(dtype=object)[::2])
+    print_comparison(compare(meta, item_ids, np.arange(len(item_ids))))
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,12 @@ class Product(db.Model):
     popularity = db.Column(db.Integer, default=0)
     avg_rating = db.Column(db.Float, default=0.0)
 
+    # Keyset pagination order (popularity DESC, asin DESC), overall and per category
+    __table_args__ = (
+        db.Index('ix_products_popularity_asin', 'popularity', 'asin'),
+        db.Index('ix_products_main_cat_popularity_asin', 'main_cat', 'popularity', 'asin'),
+    )
+
 class Interaction(db.Model):
     __tablename__ = 'interactions'
     id = db.Column(db.Integer, primary_key=True)
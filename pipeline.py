@@ -0,0 +1,351 @@
+"""
+Streaming artifact build from the raw Amazon review / metadata dumps (JSON lines, .gz).
+
+Produces the legacy artifacts layout the Recommender loads, without the notebook's
+whole-file read_json, per-user groupby loop or pd.concat of small frames:
+
+    1. Reviews are read `chunk_size` lines at a time and cleaned like the notebook
+       (non-empty text, rating in 1..5, timestamp present, verified only). Each chunk is
+       reduced to numeric columns right away: user / item codes from running dictionaries,
+       rating, helpful votes, unixReviewTime. The text is dropped with the chunk.
+    2. Weights = foldin.interaction_weight (rating × (1 + log1p(votes)) × time decay
+       from the newest review), in one vectorized pass.
+    3. Temporal split: one lexsort by (user, ts). Each row's rank within its user comes
+       from the group boundaries. The first max(1, int(0.8 n)) reviews go to train, the
+       rest to test, and users with fewer than 2 reviews are dropped (as in the notebook).
+    4. Encoders (LabelEncoder classes = sorted train ids), CSR train_matrix, recent_items,
+       user_interactions, config and the test split.
+    5. Metadata is streamed the same way into items_metadata.parquet, one row group per
+       chunk (first row per ASIN, items without an image dropped).
+    6. Unless --iterations 0, the weighted ALS model is trained with als.py.
+
+Memory is bounded by one chunk of raw JSON plus ~30 bytes per kept review and the
+id dictionaries. Nothing holds the full text of either file.
+
+Usage:
+    python pipeline.py build --reviews All_Beauty.json.gz --meta meta_All_Beauty.json.gz --out artifacts
+    python pipeline.py bench --reviews-rows 1000000 --meta-rows 100000
+"""
+import argparse
+import os
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+from foldin import interaction_weight
+
+TRAIN_FRACTION = 0.8
+MIN_USER_REVIEWS = 2
+
+
+class RunningCodes:
+    """Dense integer codes for string ids, assigned in order of first appearance."""
+
+    def __init__(self):
+        self.index = {}
+        self.ids = []
+
+    def encode(self, values):
+        # Dictionary lookups only for the distinct ids of the chunk
+        inverse, uniques = pd.factorize(values)
+        codes = np.empty(len(uniques), dtype=np.int64)
+        for j, id_ in enumerate(uniques):
+            code = self.index.get(id_)
+            if code is None:
+                code = self.index[id_] = len(self.ids)
+                self.ids.append(id_)
+            codes[j] = code
+        return codes[inverse]
+
+
+def helpful_votes(chunk):
+    """The 2018 dumps store votes as strings like "1,234" in `vote`; missing means 0."""
+    column = 'vote' if 'vote' in chunk.columns else 'helpful_vote' if 'helpful_vote' in chunk.columns else None
+    if column is None:
+        return np.zeros(len(chunk))
+    values = chunk[column].astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+
+
+def read_reviews(path, chunk_size=50000):
+    """Stream the review dump. Returns (user_ids, item_ids, columns), with columns as numpy arrays per review."""
+    users, items = RunningCodes(), RunningCodes()
+    parts = {'user': [], 'item': [], 'rating': [], 'votes': [], 'ts': []}
+    rows_read = 0
+    for chunk in pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, compression='infer'):
+        rows_read += len(chunk)
+        text = chunk.get('reviewText', pd.Series('', index=chunk.index)).fillna('').astype(str)
+        rating = pd.to_numeric(chunk['overall'], errors='coerce')
+        ts = pd.to_numeric(chunk['unixReviewTime'], errors='coerce')
+        keep = (text.str.strip() != '') & rating.between(1, 5) & ts.notna()
+        if 'verified' in chunk.columns:
+            keep &= chunk['verified'] == True  # noqa: E712 (also drops missing values)
+        chunk = chunk[keep.to_numpy()]
+        if not len(chunk):
+            continue
+        parts['user'].append(users.encode(chunk['reviewerID'].astype(str).to_numpy()))
+        parts['item'].append(items.encode(chunk['asin'].astype(str).to_numpy()))
+        parts['rating'].append(rating[keep].to_numpy(dtype=np.float32))
+        parts['votes'].append(helpful_votes(chunk).astype(np.float32))
+        parts['ts'].append(ts[keep].to_numpy(dtype=np.int64))
+    columns = {name: np.concatenate(arrays) if arrays else np.empty(0) for name, arrays in parts.items()}
+    columns['rows_read'] = rows_read
+    return np.asarray(users.ids, dtype=object), np.asarray(items.ids, dtype=object), columns
+
+
+def temporal_split(user, ts, train_fraction=TRAIN_FRACTION, min_reviews=MIN_USER_REVIEWS):
+    """
+    (order, is_train): `order` sorts the reviews by (user, ts) and keeps only users with at
+    least `min_reviews`. `is_train` marks the first max(1, int(train_fraction * n)) of each user.
+    """
+    order = np.lexsort((ts, user))
+    sorted_users = user[order]
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    group = np.repeat(np.arange(len(starts)), counts)
+    rank = np.arange(len(order)) - starts[group]
+    n_train = np.maximum(1, (counts * train_fraction).astype(np.int64))
+    kept = counts[group] >= min_reviews
+    return order[kept], (rank < n_train[group])[kept]
+
+
+def label_codes(codes, ids):
+    """
+    LabelEncoder-equivalent encoding of the distinct running `codes`: classes_ are their
+    ids sorted, and the returned remap turns a running code into its class index (-1 if absent).
+    """
+    present = np.unique(codes)
+    names = ids[present]
+    order = np.argsort(names.astype(str), kind='stable')
+    remap = np.full(len(ids), -1, dtype=np.int64)
+    remap[present[order]] = np.arange(len(present))
+    return names[order], remap
+
+
+def recent_items_list(item_idx, n_items):
+    """Item indices by train interaction count, most first (ties by index), as saved by the notebook."""
+    counts = np.bincount(item_idx, minlength=n_items)
+    order = np.argsort(-counts, kind='stable')
+    return [int(i) for i in order[counts[order] > 0]]
+
+
+def first_image(value):
+    if isinstance(value, (list, np.ndarray)) and len(value):
+        return str(value[0])
+    return None
+
+
+def to_text(value):
+    """Same flattening as the notebook's to_text (lists and dicts joined with spaces)."""
+    if isinstance(value, (list, np.ndarray)):
+        return " ".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return " ".join(f"{k} {v}" for k, v in value.items())
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value)
+
+
+def write_metadata(path, out_path, chunk_size=50000):
+    """Stream the metadata dump into items_metadata.parquet. Returns the number of items written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([('asin', pa.string()), ('title', pa.string()), ('brand', pa.string()),
+                        ('image_url', pa.string()), ('price', pa.string()),
+                        ('category', pa.list_(pa.string())), ('main_cat', pa.string())])
+    seen = set()
+    written = 0
+    with pq.ParquetWriter(out_path, schema) as writer:
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False, compression='infer'):
+            chunk = chunk.reindex(columns=['asin', 'title', 'brand', 'image', 'price', 'category', 'main_cat'])
+            chunk['image_url'] = chunk['image'].map(first_image)
+            chunk = chunk[chunk['image_url'].notna() & chunk['asin'].notna()]
+            chunk = chunk.drop_duplicates('asin')
+            chunk = chunk[~chunk['asin'].isin(seen)]
+            if not len(chunk):
+                continue
+            seen.update(chunk['asin'].tolist())
+            table = pd.DataFrame({
+                'asin': chunk['asin'].astype(str),
+                'title': chunk['title'].map(to_text),
+                'brand': chunk['brand'].where(chunk['brand'].notna(), 'unknown').map(to_text),
+                'image_url': chunk['image_url'],
+                'price': chunk['price'].map(to_text),
+                'category': chunk['category'].map(lambda c: [str(v) for v in c] if isinstance(c, list) else []),
+                'main_cat': chunk['main_cat'].where(chunk['main_cat'].notna(), 'Beauty').map(to_text),
+            })
+            writer.write_table(pa.Table.from_pandas(table, schema=schema, preserve_index=False))
+            written += len(table)
+    return written
+
+
+def build(reviews_path, meta_path, out_dir, chunk_size=50000, iterations=30, factors=64, regularization=0.05,
+          dataset=None, seed=42):
+    """Run the whole pipeline into `out_dir`. Returns per-stage timings and counts."""
+    from sklearn.preprocessing import LabelEncoder
+
+    os.makedirs(out_dir, exist_ok=True)
+    stats = {}
+
+    def dump(name, obj):
+        with open(os.path.join(out_dir, name), "wb") as f:
+            pickle.dump(obj, f)
+
+    # 1. Reviews -> numeric columns
+    start = time.perf_counter()
+    user_ids, item_ids, cols = read_reviews(reviews_path, chunk_size=chunk_size)
+    stats['read_s'] = time.perf_counter() - start
+    stats['reviews_read'] = cols['rows_read']
+    stats['reviews_kept'] = len(cols['ts'])
+
+    # 2-3. Weights and temporal split
+    start = time.perf_counter()
+    t_max = cols['ts'].max() if len(cols['ts']) else 0
+    weights = interaction_weight(cols['rating'], cols['votes'], age_seconds=t_max - cols['ts'])
+    order, is_train = temporal_split(cols['user'], cols['ts'])
+    train_rows, test_rows = order[is_train], order[~is_train]
+
+    # 4. Encoders fit on train (test keeps only users / items known to them, as in the notebook)
+    user_classes, user_remap = label_codes(cols['user'][train_rows], user_ids)
+    item_classes, item_remap = label_codes(cols['item'][train_rows], item_ids)
+    train_user = user_remap[cols['user'][train_rows]]
+    train_item = item_remap[cols['item'][train_rows]]
+    train_matrix = scipy.sparse.csr_matrix((weights[train_rows], (train_user, train_item)),
+                                           shape=(len(user_classes), len(item_classes)))
+    train_matrix.sum_duplicates()
+    test_known = (user_remap[cols['user'][test_rows]] >= 0) & (item_remap[cols['item'][test_rows]] >= 0)
+    test_rows = test_rows[test_known]
+    stats['split_s'] = time.perf_counter() - start
+    stats.update(train=len(train_rows), test=len(test_rows), users=len(user_classes), items=len(item_classes))
+
+    # Artifacts
+    start = time.perf_counter()
+    user_encoder, item_encoder = LabelEncoder(), LabelEncoder()
+    user_encoder.classes_ = user_classes
+    item_encoder.classes_ = item_classes
+    dump("user_encoder.pkl", user_encoder)
+    dump("item_encoder.pkl", item_encoder)
+    dump("recent_items.pkl", recent_items_list(train_item, len(item_classes)))
+    user_counts = np.bincount(train_user, minlength=len(user_classes))
+    dump("user_interactions.pkl", dict(enumerate(user_counts.tolist())))
+    dump("config.pkl", {"model_name": "ALS Weighted + Cold-aware", "cold_threshold": 2, "topK": 10,
+                        "dataset": dataset or os.path.basename(reviews_path)})
+    scipy.sparse.save_npz(os.path.join(out_dir, "train_matrix.npz"), train_matrix)
+    pd.DataFrame({'user_id': user_ids[cols['user'][test_rows]], 'item_id': item_ids[cols['item'][test_rows]],
+                  'rating': cols['rating'][test_rows], 'ts': cols['ts'][test_rows]})\
+        .to_parquet(os.path.join(out_dir, "test.parquet"), index=False)
+    del cols, weights
+
+    # 5. Metadata
+    stats['meta_items'] = write_metadata(meta_path, os.path.join(out_dir, "items_metadata.parquet"))
+    stats['write_s'] = time.perf_counter() - start
+
+    # 6. Model
+    if iterations:
+        from als import AlternatingLeastSquares
+
+        start = time.perf_counter()
+        model = AlternatingLeastSquares(factors=factors, regularization=regularization, iterations=iterations,
+                                        random_state=seed).fit(train_matrix)
+        dump("als_weighted.pkl", model)
+        stats['train_s'] = time.perf_counter() - start
+    stats['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return stats
+
+
+def write_synthetic_dumps(reviews_path, meta_path, n_reviews, n_meta, n_users=None, seed=0, chunk_size=50000):
+    """JSON-lines .gz files shaped like the Amazon dumps (reviews with text, long-tailed items)."""
+    import gzip
+
+    rng = np.random.default_rng(seed)
+    n_users = n_users or max(n_reviews // 8, 1)
+    asins = np.array([f"B{i:09d}" for i in range(n_meta)], dtype=object)
+    popularity = 1.0 / np.arange(1, n_meta + 1) ** 0.8
+    popularity /= popularity.sum()
+    with gzip.open(reviews_path, "wt") as f:
+        for start in range(0, n_reviews, chunk_size):
+            n = min(chunk_size, n_reviews - start)
+            pd.DataFrame({
+                'overall': rng.integers(1, 6, n).astype(float),
+                'verified': rng.random(n) < 0.9,
+                'reviewTime': "01 1, 2018",
+                'reviewerID': [f"A{u:012d}" for u in rng.integers(0, n_users, n)],
+                'asin': asins[rng.choice(n_meta, n, p=popularity)],
+                'reviewerName': "reviewer",
+                'reviewText': "Works well, would buy again. " * 4,
+                'summary': "Good",
+                'unixReviewTime': rng.integers(1_300_000_000, 1_540_000_000, n),
+                'vote': np.where(rng.random(n) < 0.1, rng.integers(1, 2000, n).astype(str), None),
+            }).to_json(f, orient='records', lines=True)
+    with gzip.open(meta_path, "wt") as f:
+        for start in range(0, n_meta, chunk_size):
+            n = min(chunk_size, n_meta - start)
+            pd.DataFrame({
+                'asin': asins[start:start + n],
+                'title': [f"Product {i} hydrating serum" for i in range(start, start + n)],
+                'brand': "Brand",
+                'image': [[f"https://example.com/{a}.jpg"] for a in asins[start:start + n]],
+                'price': "$9.99",
+                'category': [["Beauty"] for _ in range(n)],
+                'main_cat': "All Beauty",
+                'description': [["A description."] for _ in range(n)],
+            }).to_json(f, orient='records', lines=True)
+
+
+def benchmark(n_reviews=1000000, n_meta=100000, chunk_size=50000):
+    """Build from synthetic dumps; the build runs in a fresh interpreter so its peak RSS excludes the generator."""
+    with tempfile.TemporaryDirectory() as tmp:
+        reviews_path = os.path.join(tmp, "reviews.json.gz")
+        meta_path = os.path.join(tmp, "meta.json.gz")
+        write_synthetic_dumps(reviews_path, meta_path, n_reviews, n_meta, chunk_size=chunk_size)
+        input_mb = (os.path.getsize(reviews_path) + os.path.getsize(meta_path)) / 2 ** 20
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "build", "--reviews", reviews_path,
+                              "--meta", meta_path, "--out", os.path.join(tmp, "artifacts"),
+                              "--chunk-size", str(chunk_size), "--iterations", "0"],
+                             capture_output=True, text=True, check=True)
+    return input_mb, out.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build recommender artifacts from the raw review / metadata dumps.")
+    parser.add_argument("command", choices=["build", "bench"])
+    parser.add_argument("--reviews", help="Reviews JSON lines (.gz) (build).")
+    parser.add_argument("--meta", help="Metadata JSON lines (.gz) (build).")
+    parser.add_argument("--out", default="artifacts")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=30, help="ALS iterations (0 = skip training).")
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--regularization", type=float, default=0.05)
+    parser.add_argument("--reviews-rows", type=int, default=1000000)
+    parser.add_argument("--meta-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not args.reviews or not args.meta:
+            parser.error("build needs --reviews and --meta")
+        stats = build(args.reviews, args.meta, args.out, chunk_size=args.chunk_size, iterations=args.iterations,
+                      factors=args.factors, regularization=args.regularization)
+    else:
+        input_mb, output = benchmark(args.reviews_rows, args.meta_rows, chunk_size=args.chunk_size)
+        print(f"input {input_mb:.1f} MB gzipped")
+        print(output, end="")
+        return
+    print(f"{stats['reviews_read']} reviews read, {stats['reviews_kept']} kept -> "
+          f"{stats['train']} train / {stats['test']} test, {stats['users']} users x {stats['items']} items, "
+          f"{stats['meta_items']} metadata rows")
+    print(f"read {stats['read_s']:.2f}s ({stats['reviews_read'] / max(stats['read_s'], 1e-9):,.0f} reviews/s), "
+          f"weights+split {stats['split_s']:.2f}s, write {stats['write_s']:.2f}s"
+          + (f", ALS {stats['train_s']:.2f}s" if 'train_s' in stats else "")
+          + f", peak RSS {stats['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Offline job: precompute top-N recommendations for every user known to the model.
+
+Writes two aligned arrays next to the other artifacts, one row per user index:
+    topn_items.npy   int32   (n_users, N) item indices, best first
+    topn_scores.npy  float32 (n_users, N) ALS scores
+
+Usage:
+    python precompute.py --top-n 50 --chunk-size 2048 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recommender import ARTIFACTS_DIR, Recommender
+from scoring import ScoringEngine
+
+# Per-process state for pool workers (set once by _init_worker)
+_worker = {}
+
+
+def _init_worker(user_factors, item_factors, train_matrix, top_n):
+    _worker['user_factors'] = user_factors
+    _worker['engine'] = ScoringEngine(item_factors)
+    _worker['train_matrix'] = train_matrix
+    _worker['top_n'] = top_n
+
+
+def _score_chunk(bounds):
+    start, stop = bounds
+    engine = _worker['engine']
+    items, scores = engine.recommend_batch(
+        _worker['user_factors'][start:stop],
+        k=_worker['top_n'],
+        exclude_rows=_worker['train_matrix'][start:stop],
+    )
+    return start, items.astype(np.int32), scores.astype(np.float32)
+
+
+def precompute_topn(recommender, output_dir, top_n=50, chunk_size=2048, workers=0):
+    """
+    Score all users chunk by chunk and stream the results into memory-mapped .npy files.
+    Peak memory is one (chunk_size, n_items) score block per worker.
+    """
+    n_users = len(recommender.user_ids)
+    top_n = min(top_n, recommender.engine.n_items)
+    os.makedirs(output_dir, exist_ok=True)
+
+    items_out = np.lib.format.open_memmap(
+        os.path.join(output_dir, "topn_items.npy"), mode='w+', dtype=np.int32, shape=(n_users, top_n))
+    scores_out = np.lib.format.open_memmap(
+        os.path.join(output_dir, "topn_scores.npy"), mode='w+', dtype=np.float32, shape=(n_users, top_n))
+
+    chunks = [(start, min(start + chunk_size, n_users)) for start in range(0, n_users, chunk_size)]
+    init_args = (np.asarray(recommender.als_model.user_factors, dtype=np.float32),
+                 recommender.engine.item_factors,
+                 recommender.train_matrix.tocsr(),
+                 top_n)
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as pool:
+            for start, items, scores in pool.map(_score_chunk, chunks):
+                items_out[start:start + len(items)] = items
+                scores_out[start:start + len(scores)] = scores
+    else:
+        _init_worker(*init_args)
+        for chunk in chunks:
+            start, items, scores = _score_chunk(chunk)
+            items_out[start:start + len(items)] = items
+            scores_out[start:start + len(scores)] = scores
+
+    items_out.flush()
+    scores_out.flush()
+    return n_users, top_n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendations for all known users.")
+    parser.add_argument("--artifacts-dir", default=ARTIFACTS_DIR)
+    parser.add_argument("--output-dir", default=None, help="Defaults to the artifacts directory.")
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--chunk-size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=0, help="Process pool size (0 = run in-process).")
+    args = parser.parse_args()
+
+    recommender = Recommender(artifacts_dir=args.artifacts_dir)
+    start = time.perf_counter()
+    n_users, top_n = precompute_topn(
+        recommender,
+        args.output_dir or args.artifacts_dir,
+        top_n=args.top_n,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+    )
+    elapsed = time.perf_counter() - start
+    print(f"Precomputed top-{top_n} for {n_users} users in {elapsed:.2f}s "
+          f"({n_users / max(elapsed, 1e-9):.0f} users/s).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Live user profiles: incrementally maintained session state for personalized requests.
+
+A profile keeps, per user, the recent items (model indices, bounded to `max_items`) with
+their recency-decayed confidence weights, and the running weighted sum of their item
+factors b = Σ w_i y_i. Logging an interaction updates both in O(f). The fold-in user
+vector is solved from them on demand and cached until the next interaction, so a
+repeated request costs one matrix-vector product and no database read.
+
+Weights decay as in foldin.interaction_weight (exp(-TIME_DECAY * age)). They are stored
+inflated to the profile's reference time t0, w·exp(λ(t - t0)), so an update never has
+to rescale the existing entries; reads multiply by exp(-λ(now - t0)).
+
+Profiles are evicted LRU (`max_users`) or after `ttl` seconds without access, and rebuilt
+from the interactions table (through a loader) on the next miss. A store belongs to
+one Recommender, since item indices are only valid for that model version.
+
+With several worker processes each one holds its own profiles, and only sees its own
+requests' events live. A profile is therefore stamped with the largest Interaction id
+it has folded in. At most once every `refresh_interval` seconds per profile, get() asks
+for the user's rows past that stamp (`newer`) and folds in those written by other
+workers, so events served elsewhere show up within that interval. Rows already applied
+from a local event are recognized by their events.event_key. A profile `max_items` or
+more rows behind is rebuilt.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+import numpy as np
+
+from events import event_key
+from foldin import INTERACTION_RATINGS, TIME_DECAY
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_seconds(timestamp):
+    """Naive UTC datetime -> epoch seconds (None = now)."""
+    return ((timestamp or datetime.utcnow()) - EPOCH).total_seconds()
+
+
+class LiveProfile:
+    __slots__ = ('t0', 'items', 'asins', 'b', 'vector', 'version', 'accessed_at', 'seen_id', 'checked_at',
+                 'keys')
+
+    def __init__(self, factors, t0, max_items):
+        self.t0 = t0
+        self.items = OrderedDict()              # item index -> inflated weight, oldest first
+        self.asins = deque(maxlen=max_items)    # recent ASINs (known to the model or not), newest first
+        self.b = np.zeros(factors)              # Σ inflated weight × item factors
+        self.vector = None                      # cached fold-in vector for `version`
+        self.version = 0
+        self.accessed_at = 0.0
+        self.seen_id = 0                        # largest Interaction id folded in
+        self.checked_at = 0.0                   # last time rows past seen_id were looked up
+        self.keys = deque(maxlen=2 * max_items)  # event_key of the latest applied events, for de-duplication
+
+    def add(self, asin, item_idx, weight, ts, item_factors, decay, max_items):
+        if asin in self.asins:
+            self.asins.remove(asin)
+        self.asins.appendleft(asin)
+        if item_idx < 0:
+            return
+        inflated = weight * np.exp(decay * (ts - self.t0))
+        self.items[item_idx] = self.items.pop(item_idx, 0.0) + inflated
+        self.b += inflated * item_factors[item_idx]
+        # Keep the item set bounded: drop the least recently touched item and its share of b
+        while len(self.items) > max_items:
+            old_idx, old_weight = self.items.popitem(last=False)
+            self.b -= old_weight * item_factors[old_idx]
+        self.vector = None
+        self.version += 1
+
+    def item_weights(self, decay, now):
+        """(item indices, current decayed weights) of the recent items."""
+        scale = np.exp(-decay * (now - self.t0))
+        indices = np.fromiter(self.items.keys(), dtype=np.int64, count=len(self.items))
+        weights = np.fromiter(self.items.values(), dtype=np.float64, count=len(self.items))
+        return indices, weights * scale
+
+
+class ProfileStore:
+    def __init__(self, item_ids, item_factors, foldin, max_users=100000, ttl=3600,
+                 max_items=50, decay=TIME_DECAY, refresh_interval=5.0, clock=time.time):
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+        self.foldin = foldin
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_items = max_items
+        self.decay = decay
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._profiles = OrderedDict()   # user_id -> LiveProfile, least recently used first
+        self._building = {}              # user_id -> events recorded while its profile is being loaded
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _new_profile(self):
+        return LiveProfile(self.item_factors.shape[1], self.clock(), self.max_items)
+
+    def _apply(self, profile, event):
+        rating = INTERACTION_RATINGS.get(event.interaction_type, 1.0)
+        item_idx = self.item_ids.get(event.product_asin)
+        profile.add(event.product_asin, -1 if item_idx is None else item_idx, rating,
+                    to_seconds(event.timestamp), self.item_factors, self.decay, self.max_items)
+        if event.timestamp:
+            profile.keys.append(event_key(event))
+
+    def _catch_up(self, profile, rows):
+        """Fold in Interaction rows past the profile's stamp, skipping events it already applied."""
+        for row in rows:
+            if not (row.timestamp and event_key(row) in profile.keys):
+                self._apply(profile, row)
+            profile.seen_id = max(profile.seen_id, row.id)
+
+    def get(self, user_id, loader, newer=None):
+        """
+        The user's profile; on a miss it is rebuilt from `loader()`, which returns the
+        user's recent interactions (objects with product_asin, interaction_type, timestamp).
+        `newer(after_id)` returns up to `max_items` of the user's Interaction rows with a
+        larger id, oldest first; a resident profile is brought up to date with them at most
+        once every `refresh_interval` seconds.
+        """
+        now = self.clock()
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and self.ttl is not None and now - profile.accessed_at > self.ttl:
+                del self._profiles[user_id]
+                profile = None
+            if profile is not None:
+                self._profiles.move_to_end(user_id)
+                profile.accessed_at = now
+                if newer is None or now - profile.checked_at < self.refresh_interval:
+                    self.hits += 1
+                    return profile
+                # Claimed under the lock, so concurrent requests don't all query
+                profile.checked_at = now
+                seen_id = profile.seen_id
+
+        if profile is not None:
+            rows = newer(seen_id)
+            with self._lock:
+                if len(rows) < self.max_items:
+                    self._catch_up(profile, rows)
+                    self.hits += 1
+                    return profile
+                # Too far behind (e.g. a burst served by other workers): rebuild it
+                if self._profiles.get(user_id) is profile:
+                    del self._profiles[user_id]
+
+        with self._lock:
+            self.misses += 1
+            self._building.setdefault(user_id, [])
+
+        try:
+            interactions = loader()
+        except Exception:
+            with self._lock:
+                self._building.pop(user_id, None)
+            raise
+        profile = self._new_profile()
+        for interaction in sorted(interactions, key=lambda i: i.timestamp or datetime.min):
+            self._apply(profile, interaction)
+        # Unflushed events from the overlay have no id yet
+        profile.seen_id = max((getattr(i, 'id', None) or 0 for i in interactions), default=0)
+        profile.checked_at = now
+
+        with self._lock:
+            # Events logged while the loader ran, unless it already returned them
+            loaded = {event_key(i) for i in interactions if i.timestamp}
+            for event in self._building.pop(user_id, []):
+                if event_key(event) not in loaded:
+                    self._apply(profile, event)
+            profile.accessed_at = now
+            self._profiles[user_id] = profile
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+                self.evictions += 1
+        return profile
+
+    def record(self, event):
+        """Fold one new interaction into the user's profile if it is resident (O(f))."""
+        with self._lock:
+            profile = self._profiles.get(event.user_id)
+            if profile is not None:
+                self._apply(profile, event)
+            elif event.user_id in self._building:
+                self._building[event.user_id].append(event)
+
+    def recent_asins(self, profile):
+        """A profile's recent ASINs, newest first."""
+        with self._lock:
+            return list(profile.asins)
+
+    def item_weights(self, profile):
+        """(item indices, current decayed weights) of a profile's recent items."""
+        with self._lock:
+            return profile.item_weights(self.decay, self.clock())
+
+    def vector(self, profile):
+        """Fold-in user vector for a profile's recent items (cached until its next interaction)."""
+        now = self.clock()
+        with self._lock:
+            if profile.vector is not None:
+                return profile.vector
+            version = profile.version
+            indices, weights = profile.item_weights(self.decay, now)
+            b = profile.b * (self.foldin.alpha * np.exp(-self.decay * (now - profile.t0)))
+        if not len(indices):
+            vector = np.zeros(self.foldin.item_factors.shape[1], dtype=np.float32)
+        else:
+            vector = self.foldin.solve_confidence(indices, self.foldin.alpha * weights, b=b)
+        with self._lock:
+            if profile.version == version:
+                profile.vector = vector
+        return vector
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(user_id, None)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._profiles),
+        }
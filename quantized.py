@@ -0,0 +1,196 @@
+"""
+Int8-quantized item factors with exact re-ranking of a shortlist.
+
+Each item vector is split into blocks of `block_size` factors (one block = per-row
+scaling) and every block is stored as int8 codes with its own float32 scale
+(max|x| / 127). A query is scored against all items in the compressed domain, in
+chunks so the float32 temporary stays small. The best `shortlist` items are then
+re-scored with the exact float32 vectors. These can stay memory-mapped in a bundle,
+so only the shortlist rows are read.
+
+The index has the same interface as ann.IVFIndex and attaches to the ScoringEngine
+the same way. It is built next to the other artifacts as quantized_ip.npz (raw factors,
+inner product).
+
+Usage:
+    python quantized.py build --block-size 16
+    python quantized.py report --sizes 10000,100000,500000 --factors 64
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from scoring import ScoringEngine
+
+
+def quantize_blocks(vectors, block_size=None):
+    """(int8 codes (n, f), float32 scales (n, f // block_size)); block_size=None means one scale per row."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n, factors = vectors.shape
+    block_size = block_size or factors
+    if factors % block_size:
+        raise ValueError(f"block_size {block_size} does not divide {factors} factors")
+    blocks = vectors.reshape(n, factors // block_size, block_size)
+    scales = np.abs(blocks).max(axis=2) / 127.0
+    safe = np.where(scales > 0, scales, 1.0)
+    codes = np.clip(np.rint(blocks / safe[:, :, None]), -127, 127).astype(np.int8)
+    return codes.reshape(n, factors), scales.astype(np.float32)
+
+
+class QuantizedIndex:
+    def __init__(self, codes, scales, exact_vectors, shortlist=256, chunk_size=16384):
+        self.codes = codes
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.exact_vectors = exact_vectors
+        self.shortlist = shortlist
+        self.chunk_size = chunk_size
+        self.n_items, self.factors = codes.shape
+        self.n_blocks = self.scales.shape[1]
+        self.block_size = self.factors // self.n_blocks
+
+    @classmethod
+    def build(cls, item_factors, block_size=None, shortlist=256):
+        codes, scales = quantize_blocks(item_factors, block_size)
+        return cls(codes, scales, np.asarray(item_factors, dtype=np.float32), shortlist=shortlist)
+
+    def update(self, item_factors, changed):
+        """
+        Store for new item factors where only the `changed` rows and the rows past the end of
+        this store (new items) are re-encoded; every other row keeps its codes.
+        """
+        vectors = np.asarray(item_factors, dtype=np.float32)
+        changed = np.union1d(np.asarray(changed, dtype=np.int64), np.arange(self.n_items, len(vectors)))
+        codes = np.zeros((len(vectors), self.factors), dtype=np.int8)
+        codes[:self.n_items] = self.codes
+        scales = np.zeros((len(vectors), self.n_blocks), dtype=np.float32)
+        scales[:self.n_items] = self.scales
+        codes[changed], scales[changed] = quantize_blocks(vectors[changed], self.block_size)
+        return QuantizedIndex(codes, scales, vectors, shortlist=self.shortlist, chunk_size=self.chunk_size)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scales.nbytes
+
+    def approximate_scores(self, query):
+        """Scores of every item in the compressed domain (block dot products × block scales)."""
+        query = np.asarray(query, dtype=np.float32)
+        # Block-diagonal (factors, n_blocks) query, so all block dot products are one BLAS GEMM per chunk
+        blocks = np.zeros((self.factors, self.n_blocks), dtype=np.float32)
+        rows = np.arange(self.factors)
+        blocks[rows, rows // self.block_size] = query
+        scores = np.empty(self.n_items, dtype=np.float32)
+        for start in range(0, self.n_items, self.chunk_size):
+            stop = min(start + self.chunk_size, self.n_items)
+            partial = self.codes[start:stop].astype(np.float32).dot(blocks)
+            scores[start:stop] = (partial * self.scales[start:stop]).sum(axis=1)
+        return scores
+
+    def search(self, query, k=10, exclude=None, shortlist=None):
+        """
+        Top-k for one query vector: compressed scan for a shortlist, exact float32 re-score of it.
+        Returns (item_indices, scores), best first.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.approximate_scores(query)
+        if exclude is not None and len(exclude):
+            ScoringEngine.mask(scores, exclude)
+        candidates = ScoringEngine.top_k(scores, max(shortlist or self.shortlist, k))
+        candidates = candidates[np.isfinite(scores[candidates])]
+
+        # Sorted rows read the (possibly memory-mapped) exact vectors in file order
+        candidates = np.sort(candidates)
+        exact = np.asarray(self.exact_vectors[candidates], dtype=np.float32).dot(query)
+        top = ScoringEngine.top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def save(self, path):
+        np.savez(path, codes=self.codes, scales=self.scales, shortlist=np.array(self.shortlist))
+
+    @classmethod
+    def load(cls, path, exact_vectors, shortlist=None):
+        """`exact_vectors` are the float32 factors to re-rank with."""
+        with np.load(path) as data:
+            return cls(data['codes'], data['scales'], exact_vectors, shortlist=shortlist or int(data['shortlist']))
+
+
+def index_path(artifacts_dir):
+    return os.path.join(artifacts_dir, "quantized_ip.npz")
+
+
+def report(sizes, factors=64, k=10, shortlists=(64, 256, 1024), block_sizes=(None, 16), n_queries=100, seed=0):
+    """Top-k overlap with exact search, memory and latency at each catalog size."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n_items in sizes:
+        # Low-rank structure plus noise, closer to trained factors than i.i.d. Gaussians
+        basis = rng.normal(size=(8, factors)).astype(np.float32)
+        item_factors = (rng.normal(size=(n_items, 8)).astype(np.float32).dot(basis)
+                        + rng.normal(0, 0.5, (n_items, factors)).astype(np.float32)) * 0.1
+        queries = rng.normal(size=(n_queries, factors)).astype(np.float32)
+        engine = ScoringEngine(item_factors)
+
+        exact, times = [], []
+        for q in queries:
+            start = time.perf_counter()
+            exact.append(set(engine.top_k(engine.score(q), k).tolist()))
+            times.append(time.perf_counter() - start)
+        rows.append({'items': n_items, 'variant': 'float32', 'mb': engine.item_factors.nbytes / 2 ** 20,
+                     'overlap': 1.0, 'mean_ms': 1000 * np.mean(times)})
+
+        for block_size in block_sizes:
+            index = QuantizedIndex.build(item_factors, block_size=block_size)
+            for shortlist in shortlists:
+                hits, times = 0, []
+                for q, truth in zip(queries, exact):
+                    start = time.perf_counter()
+                    items, _ = index.search(q, k, shortlist=shortlist)
+                    times.append(time.perf_counter() - start)
+                    hits += len(truth.intersection(items.tolist()))
+                rows.append({'items': n_items, 'variant': f"int8/{block_size or 'row'} sl={shortlist}",
+                             'mb': index.nbytes / 2 ** 20, 'overlap': hits / (k * n_queries),
+                             'mean_ms': 1000 * np.mean(times)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the int8 item-factor store.")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--artifacts-dir", default="artifacts")
+    parser.add_argument("--block-size", type=int, default=None, help="Factors per scale (default: one per row).")
+    parser.add_argument("--shortlist", type=int, default=256)
+    parser.add_argument("--sizes", default="10000,100000,500000")
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print(f"{'items':>8} {'variant':<22} {'MB':>8} {'overlap@' + str(args.k):>11} {'mean ms':>8}")
+        for row in report([int(s) for s in args.sizes.split(',')], factors=args.factors, k=args.k):
+            print(f"{row['items']:>8} {row['variant']:<22} {row['mb']:>8.1f} {row['overlap']:>11.3f} "
+                  f"{row['mean_ms']:>8.3f}")
+        return
+
+    from recommender import Recommender
+    recommender = Recommender(artifacts_dir=args.artifacts_dir)
+    start = time.perf_counter()
+    index = QuantizedIndex.build(recommender.engine.item_factors, block_size=args.block_size,
+                                 shortlist=args.shortlist)
+    path = index_path(args.artifacts_dir)
+    index.save(path)
+    print(f"{index.n_items} items, {index.nbytes / 2 ** 20:.1f} MB "
+          f"built in {time.perf_counter() - start:.2f}s -> {path}")
+
+    # Agreement with exact search for a sample of the model's users
+    engine = recommender.engine
+    user_factors = np.asarray(recommender.als_model.user_factors, dtype=np.float32)
+    sample = user_factors[np.random.default_rng(0).choice(len(user_factors), min(200, len(user_factors)),
+                                                          replace=False)]
+    hits = sum(len(set(engine.top_k(engine.score(u), args.k).tolist()) & set(index.search(u, args.k)[0].tolist()))
+               for u in sample)
+    print(f"overlap@{args.k} with exact search: {hits / (args.k * max(len(sample), 1)):.3f}")
+
+
+if __name__ == '__main__':
+    main()
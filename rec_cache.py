@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend:
+    """
+    Storage interface for the recommendation cache.
+    Implement this on top of a shared store (Redis, memcached...) for multi-worker deployments.
+    """
+
+    evictions = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def incr(self, key, ttl=None):
+        """
+        Atomically move a counter to a value it never had before and return it.
+        With a ttl the counter is dropped (reads as 0 again) ttl seconds after its last increment.
+        """
+        raise NotImplementedError
+
+    def counter(self, key):
+        """Current value of a counter (0 if unset or expired)."""
+        raise NotImplementedError
+
+    def __len__(self):
+        return 0
+
+
+class InMemoryBackend(CacheBackend):
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = OrderedDict()  # key -> (expires_at, value), oldest increment first
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key, ttl=None):
+        now = self.clock()
+        with self._lock:
+            # One sequence for every counter, so a counter that expired never repeats an old value
+            self._sequence += 1
+            self._counters[key] = (now + ttl if ttl else None, self._sequence)
+            self._counters.move_to_end(key)
+            # Counters share one ttl in practice, so the expired ones are at the front
+            while self._counters:
+                expires_at, _ = next(iter(self._counters.values()))
+                if expires_at is None or expires_at > now:
+                    break
+                self._counters.popitem(last=False)
+            return self._sequence
+
+    def counter(self, key):
+        entry = self._counters.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= self.clock()):
+            return 0
+        return entry[1]
+
+    def counters(self):
+        return len(self._counters)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RecommendationCache:
+    """
+    Cache of rendered recommendation lists keyed by (user, k, mode).
+
+    Invalidation bumps a per-user generation counter that is part of every key,
+    so all of a user's entries go stale at once without scanning the store
+    (the old entries simply age out through LRU/TTL).
+
+    get_or_compute reads the key before computing and stores under that same key, so a
+    list computed while the user was invalidated lands under the old generation and is
+    never served. Entries expire ttl seconds after their key was read. Any entry of a
+    generation is then gone ttl seconds after the next increment, so the counters can
+    expire too (they never return to an old value, see CacheBackend.incr).
+    """
+
+    def __init__(self, backend=None, ttl=300, clock=None):
+        self.backend = backend if backend is not None else InMemoryBackend()
+        self.ttl = ttl
+        self.clock = clock or getattr(self.backend, 'clock', time.monotonic)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, user, k, mode):
+        generation = self.backend.counter(('gen', user))
+        epoch = self.backend.counter(('gen', '*'))
+        return ('rec', user, epoch, generation, k, mode)
+
+    def get_or_compute(self, user, k, mode, compute):
+        """Cached value for (user, k, mode), or compute() stored under the key read before computing."""
+        read_at = self.clock()
+        key = self._key(user, k, mode)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        if not self.ttl:
+            self.backend.set(key, value, None)
+        else:
+            remaining = self.ttl - (self.clock() - read_at)
+            if remaining > 0:
+                self.backend.set(key, value, remaining)
+        return value
+
+    def invalidate(self, user):
+        """Drop every cached entry for a user (call after logging a new interaction)."""
+        self.backend.incr(('gen', user), self.ttl)
+        self.invalidations += 1
+
+    def invalidate_all(self):
+        """Drop every cached entry (e.g. after a new model version goes live)."""
+        self.backend.incr(('gen', '*'), self.ttl)
+        self.invalidations += 1
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+            'size': len(self.backend),
+        }
@@ -1,103 +1,187 @@
 import os
+import logging
 import joblib
-import pandas as pd
 import numpy as np
-import scipy.sparse
 import pickle
 
+import quantized
+import rerank
+from ann import IVFIndex, index_path
+from bundle import load_model
+from embeddings import EmbeddingStore
+from filters import ExclusionSet, ItemFilters
+from foldin import FoldIn
+from hydration import ProductHydrator
+from itemmeta import ItemMetadata
+from instrumentation import annotate, metrics, span
+from profiles import ProfileStore
+from scoring import ScoringEngine
+
 # Configuration
-ARTIFACTS_DIR = 'artifacts'
+ARTIFACTS_DIR = os.environ.get('ARTIFACTS_DIR', 'artifacts')
+
+logger = logging.getLogger(__name__)
+
+
+def record_strategy(strategy):
+    """Count which strategy served a request (warm_als, live_history, category_fallback, cold_start)."""
+    metrics.inc('recommender_requests_total', strategy=strategy)
+    annotate(strategy=strategy)
+
+
+def adaptive_alpha(n_interactions):
+    """ALS weight of the hybrid blend (notebook thresholds): cold users lean on content, active users on ALS."""
+    if n_interactions < 2:
+        return 0.3
+    elif n_interactions < 5:
+        return 0.5
+    return 0.8
+
 
 class Recommender:
-    def __init__(self):
-        print("Loading artifacts...")
-        # Load artifacts
-        self.als_model = self.load_pickle("als_weighted.pkl")
-        self.user_encoder = self.load_pickle("user_encoder.pkl")
-        self.item_encoder = self.load_pickle("item_encoder.pkl")
-        self.recent_items = self.load_pickle("recent_items.pkl")
-        self.config = self.load_pickle("config.pkl")
-        self.train_matrix = scipy.sparse.load_npz(os.path.join(ARTIFACTS_DIR, "train_matrix.npz"))
-        
-        # Load metadata
-        self.meta_df = pd.read_parquet(os.path.join(ARTIFACTS_DIR, "items_metadata.parquet"))
-        # Ensure 'asin' is index for fast lookup
-        if 'asin' in self.meta_df.columns:
-            self.meta_df.set_index('asin', inplace=True)
-            
-        # Build category map for Content-Based Fallback
-        self.category_map = {}
-        if 'main_cat' in self.meta_df.columns:
-            # Group by category
-            grouped = self.meta_df.groupby('main_cat')
-            for cat, group in grouped:
-                self.category_map[cat] = group.index.tolist()
+    def __init__(self, artifacts_dir=ARTIFACTS_DIR):
+        self.artifacts_dir = artifacts_dir
+        logger.info("Loading artifacts from %s...", self.artifacts_dir)
+        # Load artifacts (memory-mapped bundle if present, legacy pickles otherwise),
+        # with O(1) id <-> index maps (used instead of the encoders on the hot path)
+        state = load_model(self.artifacts_dir)
+        self.version = state.version
+        self.als_model = state.model
+        self.recent_items = state.recent_items
+        self.config = state.config
+        self.train_matrix = state.train_matrix
+        self.user_ids = state.user_ids
+        self.item_ids = state.item_ids
+        item_factors_norm = state.item_factors_norm
+
+        # Load metadata (columnar, aligned with the item indices; see itemmeta.py)
+        self.catalog = ItemMetadata.load(os.path.join(self.artifacts_dir, "items_metadata.parquet"), self.item_ids)
+
+        # Scoring engine (float32 raw + normalized item factors, built once)
+        self.engine = ScoringEngine(self.als_model.item_factors, item_factors_norm=item_factors_norm)
+        # Approximate index is optional (built offline with ann.py for large catalogs)
+        path = index_path(self.artifacts_dir)
+        if os.path.exists(path):
+            self.engine.attach_index(IVFIndex.load(path, nprobe=self.config.get('ann_nprobe')))
+        # Int8 factor store with exact re-ranking (quantized.py), when no IVF index is loaded
+        path = quantized.index_path(self.artifacts_dir)
+        if self.engine.index is None and os.path.exists(path):
+            self.engine.attach_index(quantized.QuantizedIndex.load(
+                path, self.engine.item_factors, shortlist=self.config.get('quantized_shortlist')))
+
+        # Precomputed SBERT item embeddings for the hybrid mode (optional, memory-mapped, quantized)
+        self.embeddings = EmbeddingStore.load(self.artifacts_dir) if EmbeddingStore.exists(self.artifacts_dir) else None
+
+        # ALS fold-in solver (YᵀY + λI cached) for live / cold users
+        self.foldin = FoldIn(self.engine.item_factors,
+                             regularization=getattr(self.als_model, 'regularization', 0.05),
+                             alpha=getattr(self.als_model, 'alpha', 1.0))
+
+        # Live per-user session profiles (recent items + running factor sum), bound to this model's item indices
+        self.profiles = ProfileStore(self.item_ids, self.engine.item_factors, self.foldin)
+
+        # Precomputed per-main_cat / per-brand item filters for constrained queries (filters.py)
+        self.filters = ItemFilters.from_catalog(self.catalog)
+        # Popularity list (cold start) as model item indices, for filtered cold-start queries
+        self.popular_items = np.asarray(self.recent_items if isinstance(self.recent_items, list) else [],
+                                        dtype=np.int64)
+
+        # Re-ranking stage after candidate generation (popularity debiasing, MMR, brand / category caps),
+        # opt-in through the model config
+        self.configure_rerank(**self.config.get('rerank', {}))
+
+        # Product hydration cache (ready-to-render dicts, one SQL query per batch of misses)
+        self.products = ProductHydrator()
         
-        print("Artifacts loaded successfully.")
+        logger.info("Artifacts loaded successfully.")
 
     def load_pickle(self, filename):
-        path = os.path.join(ARTIFACTS_DIR, filename)
+        path = os.path.join(self.artifacts_dir, filename)
         with open(path, "rb") as f:
             return pickle.load(f)
 
+    def encode_items(self, asins):
+        """Encode a list of ASINs into item indices (-1 for ASINs unknown to the model)."""
+        return self.item_ids.encode(asins)
+
+    def decode_items(self, indices):
+        """Decode an array of item indices into a list of ASINs."""
+        return self.item_ids.decode(indices)
+
+    def configure_rerank(self, **params):
+        """Build (or drop) the re-ranking stage from rerank.DEFAULTS overridden by `params`."""
+        params = {**rerank.DEFAULTS, **params}
+        self.reranker = None
+        if params.pop('enabled'):
+            self.reranker = rerank.Reranker(
+                self.engine.item_factors_norm,
+                popularity=np.bincount(self.train_matrix.indices, minlength=self.engine.n_items),
+                brands=self.catalog.brand_codes[:self.engine.n_items],
+                categories=self.catalog.main_cat_codes[:self.engine.n_items],
+                **params)
+
+    def rank(self, user_vector, k=10, exclude=None, n_interactions=0, allowed=None):
+        """
+        Top-k item indices for a user vector: candidate generation, then the re-ranking stage (if enabled).
+        `allowed` (a filters.ItemFilter) restricts the candidates before the top-k.
+        """
+        if self.reranker is None:
+            return self.engine.recommend(user_vector, k=k, exclude=exclude, allowed=allowed)
+        candidates = self.engine.recommend(user_vector, k=max(k, self.reranker.n_candidates), exclude=exclude,
+                                           allowed=allowed)
+        if exclude is not None and len(exclude):
+            candidates = candidates[~np.isin(candidates, exclude)]  # small catalogs: masked items can fill the list
+        with span('rerank'):
+            scores = self.engine.item_factors[candidates].dot(np.asarray(user_vector, dtype=np.float32))
+            return self.reranker.rerank(candidates, scores, k, n_interactions)
+
+    def rank_hybrid(self, user_vector, seen, k=10, exclude=None, allowed=None, n_candidates=300):
+        """
+        Top-k item indices of the hybrid blend: the top `n_candidates` by ALS score, re-scored with
+        alpha * ALS + (1 - alpha) * content similarity to the `seen` items, then re-ranked (if enabled).
+        """
+        seen = np.unique(seen)
+        candidates = self.engine.recommend(user_vector, k=n_candidates, exclude=exclude, allowed=allowed)
+        if exclude is not None and len(exclude):
+            candidates = candidates[~np.isin(candidates, exclude)]  # small catalogs: masked items can fill the list
+        with span('hybrid_blend'):
+            als_scores = self.engine.item_factors[candidates].dot(np.asarray(user_vector, dtype=np.float32))
+            content_scores = self.embeddings.score(self.embeddings.profile(seen), candidates)
+            alpha = adaptive_alpha(len(seen))
+            blended = alpha * als_scores + (1 - alpha) * content_scores
+        if self.reranker is not None:
+            with span('rerank'):
+                return self.reranker.rerank(candidates, blended, k, len(seen))
+        return candidates[self.engine.top_k(blended, k)]
+
     def get_product_details(self, asins):
-        """Retrieve product details from SQL Database (source of truth)."""
-        # Lazy import to avoid circular dependency
-        from models import Product
-        
-        # Query DB for these ASINs
-        # We need to preserve order, so we fetch all then reorder
-        products_db = Product.query.filter(Product.asin.in_(asins)).all()
-        
-        # Create a map for fast lookup
-        product_map = {p.asin: p for p in products_db}
-        
-        final_products = []
-        for asin in asins:
-            p = product_map.get(asin)
-            if p:
-                # Convert to dict
-                p_dict = {
-                    'asin': p.asin,
-                    'title': p.title,
-                    'brand': p.brand,
-                    'main_cat': p.main_cat,
-                    'image_url': p.image_url,
-                    'price': None, # SQL model doesn't have price yet
-                    'avg_rating': p.avg_rating,
-                    'popularity': p.popularity
-                }
-                final_products.append(p_dict)
-                
-        # Clean up image_urls (legacy check if DB has weird formats)
-        for p in final_products:
-            img = p.get('image_url')
-            if isinstance(img, str) and img.startswith("['") and img.endswith("']"):
-                try:
-                    import ast
-                    actual_list = ast.literal_eval(img)
-                    if actual_list:
-                        p['image_url'] = actual_list[0]
-                except:
-                    pass
-            # If no image, placeholder
-            if not p.get('image_url'):
-                p['image_url'] = "https://via.placeholder.com/300x300?text=No+Image"
-                
-        return final_products
+        """Retrieve product details from SQL Database (source of truth), through the hydration cache."""
+        with span('hydration'):
+            return self.products.get_many(list(asins))
 
-    def recommend(self, username, recent_asins=None, k=10):
+    def recommend(self, username, recent_asins=None, k=10, recent_weights=None, profile=None,
+                  category=None, brand=None, exclude_asins=None):
         """
         Main recommendation function.
         Returns a list of product dictionaries.
+        When `recent_weights` (one confidence weight per recent ASIN, see foldin.weights_from_interactions)
+        is given, a warm user's vector is refreshed by folding in their training row plus the recent items.
+        A live `profile` (see profiles.ProfileStore) replaces recent_asins / recent_weights.
+        `category` / `brand` (a name or a list of names) restrict the results to matching items, ranked by
+        the model in one masked top-k. `exclude_asins` (e.g. cart and wishlist) are never returned.
         """
-        if recent_asins is None:
-            recent_asins = []
-
         # 1. Translate username to user_idx
-        user_idx = None
-        if username in self.user_encoder.classes_:
-            user_idx = self.user_encoder.transform([username])[0]
+        with span('id_lookup'):
+            user_idx = self.user_ids.get(username)
+            if profile is not None:
+                recent_asins = self.profiles.recent_asins(profile)
+                known_indices, known_weights = self.profiles.item_weights(profile)
+            else:
+                recent_asins = recent_asins or []
+                recent_indices = self.encode_items(recent_asins)
+                known = recent_indices >= 0
+                known_indices = recent_indices[known]
+                known_weights = None if recent_weights is None else np.asarray(recent_weights, dtype=np.float64)[known]
 
         # 2. Check if user needs "Live" recommendations (New User or Low History but has Session Data)
         # If user is unknown OR has little history in training data, try to use recent_asins
@@ -113,169 +197,255 @@ class Recommender:
 
         # If we should use live recs and have data
         if use_live_recs and recent_asins:
-            print(f"User {username} is cold-start but has {len(recent_asins)} recent interactions. Using Hybrid/Content logic.")
-            return self.recommend_from_history(recent_asins, k=k)
-            
+            logger.debug("User %s is cold-start but has %d recent interactions. Using live history.",
+                         username, len(recent_asins))
+            return self.recommend_from_history(recent_asins, k=k, weights=recent_weights, profile=profile,
+                                               category=category, brand=brand, exclude_asins=exclude_asins)
+
+        allowed = self.filters.query(category, brand)
+        exclusion = ExclusionSet(known_indices).add_asins(self.item_ids, exclude_asins)
+
         # Fallback to pure Cold Start if no user_idx and no history
         if user_idx is None:
-            print(f"User {username} not in encoder and no history. Cold start.")
-            return self.get_cold_start_items(k)
+            logger.debug("User %s not in model and no history. Cold start.", username)
+            record_strategy('cold_start')
+            return self.get_cold_start_items(k, category=category, brand=brand, exclude=exclusion.indices())
 
         # 3. Standard Matrix Factorization Score (for existing users)
         try:
             user_factors = self.als_model.user_factors[user_idx]
-            item_factors = self.als_model.item_factors
-            
-            scores = item_factors.dot(user_factors)
 
             # Filter already liked items from training data
-            liked_indices = self.train_matrix[user_idx].indices
-            scores[liked_indices] = -np.inf
-
-            # Also filter items currently in recent_asins (don't recommend what they just saw)
-            # Convert recent_asins to indices
-            for asin in recent_asins:
-                if asin in self.item_encoder.classes_:
-                    idx = self.item_encoder.transform([asin])[0]
-                    scores[idx] = -np.inf
-
-            top_indices = np.argsort(scores)[::-1][:k]
-            top_asins = self.item_encoder.inverse_transform(top_indices.astype(int))
+            train_row = self.train_matrix[user_idx]
+            liked_indices = train_row.indices
+
+            # Also filter items currently in recent_asins (don't recommend what they just saw), cart, wishlist
+            seen = np.concatenate([liked_indices, known_indices])
+            excluded = exclusion.add(liked_indices).indices()
+
+            # Refresh the user vector with their live interactions (exact ALS fold-in)
+            if known_weights is not None and len(known_indices):
+                user_factors = self.foldin.solve(seen, np.concatenate([train_row.data, known_weights]))
+
+            top_indices = self.rank(user_factors, k=k, exclude=excluded, n_interactions=len(seen), allowed=allowed)
+            top_asins = self.decode_items(top_indices)
+            record_strategy('warm_als')
             return self.get_product_details(top_asins)
 
-        except Exception as e:
-            print(f"Error during recommendation: {e}")
-            import traceback
-            traceback.print_exc()
-            return self.get_cold_start_items(k)
+        except Exception:
+            logger.exception("Error during recommendation for user %s", username)
+            metrics.inc('recommender_errors_total')
+            record_strategy('cold_start')
+            return self.get_cold_start_items(k, category=category, brand=brand, exclude=exclusion.indices())
+
+    def recommend_hybrid(self, username, recent_asins=None, k=10, recent_weights=None, profile=None,
+                         n_candidates=300, category=None, brand=None, exclude_asins=None):
+        """
+        Hybrid ALS + SBERT (recommend_hybrid_adaptive in the notebook):
+        1. Top `n_candidates` items by ALS score (warm vector, or fold-in of the session items).
+        2. Content score = cosine between each candidate's embedding and the mean embedding of the user's items.
+        3. Blend alpha * ALS + (1 - alpha) * content for all candidates at once, alpha from adaptive_alpha.
+        `category` / `brand` / `exclude_asins` constrain the candidates as in recommend().
+        Falls back to recommend() when no embeddings artifact is loaded.
+        """
+        if self.embeddings is None:
+            return self.recommend(username, recent_asins=recent_asins, k=k, recent_weights=recent_weights,
+                                  profile=profile, category=category, brand=brand, exclude_asins=exclude_asins)
+
+        # 1. Translate ids
+        with span('id_lookup'):
+            user_idx = self.user_ids.get(username)
+            if profile is not None:
+                known_indices, known_weights = self.profiles.item_weights(profile)
+            else:
+                recent_indices = self.encode_items(recent_asins or [])
+                known = recent_indices >= 0
+                known_indices = recent_indices[known]
+                known_weights = None if recent_weights is None else np.asarray(recent_weights, dtype=np.float64)[known]
+
+        allowed = self.filters.query(category, brand)
+        exclusion = ExclusionSet(known_indices).add_asins(self.item_ids, exclude_asins)
+
+        if user_idx is None and not len(known_indices):
+            record_strategy('cold_start')
+            return self.get_cold_start_items(k, category=category, brand=brand, exclude=exclusion.indices())
+
+        try:
+            # 2. ALS user vector (training row refreshed with the session, or session only)
+            if user_idx is not None:
+                train_row = self.train_matrix[user_idx]
+                seen = np.concatenate([train_row.indices, known_indices])
+                user_vector = self.als_model.user_factors[user_idx]
+                if known_weights is not None and len(known_indices):
+                    user_vector = self.foldin.solve(seen, np.concatenate([train_row.data, known_weights]))
+            else:
+                seen = known_indices
+                user_vector = (self.profiles.vector(profile) if profile is not None
+                               else self.foldin.solve(known_indices, known_weights))
+
+            # 3. ALS candidates, then one vectorized blend over all of them
+            excluded = exclusion.add(seen).indices()
+            top_indices = self.rank_hybrid(user_vector, seen, k=k, exclude=excluded, allowed=allowed,
+                                           n_candidates=n_candidates)
+            record_strategy('hybrid')
+            return self.get_product_details(self.decode_items(top_indices))
+
+        except Exception:
+            logger.exception("Error during hybrid recommendation for user %s", username)
+            metrics.inc('recommender_errors_total')
+            record_strategy('cold_start')
+            return self.get_cold_start_items(k, category=category, brand=brand, exclude=exclusion.indices())
+
+    def recommend_batch_indices(self, user_indices, k=10):
+        """
+        Score a block of known users with one GEMM.
+        Items already liked in the training data are excluded.
+        Returns (item_indices, scores) arrays of shape (len(user_indices), k).
+        """
+        user_indices = np.asarray(user_indices, dtype=np.int64)
+        user_factors = self.als_model.user_factors[user_indices]
+        liked = self.train_matrix[user_indices]
+        return self.engine.recommend_batch(user_factors, k=k, exclude_rows=liked)
+
+    def recommend_batch(self, usernames, k=10):
+        """
+        Batch version of the warm ALS path.
+        Returns one list of ASINs per username (empty for users unknown to the model).
+        """
+        user_indices = self.user_ids.encode(usernames)
+        known = np.flatnonzero(user_indices >= 0)
+        results = [[] for _ in usernames]
+        if len(known):
+            top_indices, _ = self.recommend_batch_indices(user_indices[known], k=k)
+            for row, pos in enumerate(known):
+                results[pos] = self.decode_items(top_indices[row])
+        return results
+
+    def item_category(self, asin):
+        """main_cat of an ASIN from the item metadata (None if unknown or empty)."""
+        row = self.catalog.row(asin)
+        return self.catalog.main_cats([row])[0] if row >= 0 else None
+
+    def rank_in_category(self, category, user_vector=None, k=10, exclude=None, allowed=None):
+        """
+        Model item indices of `category` (AND `allowed`), best first: ranked by the user vector when there
+        is one, by popularity otherwise. Only the category's rows are scored.
+        """
+        in_category = self.filters.category(category)
+        if allowed is not None:
+            in_category = in_category & allowed
+        if user_vector is None:
+            return self.popular_indices(k, allowed=in_category, exclude=exclude)
+        return self.engine.recommend(user_vector, k=k, exclude=exclude, allowed=in_category)
 
     def recommend_by_category(self, asins, k=10):
         """
-        Fallback: Recommend items from the same category as the input asins.
+        Fallback: Recommend items from the same category as the input asins,
+        ranked by the ALS fold-in of the input asins (popularity if none is known to the model).
         """
-        cats = []
-        for asin in asins:
-            if asin in self.meta_df.index:
-                c = self.meta_df.loc[asin, 'main_cat']
-                if c: cats.append(c)
-        
-        if not cats:
-            return self.get_cold_start_items(k)
-            
         # Pick most frequent category
-        from collections import Counter
-        target_cat = Counter(cats).most_common(1)[0][0]
-        
-        print(f"ALS Fallback: Recommending items from category '{target_cat}'")
+        target_cat = self.catalog.most_common_main_cat(self.catalog.rows(asins))
+        if target_cat is None:
+            return self.get_cold_start_items(k)
         
-        candidates = self.category_map.get(target_cat, [])
+        logger.debug("ALS Fallback: Recommending items from category '%s'", target_cat)
+
         # Remove inputs
-        candidates = [c for c in candidates if c not in asins]
-        
-        if not candidates:
+        item_indices = self.encode_items(asins)
+        valid_indices = item_indices[item_indices >= 0]
+        with span('fallback'):
+            user_vector = self.foldin.solve(valid_indices) if len(valid_indices) else None
+            top_indices = self.rank_in_category(target_cat, user_vector, k=k, exclude=valid_indices)
+
+        if not len(top_indices):
             return self.get_cold_start_items(k)
-            
-        # Sample random k
-        import random
-        # Seed for stability? No, we want diversity!
-        start_k = min(len(candidates), k)
-        sampled_asins = random.sample(candidates, start_k)
-        
-        return self.get_product_details(sampled_asins)
+        return self.get_product_details(self.decode_items(top_indices))
 
-    def recommend_from_history(self, asins, k=10):
+    def recommend_from_history(self, asins, k=10, weights=None, profile=None, category=None, brand=None,
+                               exclude_asins=None):
         """
         Hybrid approach:
-        1. Try find similar items via ALS item factors (Cosine Similarity).
-        2. If that fails (items not in model), fallback to Category-based random.
+        1. Fold the session items into an ALS user vector and score all items with it.
+        2. If that returns too few (items not in model / not in the database), fill with items from the
+           category of the most recent item, ranked by the same user vector (popularity without one).
+        `weights` are optional confidence weights aligned with `asins` (default 1 each).
+        With a live `profile` its cached vector and item set are used instead (no re-encoding or solve).
+        `category` / `brand` / `exclude_asins` constrain the results as in recommend().
         """
-        print(f"Finding similar items for: {asins}")
+        logger.debug("Finding similar items for: %s", asins)
+        allowed = self.filters.query(category, brand)
         
         # A. Item-Item Collaborative Filtering (Vector Similarity)
         similar_products = []
+        user_vector = None
+        valid_indices = np.empty(0, dtype=np.int64)
         try:
             # 1. Identify valid item indices
-            valid_indices = []
-            for asin in asins:
-                if asin in self.item_encoder.classes_:
-                    idx = self.item_encoder.transform([asin])[0]
-                    valid_indices.append(idx)
+            if profile is not None:
+                valid_indices, _ = self.profiles.item_weights(profile)
+            else:
+                with span('id_lookup'):
+                    item_indices = self.encode_items(asins)
+                known = item_indices >= 0
+                valid_indices = item_indices[known]
             
-            if valid_indices:
-                # 2. Get vectors
-                item_factors = self.als_model.item_factors
-                target_vectors = item_factors[valid_indices] # (m, factors)
-                
-                # 3. Compute centroid (average user interest)
-                from sklearn.preprocessing import normalize
-                user_profile = np.mean(target_vectors, axis=0)
-                user_profile_norm = normalize(user_profile.reshape(1, -1), axis=1).flatten()
-                
-                # Normalize item factors
-                item_factors_norm = normalize(item_factors, axis=1)
-                
-                # Compute scores
-                scores = item_factors_norm.dot(user_profile_norm)
-                
-                # Mask input items
-                scores[valid_indices] = -np.inf
+            if len(valid_indices):
+                # 2. Least-squares user vector for these interactions (cached YᵀY + λI)
+                if profile is not None:
+                    user_vector = self.profiles.vector(profile)
+                else:
+                    item_weights = None if weights is None else np.asarray(weights, dtype=np.float64)[known]
+                    user_vector = self.foldin.solve(valid_indices, item_weights)
                 
-                # Top K
-                top_indices = np.argsort(scores)[::-1][:k]
-                top_asins = self.item_encoder.inverse_transform(top_indices.astype(int))
+                # 3. Top K by ALS score (input items, cart and wishlist masked), re-ranked
+                excluded = ExclusionSet(valid_indices).add_asins(self.item_ids, exclude_asins).indices()
+                top_indices = self.rank(user_vector, k=k, exclude=excluded, n_interactions=len(valid_indices),
+                                        allowed=allowed)
+                top_asins = self.decode_items(top_indices)
                 
                 similar_products = self.get_product_details(top_asins)
-                print(f"Found {len(similar_products)} similar items via ALS.")
-        except Exception as e:
-            print(f"Item-Item CF failed: {e}")
-            import traceback
-            traceback.print_exc()
+                logger.debug("Found %d similar items via ALS.", len(similar_products))
+        except Exception:
+            logger.exception("Live history recommendation failed")
+            metrics.inc('recommender_errors_total')
+            user_vector = None
             
+        # Served by ALS unless nothing came back and the category fill has to do all the work
+        record_strategy('live_history' if similar_products else 'category_fallback')
+
         # B. Fallback: Category Based if CF returned too few
         if len(similar_products) < k:
-            print("Not enough CF results, filling with Category items.")
+            logger.debug("Not enough CF results, filling with Category items.")
             # Find category of most recent item
-            last_asin = asins[0]
-            category = None
-            if last_asin in self.meta_df.index:
-                category = self.meta_df.loc[last_asin, 'main_cat']
+            fallback_category = self.item_category(asins[0])
             
-            if category and category in self.category_map:
-                cat_candidates = self.category_map[category]
-                current_ids = {p['asin'] for p in similar_products}
-                import random
-                attempts = 0
-                while len(similar_products) < k and attempts < 50:
-                    cand = random.choice(cat_candidates)
-                    if cand not in current_ids and cand not in asins:
-                        details = self.get_product_details([cand])
-                        if details:
-                            similar_products.extend(details)
-                            current_ids.add(cand)
-                    attempts += 1
+            if fallback_category:
+                with span('fallback'):
+                    returned = self.encode_items([p['asin'] for p in similar_products])
+                    excluded = (ExclusionSet(valid_indices, returned, self.encode_items(asins))
+                                .add_asins(self.item_ids, exclude_asins).indices())
+                    # One ranked draw (up to 50 candidates, masked top-k over the category) and a single hydration call
+                    draw = self.rank_in_category(fallback_category, user_vector, k=50, exclude=excluded, allowed=allowed)
+                    details = self.get_product_details(self.decode_items(draw))
+                    similar_products.extend(details[:k - len(similar_products)])
                     
         return similar_products[:k]
 
-    def get_cold_start_items(self, k=10):
-        """Return popular/recent items."""
-        # recent_items are integer indices, need to be converted to ASINs (strings)
-        if isinstance(self.recent_items, list):
-             # Take MORE than k, because some might not be in metadata
-             # We take up to 300 to be safe
-             limit = min(len(self.recent_items), 300)
-             item_indices = self.recent_items[:limit]
-             
-             # Check if they are integers (model indices) or strings
-             if item_indices and isinstance(item_indices[0], (int, np.integer)):
-                 asins = self.item_encoder.inverse_transform(item_indices)
-             else:
-                 asins = item_indices
-                 
-             # Filter valid ones by checking metadata existence
-             valid_asins = [a for a in asins if a in self.meta_df.index]
-             # Return top k
-             final_asins = valid_asins[:k]
-        else:
-            final_asins = []
-            
-        return self.get_product_details(final_asins)
+    def popular_indices(self, k, allowed=None, exclude=None):
+        """Up to k item indices from the popularity list, restricted to `allowed` and minus `exclude`."""
+        items = self.popular_items
+        if allowed is not None:
+            items = items[allowed.mask()[items]]
+        if exclude is not None and len(exclude):
+            items = items[~np.isin(items, exclude)]
+        return items[:k]
+
+    def get_cold_start_items(self, k=10, category=None, brand=None, exclude=None):
+        """Return popular/recent items (only those matching `category` / `brand`, minus `exclude` indices)."""
+        # Take MORE than k, because some might not be in metadata
+        # We take up to 300 to be safe
+        item_indices = self.popular_indices(300, allowed=self.filters.query(category, brand), exclude=exclude)
+        # Filter valid ones by checking metadata existence, return top k
+        item_indices = item_indices[self.catalog.has_metadata[item_indices]][:k]
+
+        return self.get_product_details(self.decode_items(item_indices))
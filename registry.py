@@ -0,0 +1,184 @@
+"""
+Model registry: zero-downtime hot reload of recommender artifacts.
+
+Versions live in sub-directories of a root directory, one per model version
+(e.g. models/20260101120000/ holding a bundle or legacy artifacts). A new version
+is picked up when its directory contains a complete artifact set. Publish a version
+either with bundle.write_bundle (the manifest is written last) or by copying it under
+a dot-prefixed name and renaming it; hidden directories are ignored.
+
+New versions are loaded and warmed on a background thread and then swapped in by
+rebinding a single attribute. Requests hold on to the instance they started with,
+so in-flight work finishes on the old version.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from bundle import is_bundle
+from recommender import ARTIFACTS_DIR, Recommender
+
+logger = logging.getLogger(__name__)
+
+
+def is_complete(path):
+    return is_bundle(path) or os.path.exists(os.path.join(path, "als_weighted.pkl"))
+
+
+def list_versions(root):
+    """Complete version directories under root, oldest first (names sort chronologically)."""
+    if not root or not os.path.isdir(root):
+        return []
+    names = sorted(n for n in os.listdir(root)
+                   if not n.startswith('.') and os.path.isdir(os.path.join(root, n)))
+    return [n for n in names if is_complete(os.path.join(root, n))]
+
+
+def warm_up(recommender, n_users=32, k=10):
+    """Exercise the scoring paths (no database access) so the first real requests don't pay for it."""
+    n_users = min(n_users, len(recommender.user_ids))
+    if n_users:
+        users = np.linspace(0, len(recommender.user_ids) - 1, n_users).astype(np.int64)
+        recommender.recommend_batch_indices(users, k=k)
+        for u in users[:4]:
+            recommender.engine.recommend(recommender.als_model.user_factors[u], k=k)
+
+
+class ModelRegistry:
+    def __init__(self, root=None, initial_path=None, loader=Recommender, poll_interval=30.0, warmup=True):
+        self.root = root
+        self.initial_path = initial_path
+        self.loader = loader
+        self.poll_interval = poll_interval
+        self.warmup = warmup
+        self.listeners = []
+
+        self._current = None
+        self._current_path = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._failed_paths = set()
+
+        # Reload metrics
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_load_s = None
+        self.last_warmup_s = None
+        self.loaded_at = None
+
+    @property
+    def current(self):
+        """The live recommender. Read it once per request and keep using that reference."""
+        return self._current
+
+    @property
+    def version(self):
+        if self._current is None:
+            return None
+        return self._current.version or os.path.basename(os.path.normpath(self._current_path))
+
+    def add_listener(self, fn):
+        """fn(old, new) is called after every swap."""
+        self.listeners.append(fn)
+
+    def latest_path(self):
+        versions = list_versions(self.root)
+        if versions:
+            return os.path.join(self.root, versions[-1])
+        return self.initial_path or ARTIFACTS_DIR
+
+    def start(self):
+        """Load the initial version synchronously, then start watching the root directory."""
+        self._load_and_swap(self.latest_path())
+        if self.root and self.poll_interval:
+            self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+            self._watcher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def reload(self, path=None, block=False):
+        """
+        Load `path` (default: newest version under root) and swap it in.
+        Runs on a background thread unless block=True. Returns False if a reload is already running.
+        """
+        path = path or self.latest_path()
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        if block:
+            try:
+                self._load_and_swap(path)
+            finally:
+                self._reload_lock.release()
+        else:
+            threading.Thread(target=self._reload_async, args=(path,), name="model-reload", daemon=True).start()
+        return True
+
+    def _reload_async(self, path):
+        try:
+            self._load_and_swap(path)
+        except Exception:
+            pass  # recorded in self.failures / self.last_error; keep serving the old version
+        finally:
+            self._reload_lock.release()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            path = self.latest_path()
+            if path in self._failed_paths:
+                continue
+            if os.path.normpath(path) != os.path.normpath(self._current_path or ""):
+                self.reload(path)
+
+    def _load_and_swap(self, path):
+        try:
+            start = time.perf_counter()
+            new = self.loader(artifacts_dir=path)
+            load_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            if self.warmup:
+                warm_up(new)
+            warmup_s = time.perf_counter() - start
+        except Exception as e:
+            self.failures += 1
+            self.last_error = f"{path}: {e}"
+            self._failed_paths.add(path)
+            logger.exception("Model reload from %s failed", path)
+            raise
+
+        old = self._current
+        if old is not None:
+            # Product dicts come from the database, not the model: keep the warm cache
+            new.products = old.products
+
+        # Atomic swap: a single reference assignment
+        self._current = new
+        self._current_path = path
+        self.reloads += 1
+        self.last_load_s = load_s
+        self.last_warmup_s = warmup_s
+        self.loaded_at = time.time()
+        logger.info("Model version %s live (load %.2fs, warm-up %.2fs)", self.version, load_s, warmup_s)
+
+        for fn in self.listeners:
+            fn(old, new)
+        return new
+
+    def metrics(self):
+        return {
+            'version': self.version,
+            'path': self._current_path,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'last_load_s': self.last_load_s,
+            'last_warmup_s': self.last_warmup_s,
+            'loaded_at': self.loaded_at,
+        }
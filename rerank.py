@@ -0,0 +1,164 @@
+"""
+Re-ranking stage between candidate generation and the final top-k.
+
+Works on a block of candidates, an array of item indices with their scores:
+
+    1. Popularity debiasing (the notebook's recommend_als_popularity / personalized_rerank):
+       score / log1p(popularity) ** alpha_pop. alpha_pop is 1.5 for cold users, 1.0 below
+       5 interactions and 0.5 for active users. Negative scores are multiplied instead, so
+       popular items always move down.
+    2. Maximal Marginal Relevance: picks greedily by
+       lambda * relevance - (1 - lambda) * max cosine similarity to the items already picked.
+       Relevance is the debiased score min-max scaled over the candidates. Similarities use
+       the normalized item factors of the candidate block only. After each pick, one
+       matrix-vector product updates every candidate's max similarity.
+    3. Optional caps on items per brand / per main_cat. They are relaxed only when the
+       candidates run out before k.
+
+The stage is opt-in: the Recommender only builds it when the model config has
+'rerank': {'enabled': True, ...}, since it changes every warm and live ranking and
+has not been evaluated offline yet.
+
+Usage:
+    python rerank.py bench --candidates 300,1000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Used unless the model config has a 'rerank' dict overriding them ('enabled': True turns the stage on)
+DEFAULTS = {
+    'enabled': False,
+    'n_candidates': 300,
+    'mmr_lambda': 0.8,
+    'max_per_brand': 3,
+    'max_per_category': None,
+}
+
+
+def popularity_alpha(n_interactions):
+    """Popularity penalty exponent (notebook thresholds): cold users get the strongest debiasing."""
+    if n_interactions < 2:
+        return 1.5
+    elif n_interactions < 5:
+        return 1.0
+    return 0.5
+
+
+def codes(values, missing=('', 'unknown')):
+    """Integer code per value (brand, main_cat...), -1 for missing ones (never capped)."""
+    values = pd.Series(values, dtype=object)
+    normalized = values.astype(str).str.strip().str.lower()
+    result, _ = pd.factorize(values.where(values.notna() & ~normalized.isin(missing)))
+    return result.astype(np.int64)
+
+
+class Reranker:
+    def __init__(self, item_vectors, popularity=None, brands=None, categories=None, n_candidates=300,
+                 mmr_lambda=0.8, max_per_brand=None, max_per_category=None):
+        """`item_vectors` are L2-normalized item factors; the other arrays are aligned with item indices."""
+        self.item_vectors = item_vectors
+        self.log_popularity = None if popularity is None else np.log1p(np.maximum(popularity, 1))
+        self.brands = brands
+        self.categories = categories
+        self.n_candidates = n_candidates
+        self.mmr_lambda = mmr_lambda
+        self.caps = [(groups, cap) for groups, cap in ((brands, max_per_brand), (categories, max_per_category))
+                     if groups is not None and cap]
+
+    def debias(self, items, scores, n_interactions=0):
+        if self.log_popularity is None:
+            return scores
+        penalty = self.log_popularity[items] ** popularity_alpha(n_interactions)
+        return np.where(scores >= 0, scores / penalty, scores * penalty)
+
+    def rerank(self, items, scores, k=10, n_interactions=0):
+        """Top-k of the candidate `items` (best first) after debiasing, MMR and caps."""
+        items = np.asarray(items, dtype=np.int64)
+        scores = self.debias(items, np.asarray(scores, dtype=np.float64), n_interactions)
+        k = min(int(k), len(items))
+        if self.mmr_lambda >= 1 and not self.caps:
+            order = np.argsort(-scores, kind='stable')[:k]
+            return items[order]
+
+        # Relevance on [0, 1], the same scale as the cosine similarities it is traded against
+        spread = scores.max() - scores.min() if len(scores) else 0.0
+        relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(len(scores))
+        diversify = self.mmr_lambda < 1
+        if diversify:
+            vectors = np.asarray(self.item_vectors[items], dtype=np.float32)
+            max_sim = np.zeros(len(items))
+        groups = [(group_codes[items], cap, {}) for group_codes, cap in self.caps]
+        available = np.ones(len(items), dtype=bool)
+        capped = np.zeros(len(items), dtype=bool)
+
+        picked = []
+        while len(picked) < k:
+            if diversify:
+                objective = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_sim
+            else:
+                objective = relevance.copy()
+            objective[~available | capped] = -np.inf
+            j = int(np.argmax(objective))
+            if not np.isfinite(objective[j]):
+                if not capped[available].any():
+                    break
+                capped[:] = False  # caps leave fewer than k candidates: relax them
+                continue
+            picked.append(j)
+            available[j] = False
+            if diversify:
+                np.maximum(max_sim, vectors.dot(vectors[j]), out=max_sim)
+            for item_groups, cap, counts in groups:
+                group = item_groups[j]
+                if group >= 0:
+                    counts[group] = counts.get(group, 0) + 1
+                    if counts[group] >= cap:
+                        capped |= item_groups == group
+        return items[picked]
+
+
+def benchmark(candidate_sizes=(300, 1000), n_items=100000, factors=64, k=10, repeats=200, seed=0):
+    """Added latency per request for each stage combination."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n_items, factors)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    popularity = rng.zipf(1.5, n_items).clip(max=100000)
+    brands = rng.integers(0, 400, n_items)
+    categories = rng.integers(0, 12, n_items)
+    variants = {
+        'popularity': dict(mmr_lambda=1.0),
+        'popularity+caps': dict(mmr_lambda=1.0, max_per_brand=3, max_per_category=4),
+        'popularity+mmr': dict(mmr_lambda=0.8),
+        'popularity+mmr+caps': dict(mmr_lambda=0.8, max_per_brand=3, max_per_category=4),
+    }
+    rows = []
+    for n in candidate_sizes:
+        items = [rng.choice(n_items, n, replace=False) for _ in range(repeats)]
+        scores = [rng.normal(size=n) for _ in range(repeats)]
+        for name, params in variants.items():
+            reranker = Reranker(vectors, popularity, brands, categories, **params)
+            start = time.perf_counter()
+            for it, sc in zip(items, scores):
+                reranker.rerank(it, sc, k, n_interactions=3)
+            rows.append({'candidates': n, 'variant': name,
+                         'ms': (time.perf_counter() - start) / repeats * 1000})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-ranking stage tools.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--candidates", default="300,1000")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'candidates':>10} {'variant':<22} {'ms/request':>10}")
+    for row in benchmark([int(c) for c in args.candidates.split(',')], k=args.k):
+        print(f"{row['candidates']:>10} {row['variant']:<22} {row['ms']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+
+from instrumentation import span
+
+
+class ScoringEngine:
+    """
+    Precomputed scoring state for the ALS item factors.
+    Built once when the Recommender loads, then shared by every recommend path.
+    """
+
+    def __init__(self, item_factors, item_factors_norm=None):
+        # Contiguous float32 copies so every dot product hits the fast BLAS path
+        # (no copy is made when the input already is, e.g. a memory-mapped bundle array)
+        self.item_factors = np.ascontiguousarray(item_factors, dtype=np.float32)
+        if item_factors_norm is None:
+            item_factors_norm = self.normalize_rows(self.item_factors)
+        self.item_factors_norm = np.ascontiguousarray(item_factors_norm, dtype=np.float32)
+        self.n_items = self.item_factors.shape[0]
+        # Optional approximate index for recommend (ann.IVFIndex or quantized.QuantizedIndex)
+        self.index = None
+        # Optional micro-batcher for concurrent recommend calls (see batching.py)
+        self.batcher = None
+
+    def attach_index(self, index):
+        """Route unfiltered recommend calls through an approximate index (None to detach)."""
+        self.index = index
+
+    def attach_batcher(self, batcher):
+        """Score exact recommend calls through a RecommendationBatcher (None to detach)."""
+        self.batcher = batcher
+
+    @staticmethod
+    def normalize_rows(matrix):
+        """L2-normalize rows, leaving all-zero rows untouched (same as sklearn's normalize)."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+    def score(self, user_vector):
+        """Raw inner-product scores of every item against a user vector."""
+        return self.item_factors.dot(np.asarray(user_vector, dtype=np.float32))
+
+    @staticmethod
+    def mask(scores, indices):
+        """Exclude items in place by setting their scores to -inf."""
+        if indices is not None and len(indices):
+            scores[indices] = -np.inf
+        return scores
+
+    @staticmethod
+    def top_k(scores, k):
+        """
+        Indices of the k highest scores, best first.
+        Same result as np.argsort(scores, kind='stable')[::-1][:k], ties included (the higher
+        index first), but only the k selected items are sorted.
+        """
+        n = scores.shape[0]
+        k = min(int(k), n)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < n:
+            candidates = np.argpartition(scores, n - k)[n - k:]
+            # The k-th best score is tied with items left out: keep the highest-indexed ones, like argsort
+            threshold = scores[candidates[0]]
+            if np.count_nonzero(scores == threshold) > np.count_nonzero(scores[candidates] == threshold):
+                above = np.flatnonzero(scores > threshold)
+                candidates = np.concatenate([above, np.flatnonzero(scores == threshold)[len(above) - k:]])
+            candidates.sort()
+        else:
+            candidates = np.arange(n)
+        order = np.argsort(scores[candidates], kind='stable')[::-1]
+        return candidates[order]
+
+    @staticmethod
+    def mask_rows(scores, rows):
+        """
+        Exclude items in place for a block of users.
+        `rows` is a CSR matrix aligned with the rows of `scores` (e.g. train_matrix[block]).
+        """
+        row_ids = np.repeat(np.arange(rows.shape[0]), np.diff(rows.indptr))
+        scores[row_ids, rows.indices] = -np.inf
+        return scores
+
+    @staticmethod
+    def top_k_batch(scores, k):
+        """Row-wise top-k of a (users, items) score block. Returns (indices, scores), best first."""
+        n_rows, n = scores.shape
+        k = min(int(k), n)
+        if k <= 0:
+            return np.empty((n_rows, 0), dtype=np.int64), np.empty((n_rows, 0), dtype=scores.dtype)
+        if k < n:
+            candidates = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+        else:
+            candidates = np.broadcast_to(np.arange(n), (n_rows, n))
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(candidate_scores, axis=1, kind='stable')[:, ::-1]
+        return (np.take_along_axis(candidates, order, axis=1),
+                np.take_along_axis(candidate_scores, order, axis=1))
+
+    def score_batch(self, user_vectors):
+        """Scores for a block of users in a single GEMM: (users, factors) x (factors, items)."""
+        return np.asarray(user_vectors, dtype=np.float32).dot(self.item_factors.T)
+
+    def recommend_batch(self, user_vectors, k=10, exclude_rows=None):
+        """Top-k item indices and scores for a block of user vectors."""
+        scores = self.score_batch(user_vectors)
+        if exclude_rows is not None:
+            self.mask_rows(scores, exclude_rows)
+        return self.top_k_batch(scores, k)
+
+    def _search_index(self, vector, k, exclude):
+        index = self.index
+        if index is None:
+            return None
+        with span('ann_search'):
+            items, _ = index.search(vector, k, exclude=exclude)
+        # Too few candidates in the probed lists: let the caller fall back to exact scoring
+        if len(items) < min(k, self.n_items):
+            return None
+        return items
+
+    def recommend_filtered(self, user_vector, k, exclude, allowed):
+        """
+        Top-k among the items of `allowed` (a filters.ItemFilter), exact.
+        A small filter only scores its own rows; otherwise every item is scored and the
+        filter and exclusions are masked in one pass. May return fewer than k items.
+        """
+        user_vector = np.asarray(user_vector, dtype=np.float32)
+        members = allowed.indices()
+        if len(members) * 4 < self.n_items:
+            with span('scoring'):
+                scores = self.item_factors[members].dot(user_vector)
+            with span('masking'):
+                if exclude is not None and len(exclude):
+                    scores[np.isin(members, exclude)] = -np.inf
+            with span('top_k'):
+                top = self.top_k(scores, k)
+                return members[top[np.isfinite(scores[top])]]
+        with span('scoring'):
+            scores = self.score(user_vector)
+        with span('masking'):
+            scores[~allowed.mask()] = -np.inf
+            self.mask(scores, exclude)
+        with span('top_k'):
+            top = self.top_k(scores, k)
+            return top[np.isfinite(scores[top])]
+
+    def recommend(self, user_vector, k=10, exclude=None, allowed=None):
+        """
+        Top-k item indices for a raw user vector.
+        With an `allowed` filter the search is exact (no ANN index or micro-batching).
+        """
+        if allowed is not None:
+            return self.recommend_filtered(user_vector, k, exclude, allowed)
+        items = self._search_index(user_vector, k, exclude)
+        if items is not None:
+            return items
+        batcher = self.batcher
+        if batcher is not None:
+            return batcher.recommend(user_vector, k, exclude)
+        with span('scoring'):
+            scores = self.score(user_vector)
+        with span('masking'):
+            self.mask(scores, exclude)
+        with span('top_k'):
+            return self.top_k(scores, k)
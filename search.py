@@ -0,0 +1,407 @@
+"""
+In-memory full-text search over the product catalog (replaces the ILIKE scan on /products).
+
+Every product is tokenized over title, brand and category, and each term keeps a
+posting list of (doc, term frequency) pairs. Doc ids are stored as varint-encoded
+gaps and frequencies as varints, so a posting list costs ~2 bytes per entry and is
+decoded with a few NumPy operations per query.
+
+Ranking is BM25 over the field-weighted term frequencies, blended with the product's
+popularity. The last query token is also matched as a prefix (typeahead), and results
+can be restricted to one main_cat. New products are added incrementally with `add`.
+
+Usage:
+    python search.py bench --items 20000 --queries 200
+"""
+import argparse
+import bisect
+import math
+import re
+import threading
+import time
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Integer weights, so weighted term frequencies stay varint-encodable
+FIELD_WEIGHTS = {
+    'title': 2,
+    'brand': 3,
+    'category': 1,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Terms a prefix may expand to (the most frequent ones are kept)
+MAX_EXPANSIONS = 64
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(str(text).lower())
+
+
+def encode_varints(values):
+    """LEB128-style varints (7 bits per byte, high bit = continuation) for non-negative ints."""
+    if len(values) <= 8:
+        # Short lists (most terms, and every incremental append) are cheaper without NumPy
+        out = bytearray()
+        for value in values:
+            value = int(value)
+            while value >= 128:
+                out.append((value & 127) | 128)
+                value >>= 7
+            out.append(value)
+        return bytes(out)
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    n_bytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        n_bytes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(n_bytes) - n_bytes
+    out = np.zeros(int(n_bytes.sum()), dtype=np.uint8)
+    for j in range(int(n_bytes.max())):
+        sel = n_bytes > j
+        chunk = (values[sel] >> np.uint64(7 * j)) & np.uint64(127)
+        more = (n_bytes[sel] - 1 > j).astype(np.uint64) << np.uint64(7)
+        out[starts[sel] + j] = chunk | more
+    return out.tobytes()
+
+
+def decode_varints(buf):
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = data < 128
+    group = np.concatenate([[0], np.cumsum(ends[:-1])])
+    starts = np.flatnonzero(np.concatenate([[True], ends[:-1]]))
+    shift = 7 * (np.arange(len(data)) - starts[group])
+    values = np.bincount(group, weights=(data & 127) * np.exp2(shift), minlength=int(ends.sum()))
+    return values.astype(np.int64)
+
+
+class PostingList:
+    """Gap-encoded doc ids and frequencies of one term; append-only (docs arrive in id order)."""
+
+    __slots__ = ('docs', 'freqs', 'last_doc', 'df')
+
+    def __init__(self, docs, freqs):
+        docs = np.asarray(docs, dtype=np.int64)
+        self.docs = encode_varints(np.diff(docs, prepend=0))
+        self.freqs = encode_varints(freqs)
+        self.last_doc = int(docs[-1])
+        self.df = len(docs)
+
+    def append(self, doc, freq):
+        self.docs += encode_varints([doc - self.last_doc])
+        self.freqs += encode_varints([freq])
+        self.last_doc = doc
+        self.df += 1
+
+    def decode(self):
+        return np.cumsum(decode_varints(self.docs)), decode_varints(self.freqs)
+
+    def nbytes(self):
+        return len(self.docs) + len(self.freqs)
+
+
+def doc_terms(record):
+    """Field-weighted term frequencies of one product record."""
+    counts = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = record.get(field)
+        if field == 'category' and value is not None and not isinstance(value, str):
+            value = " ".join(str(v) for v in value)
+        for token in tokenize(value):
+            counts[token] = counts.get(token, 0) + weight
+    return counts
+
+
+class SearchIndex:
+    def __init__(self, popularity_weight=1.0):
+        self.popularity_weight = popularity_weight
+        self.asins = []
+        self.doc_index = {}          # asin -> doc id
+        self.postings = {}           # term -> PostingList
+        self.terms = []              # sorted vocabulary (prefix lookups)
+        self.lengths = np.zeros(0, dtype=np.float64)
+        self.popularity = np.zeros(0, dtype=np.float64)
+        self.cat_codes = np.zeros(0, dtype=np.int32)
+        self.live = np.zeros(0, dtype=bool)
+        self.main_cats = {}          # main_cat -> code
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, records, popularity_weight=1.0):
+        """Index an iterable of product dicts (asin, title, brand, category, main_cat, popularity)."""
+        index = cls(popularity_weight=popularity_weight)
+        term_docs, term_freqs = {}, {}
+        lengths, popularity, cat_codes = [], [], []
+        for record in records:
+            asin = record['asin']
+            if asin in index.doc_index:
+                continue
+            doc = len(index.asins)
+            index.asins.append(asin)
+            index.doc_index[asin] = doc
+            counts = doc_terms(record)
+            for term, freq in counts.items():
+                term_docs.setdefault(term, []).append(doc)
+                term_freqs.setdefault(term, []).append(freq)
+            lengths.append(sum(counts.values()))
+            popularity.append(record.get('popularity') or 0)
+            cat_codes.append(index._cat_code(record.get('main_cat')))
+
+        index.postings = {term: PostingList(docs, term_freqs[term]) for term, docs in term_docs.items()}
+        index.terms = sorted(index.postings)
+        index.lengths = np.asarray(lengths, dtype=np.float64)
+        index.popularity = np.asarray(popularity, dtype=np.float64)
+        index.cat_codes = np.asarray(cat_codes, dtype=np.int32)
+        index.live = np.ones(len(index.asins), dtype=bool)
+        return index
+
+    def _cat_code(self, main_cat):
+        if not main_cat:
+            return -1
+        return self.main_cats.setdefault(main_cat, len(self.main_cats))
+
+    def __len__(self):
+        return int(self.live.sum())
+
+    def __contains__(self, asin):
+        doc = self.doc_index.get(asin)
+        return doc is not None and bool(self.live[doc])
+
+    def add(self, record, replace=False):
+        """
+        Index one new product. An already indexed ASIN is left alone unless `replace`,
+        in which case the old document is tombstoned and the new one appended.
+        """
+        asin = record['asin']
+        with self._lock:
+            old = self.doc_index.get(asin)
+            if old is not None:
+                if not replace:
+                    return False
+                self.live[old] = False
+            doc = len(self.asins)
+            counts = doc_terms(record)
+            for term, freq in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    self.postings[term] = PostingList([doc], [freq])
+                    bisect.insort(self.terms, term)
+                else:
+                    posting.append(doc, freq)
+            # Arrays are replaced, not resized, so concurrent searches see a consistent snapshot
+            self.lengths = np.append(self.lengths, sum(counts.values()))
+            self.popularity = np.append(self.popularity, record.get('popularity') or 0)
+            self.cat_codes = np.append(self.cat_codes, self._cat_code(record.get('main_cat'))).astype(np.int32)
+            self.live = np.append(self.live, True)
+            self.asins.append(asin)
+            self.doc_index[asin] = doc
+        return True
+
+    def expand(self, prefix):
+        """Vocabulary terms starting with `prefix` (the MAX_EXPANSIONS most frequent)."""
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\uffff")
+        matches = self.terms[lo:hi]
+        if len(matches) > MAX_EXPANSIONS:
+            matches = sorted(matches, key=lambda t: -self.postings[t].df)[:MAX_EXPANSIONS]
+        return matches
+
+    def search(self, query, main_cat=None, limit=None, prefix=True):
+        """
+        ASINs matching every query token, best first. With `prefix` the last token also
+        matches terms it is a prefix of ("moistur" -> "moisturizer").
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        n_docs = len(self.asins)
+        lengths, live = self.lengths[:n_docs], self.live[:n_docs]
+        n_live = max(int(live.sum()), 1)
+        avg_length = self.lengths[live].mean() if live.any() else 1.0
+        norm = K1 * (1 - B + B * lengths / avg_length)
+
+        scores = np.zeros(n_docs)
+        matched = np.ones(n_docs, dtype=bool)
+        for i, token in enumerate(tokens):
+            terms = self.expand(token) if prefix and i == len(tokens) - 1 else [token]
+            token_scores = np.zeros(n_docs)
+            hit = np.zeros(n_docs, dtype=bool)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                docs, freqs = posting.decode()
+                docs, freqs = docs[docs < n_docs], freqs[docs < n_docs]
+                idf = math.log(1 + (n_live - posting.df + 0.5) / (posting.df + 0.5))
+                contrib = idf * freqs * (K1 + 1) / (freqs + norm[docs])
+                # Expansions of one token: keep its best-scoring term per doc
+                token_scores[docs] = np.maximum(token_scores[docs], contrib)
+                hit[docs] = True
+            matched &= hit
+            scores += token_scores
+
+        matched &= live
+        if main_cat:
+            code = self.main_cats.get(main_cat)
+            if code is None:
+                return []
+            matched &= self.cat_codes[:n_docs] == code
+        docs = np.flatnonzero(matched)
+        if not len(docs):
+            return []
+
+        scores = scores[docs]
+        popularity = np.log1p(self.popularity[docs])
+        top = np.log1p(self.popularity.max()) if len(self.popularity) else 0.0
+        if top > 0:
+            scores = scores + self.popularity_weight * popularity / top
+        order = np.argsort(-scores, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return [self.asins[d] for d in docs[order]]
+
+    def stats(self):
+        n_postings = sum(p.df for p in self.postings.values())
+        n_bytes = sum(p.nbytes() for p in self.postings.values())
+        return {
+            'docs': len(self),
+            'terms': len(self.postings),
+            'postings': n_postings,
+            'posting_bytes': n_bytes,
+        }
+
+
+def catalog_records(catalog, session):
+    """
+    One record per row of the `products` table (what /products lists), with brand and
+    category filled in from the item metadata (an itemmeta.ItemMetadata) where the row lacks them.
+    """
+    from models import Product
+
+    rows = session.query(Product.asin, Product.title, Product.brand, Product.main_cat, Product.popularity).all()
+    meta = catalog.records([row[0] for row in rows]) if catalog is not None else {}
+    for asin, title, brand, main_cat, popularity in rows:
+        extra = meta.get(asin, {})
+        yield {'asin': asin,
+               'title': title or extra.get('title'),
+               'brand': brand or extra.get('brand'),
+               'main_cat': main_cat or extra.get('main_cat'),
+               'category': extra.get('category'),
+               'popularity': popularity or 0}
+
+
+def product_record(product):
+    """Search record for a Product row (used for incremental adds)."""
+    return {'asin': product.asin, 'title': product.title, 'brand': product.brand,
+            'main_cat': product.main_cat, 'popularity': product.popularity or 0}
+
+
+class SearchPagination:
+    """The subset of flask_sqlalchemy's Pagination that templates/products.html uses."""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page)) if self.per_page else 1
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current <= num <= self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
+
+
+def benchmark(n_items=20000, n_queries=200, seed=0):
+    """Time the index against the ILIKE + ORDER BY popularity query on a synthetic SQLite catalog."""
+    import os
+    import tempfile
+
+    import synthetic
+    from idmap import IdMap
+    from itemmeta import ItemMetadata
+    from models import db, Product
+
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        meta = synthetic.generate(os.path.join(tmp, "artifacts"), n_users=100, n_items=n_items, seed=seed)
+        app = synthetic.populate_products(meta, f"sqlite:///{os.path.join(tmp, 'products.db')}")
+        queries = [" ".join(rng.choice(synthetic.TITLE_WORDS, rng.integers(1, 3))) for _ in range(n_queries)]
+        # Synthetic models know every generated item
+        catalog = ItemMetadata.load(os.path.join(tmp, "artifacts", "items_metadata.parquet"),
+                                    IdMap(meta['asin'].to_numpy(dtype=object)))
+
+        with app.app_context():
+            start = time.perf_counter()
+            index = SearchIndex.build(catalog_records(catalog, db.session))
+            build_s = time.perf_counter() - start
+
+            def run(fn):
+                latencies = []
+                for q in queries:
+                    t0 = time.perf_counter()
+                    fn(q)
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+            ilike = run(lambda q: Product.query.filter(Product.title.ilike(f'%{q}%'))
+                        .order_by(Product.popularity.desc()).limit(20).all())
+            indexed = run(lambda q: index.search(q)[:20])
+    return {'items': n_items, 'build_s': build_s, 'ilike_ms': ilike, 'index_ms': indexed,
+            **index.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Product search index tools.")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    result = benchmark(args.items, args.queries)
+    print(f"{result['items']} products, {result['terms']} terms, {result['postings']} postings "
+          f"in {result['posting_bytes'] / 1024:.0f} KB (built in {result['build_s']:.2f}s)")
+    print(f"{'path':<8} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'ilike':<8} {result['ilike_ms'][0]:>8.3f} {result['ilike_ms'][1]:>8.3f}")
+    print(f"{'index':<8} {result['index_ms'][0]:>8.3f} {result['index_ms'][1]:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Synthetic artifacts at configurable scale, in the same layout the notebook exports.
+
+Writes a legacy artifacts directory (pickled model / LabelEncoders, train_matrix.npz,
+items_metadata.parquet, recent_items.pkl, config.pkl, user_interactions.pkl) and,
+optionally, a SQLite database with the `products` table as a local stand-in for MySQL.
+
+Usage:
+    python synthetic.py --out /tmp/synth --users 10000 --items 5000 --factors 64 --sqlite /tmp/synth.db
+"""
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+N_CATEGORIES = 12
+N_BRANDS = 400
+
+# Vocabulary for product titles (so text search has realistic term statistics)
+TITLE_WORDS = ("shampoo", "conditioner", "serum", "moisturizer", "cleanser", "toner", "mask", "lotion",
+               "cream", "oil", "balm", "scrub", "mist", "gel", "spray", "polish", "lipstick", "mascara",
+               "eyeliner", "foundation", "concealer", "powder", "blush", "bronzer", "primer", "brush",
+               "sponge", "perfume", "cologne", "soap", "deodorant", "sunscreen", "argan", "coconut",
+               "vitamin", "hyaluronic", "retinol", "charcoal", "aloe", "rose", "lavender", "tea", "tree",
+               "organic", "natural", "hydrating", "repair", "volume", "matte", "gloss", "sensitive",
+               "dry", "oily", "curly", "men", "women", "travel", "size", "pack", "set")
+
+
+def make_ids(prefix, n):
+    # Fixed-width ids sort in index order, matching LabelEncoder.classes_
+    width = len(str(n))
+    return np.array([f"{prefix}{i:0{width}d}" for i in range(n)], dtype=object)
+
+
+def generate(out_dir, n_users=2000, n_items=1000, factors=64, interactions_per_user=5, seed=42):
+    """Write synthetic artifacts to out_dir and return the metadata DataFrame."""
+    from sklearn.preprocessing import LabelEncoder
+    from implicit.gpu.als import AlternatingLeastSquares
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    user_ids = make_ids("U", n_users)
+    item_ids = make_ids("B", n_items)
+
+    # Long-tailed item popularity, like real catalogs
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+    counts = rng.poisson(interactions_per_user, n_users) + 1
+    rows = np.repeat(np.arange(n_users), counts)
+    cols = rng.choice(n_items, size=len(rows), p=popularity)
+    weights = rng.uniform(1, 5, size=len(rows))
+    train_matrix = scipy.sparse.csr_matrix((weights, (rows, cols)), shape=(n_users, n_items))
+    train_matrix.sum_duplicates()
+
+    model = AlternatingLeastSquares()
+    model.user_factors = rng.normal(0, 0.1, (n_users, factors)).astype(np.float32)
+    model.item_factors = rng.normal(0, 0.1, (n_items, factors)).astype(np.float32)
+    model.factors = factors
+    model.regularization = 0.05
+    model.alpha = 1.0
+    model.iterations = 30
+
+    user_encoder = LabelEncoder().fit(user_ids)
+    item_encoder = LabelEncoder().fit(item_ids)
+    item_counts = np.bincount(cols, minlength=n_items)
+    recent_items = [int(i) for i in np.argsort(-item_counts, kind='stable')]
+
+    categories = np.array([f"Category {c}" for c in range(N_CATEGORIES)], dtype=object)
+    brands = np.array([f"Brand {b}" for b in range(N_BRANDS)], dtype=object)
+    meta = pd.DataFrame({
+        'asin': item_ids,
+        'title': [" ".join(rng.choice(TITLE_WORDS, rng.integers(3, 7))) + f" {i}" for i in range(n_items)],
+        'brand': brands[rng.integers(0, N_BRANDS, n_items)],
+        'price': [f"${p:.2f}" for p in rng.uniform(2, 80, n_items)],
+        'category': [[] for _ in range(n_items)],
+        'main_cat': categories[rng.integers(0, N_CATEGORIES, n_items)],
+        'image_url': [f"https://example.com/img/{a}.jpg" for a in item_ids],
+    })
+
+    def dump(name, obj):
+        with open(os.path.join(out_dir, name), "wb") as f:
+            pickle.dump(obj, f)
+
+    dump("als_weighted.pkl", model)
+    dump("user_encoder.pkl", user_encoder)
+    dump("item_encoder.pkl", item_encoder)
+    dump("recent_items.pkl", recent_items)
+    dump("user_interactions.pkl", dict(enumerate(np.diff(train_matrix.indptr).tolist())))
+    dump("config.pkl", {"model_name": "synthetic", "cold_threshold": 2, "topK": 10,
+                        "dataset": f"synthetic_{n_users}x{n_items}x{factors}"})
+    scipy.sparse.save_npz(os.path.join(out_dir, "train_matrix.npz"), train_matrix)
+    meta.to_parquet(os.path.join(out_dir, "items_metadata.parquet"), index=False)
+    meta['popularity'] = item_counts
+    return meta
+
+
+def make_app(database_uri):
+    """Minimal Flask app bound to `database_uri` (no recommender, no routes)."""
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate_products(meta, database_uri):
+    """Create the tables and bulk-insert one Product row per item."""
+    from models import db, Product
+
+    app = make_app(database_uri)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        rows = [{'asin': r.asin, 'title': r.title, 'brand': r.brand, 'main_cat': r.main_cat,
+                 'image_url': r.image_url, 'popularity': int(r.popularity), 'avg_rating': 4.0}
+                for r in meta.itertuples()]
+        db.session.execute(Product.__table__.insert(), rows)
+        db.session.commit()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic recommender artifacts.")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--interactions-per-user", type=int, default=5)
+    parser.add_argument("--sqlite", default=None, help="Also write a SQLite products table to this file.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    meta = generate(args.out, args.users, args.items, args.factors, args.interactions_per_user, args.seed)
+    if args.sqlite:
+        populate_products(meta, f"sqlite:///{os.path.abspath(args.sqlite)}")
+    print(f"Wrote {args.users} users x {args.items} items x {args.factors} factors to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The application modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def recommender(tmp_path_factory):
+    """A Recommender over small synthetic artifacts (no database needed until hydration)."""
+    import synthetic
+    from recommender import Recommender
+
+    path = tmp_path_factory.mktemp("artifacts")
+    synthetic.generate(str(path), n_users=200, n_items=100, factors=8)
+    return Recommender(str(path))
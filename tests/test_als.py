@@ -0,0 +1,84 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+import scipy.sparse
+
+from als import AlternatingLeastSquares, least_squares_cg, row_blocks
+from foldin import FoldIn
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_matrix(n_users=60, n_items=40, seed=0):
+    rng = np.random.default_rng(seed)
+    return scipy.sparse.random(n_users, n_items, density=0.15, format='csr', random_state=seed,
+                               data_rvs=lambda n: rng.uniform(1, 5, n)).astype(np.float32)
+
+
+def test_row_blocks_cover_every_row_once():
+    matrix = make_matrix()
+    blocks = row_blocks(matrix.indptr, block_nnz=25)
+    assert blocks[0][0] == 0 and blocks[-1][1] == matrix.shape[0]
+    assert all(a[1] == b[0] for a, b in zip(blocks, blocks[1:]))
+
+
+def test_cg_with_enough_steps_matches_exact_solve():
+    matrix = make_matrix()
+    rng = np.random.default_rng(1)
+    Y = rng.normal(0, 0.1, (40, 8)).astype(np.float32)
+    X = np.zeros((60, 8), dtype=np.float32)
+    gram = (Y.T.dot(Y) + 0.05 * np.eye(8)).astype(np.float32)
+    least_squares_cg(matrix, X, Y, gram, 0, 60, cg_steps=16)
+
+    exact = FoldIn(Y, regularization=0.05, alpha=1.0)
+    for u in (0, 17, 59):
+        row = matrix[u]
+        np.testing.assert_allclose(X[u], exact.solve(row.indices, row.data), rtol=1e-3, atol=1e-5)
+
+
+def test_training_loss_decreases():
+    model = AlternatingLeastSquares(factors=8, iterations=10, random_state=0).fit(make_matrix())
+    losses = [h['loss'] for h in model.history]
+    assert all(b <= a + 1e-7 for a, b in zip(losses, losses[1:]))
+    # Converging: each step gains less than the one before it
+    gains = -np.diff(losses)
+    assert gains[-1] < 0.1 * gains[0]
+
+
+def test_fit_leaves_the_input_matrix_alone():
+    matrix = make_matrix()
+    data = matrix.data.copy()
+    AlternatingLeastSquares(factors=4, iterations=1, alpha=3.0, random_state=0).fit(matrix)
+    np.testing.assert_array_equal(matrix.data, data)
+
+
+def test_thread_count_does_not_change_the_result():
+    matrix = make_matrix()
+    one = AlternatingLeastSquares(factors=8, iterations=3, num_threads=1, block_nnz=20, random_state=0).fit(matrix)
+    four = AlternatingLeastSquares(factors=8, iterations=3, num_threads=4, block_nnz=20, random_state=0).fit(matrix)
+    np.testing.assert_array_equal(one.user_factors, four.user_factors)
+    np.testing.assert_array_equal(one.item_factors, four.item_factors)
+
+
+def test_pickled_model_loads_outside_the_repo(tmp_path):
+    # The implicit.gpu stub must find the trainer without the repo root on sys.path
+    from implicit.gpu.als import AlternatingLeastSquares as Pickled
+    model = Pickled()
+    model.user_factors = np.ones((2, 3), dtype=np.float32)
+    path = tmp_path / "model.pkl"
+    path.write_bytes(pickle.dumps(model))
+
+    script = ("import pickle, sys; sys.path.insert(0, sys.argv[2]); sys.path.remove('');"
+              "m = pickle.load(open(sys.argv[1], 'rb')); print(m.user_factors.shape, m.factors)")
+    env = dict(os.environ, PYTHONPATH="")
+    # Only the implicit package's parent is importable; als.py itself is not on sys.path
+    package_root = tmp_path / "site"
+    package_root.mkdir()
+    os.symlink(os.path.join(REPO, "implicit"), package_root / "implicit")
+    out = subprocess.run([sys.executable, "-c", script, str(path), str(package_root)], cwd=tmp_path,
+                         env=env, capture_output=True, text=True)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "(2, 3) 64"
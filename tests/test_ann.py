@@ -0,0 +1,63 @@
+import numpy as np
+
+from ann import IVFIndex, index_path
+from scoring import ScoringEngine
+
+
+def clustered_factors(n_items=2000, factors=16, n_clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 1, (n_clusters, factors))
+    vectors = centers[rng.integers(0, n_clusters, n_items)] + rng.normal(0, 0.3, (n_items, factors))
+    return vectors.astype(np.float32)
+
+
+def recall(index, item_factors, queries, k=10, nprobe=None):
+    engine = ScoringEngine(item_factors)
+    hits = 0
+    for q in queries:
+        truth = set(engine.top_k(engine.score(q), k).tolist())
+        items, _ = index.search(q, k, nprobe=nprobe)
+        hits += len(truth.intersection(items.tolist()))
+    return hits / (k * len(queries))
+
+
+def test_recall_grows_with_nprobe():
+    item_factors = clustered_factors()
+    index = IVFIndex.build(item_factors, n_lists=32)
+    queries = np.random.default_rng(1).normal(0, 1, (50, 16)).astype(np.float32)
+
+    assert sorted(index.list_items.tolist()) == list(range(2000))
+    recalls = [recall(index, item_factors, queries, nprobe=nprobe) for nprobe in (1, 8, 32)]
+    assert recalls[0] <= recalls[1] <= recalls[2]
+    assert recalls[1] >= 0.9
+    # Probing every list is exact search
+    assert recalls[2] == 1.0
+
+
+def test_search_skips_excluded_items():
+    item_factors = clustered_factors(n_items=200)
+    index = IVFIndex.build(item_factors, n_lists=4, nprobe=4)
+    query = item_factors[7]
+    best, _ = index.search(query, k=5)
+    items, scores = index.search(query, k=5, exclude=best[:2])
+    assert not np.isin(items, best[:2]).any()
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_save_load_round_trip(tmp_path):
+    item_factors = clustered_factors(n_items=300)
+    index = IVFIndex.build(item_factors, n_lists=8, nprobe=3)
+    index.save(index_path(str(tmp_path)))
+    loaded = IVFIndex.load(index_path(str(tmp_path)), nprobe=5)
+    np.testing.assert_array_equal(loaded.list_items, index.list_items)
+    np.testing.assert_array_equal(loaded.list_vectors, index.list_vectors)
+    assert loaded.nprobe == 5 and IVFIndex.load(index_path(str(tmp_path))).nprobe == 3
+
+
+def test_engine_falls_back_to_exact_when_the_probe_is_short():
+    item_factors = clustered_factors(n_items=200)
+    engine = ScoringEngine(item_factors)
+    exact = engine.recommend(item_factors[3], k=50)
+    # One list of a 64-list index holds far fewer than 50 items
+    engine.attach_index(IVFIndex.build(item_factors, n_lists=64, nprobe=1))
+    np.testing.assert_array_equal(engine.recommend(item_factors[3], k=50), exact)
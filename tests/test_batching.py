@@ -0,0 +1,74 @@
+import asyncio
+
+import numpy as np
+
+from batching import RecommendationBatcher
+from scoring import ScoringEngine
+
+
+def make_engine(n_items=300, factors=8, seed=0):
+    return ScoringEngine(np.random.default_rng(seed).normal(size=(n_items, factors)))
+
+
+def exact(engine, vector, k, exclude):
+    scores = engine.score(vector)
+    engine.mask(scores, exclude)
+    return engine.top_k(scores, k)
+
+
+def test_queued_requests_coalesce_into_one_batch():
+    engine = make_engine()
+    vectors = np.random.default_rng(1).normal(size=(12, 8))
+    batcher = RecommendationBatcher(engine, window=0.5, max_batch=64)
+    # Queued before the worker starts, so the first batch takes all of them
+    futures = [batcher.submit(v, k=3 + i % 4, exclude=[i, i + 1]) for i, v in enumerate(vectors)]
+    batcher.start()
+    try:
+        results = [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.stop()
+    assert batcher.stats()['batches'] == 1 and batcher.stats()['largest_batch'] == 12
+    for i, (vector, items) in enumerate(zip(vectors, results)):
+        np.testing.assert_array_equal(items, exact(engine, vector, 3 + i % 4, [i, i + 1]))
+
+
+def test_max_batch_splits_the_queue():
+    engine = make_engine()
+    batcher = RecommendationBatcher(engine, window=0.5, max_batch=5)
+    futures = [batcher.submit(v) for v in np.random.default_rng(2).normal(size=(12, 8))]
+    batcher.start()
+    try:
+        [f.result(timeout=5) for f in futures]
+    finally:
+        batcher.stop()
+    assert batcher.stats()['batches'] == 3 and batcher.stats()['largest_batch'] == 5
+
+
+def test_engine_routes_through_the_batcher_and_falls_back_inline_after_stop():
+    engine = make_engine()
+    vector = np.ones(8)
+    expected = engine.recommend(vector, k=5, exclude=[0])
+    batcher = RecommendationBatcher(engine).start()
+    engine.attach_batcher(batcher)
+    np.testing.assert_array_equal(engine.recommend(vector, k=5, exclude=[0]), expected)
+    assert batcher.stats()['requests'] == 1
+
+    batcher.stop()
+    np.testing.assert_array_equal(engine.recommend(vector, k=5, exclude=[0]), expected)
+    assert batcher.stats()['inline'] == 1
+
+
+def test_recommend_async():
+    engine = make_engine()
+    batcher = RecommendationBatcher(engine).start()
+    vectors = np.random.default_rng(3).normal(size=(6, 8))
+
+    async def run():
+        return await asyncio.gather(*(batcher.recommend_async(v, k=4) for v in vectors))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        batcher.stop()
+    for vector, items in zip(vectors, results):
+        np.testing.assert_array_equal(items, exact(engine, vector, 4, None))
@@ -0,0 +1,56 @@
+import os
+import pickle
+
+import numpy as np
+import scipy.sparse
+
+import synthetic
+from bundle import MANIFEST, convert, is_bundle, load_bundle, load_model, write_bundle
+
+
+def write_small(path, **kwargs):
+    rng = np.random.default_rng(0)
+    user_factors = rng.normal(size=(30, 4))
+    item_factors = rng.normal(size=(20, 4))
+    train = scipy.sparse.random(30, 20, density=0.2, format='csr', random_state=0)
+    write_bundle(str(path), user_factors, item_factors, train, synthetic.make_ids("U", 30),
+                 synthetic.make_ids("B", 20), [4, 2, 7], config={'cold_threshold': 3},
+                 model_params={'regularization': 0.1}, model_version="v1", **kwargs)
+    return user_factors, item_factors, train
+
+
+def test_write_and_mmap_load_round_trip(tmp_path):
+    user_factors, item_factors, train = write_small(tmp_path / "b")
+    bundle = load_bundle(str(tmp_path / "b"))
+
+    assert bundle.version == "v1" and bundle.config == {'cold_threshold': 3}
+    assert isinstance(bundle.arrays['item_factors'], np.memmap)
+    np.testing.assert_allclose(bundle.model.user_factors, user_factors, rtol=1e-6)
+    np.testing.assert_allclose(bundle.model.item_factors, item_factors, rtol=1e-6)
+    assert bundle.model.regularization == 0.1
+    assert (bundle.train_matrix != train).nnz == 0
+    assert bundle.user_ids.tolist() == synthetic.make_ids("U", 30).tolist()
+    assert bundle.item_ids.tolist() == synthetic.make_ids("B", 20).tolist()
+    assert list(bundle.recent_items) == [4, 2, 7]
+
+
+def test_half_written_bundle_is_not_loadable(tmp_path):
+    write_small(tmp_path / "b")
+    os.remove(tmp_path / "b" / MANIFEST)
+    assert not is_bundle(str(tmp_path / "b"))
+
+
+def test_load_model_reads_bundles_and_legacy_pickles(recommender, tmp_path):
+    src = recommender.artifacts_dir
+    convert(src, str(tmp_path / "b"), model_version="v9")
+    legacy, bundled = load_model(src), load_model(str(tmp_path / "b"))
+
+    assert bundled.version == "v9"
+    np.testing.assert_allclose(bundled.model.item_factors, legacy.model.item_factors, rtol=1e-6)
+    assert (bundled.train_matrix != legacy.train_matrix).nnz == 0
+    assert bundled.user_ids.decode([0, 5]) == legacy.user_ids.decode([0, 5])
+    assert list(bundled.recent_items) == list(legacy.recent_items)
+    with open(os.path.join(src, "config.pkl"), "rb") as f:
+        assert bundled.config == pickle.load(f)
+    # Extra artifacts travel with the bundle
+    assert os.path.exists(tmp_path / "b" / "items_metadata.parquet")
@@ -0,0 +1,111 @@
+import pandas as pd
+
+import synthetic
+from catalog import CatalogBrowser
+
+
+def make_catalog(path, n_items=95):
+    meta = pd.DataFrame({
+        'asin': synthetic.make_ids("B", n_items),
+        'title': [f"Product {i}" for i in range(n_items)],
+        'brand': "Brand",
+        'main_cat': "All Beauty",
+        'image_url': "",
+        'popularity': [i % 7 for i in range(n_items)],
+    })
+    return synthetic.populate_products(meta, f"sqlite:///{path}")
+
+
+def test_pages_hold_per_page_rows(tmp_path):
+    app = make_catalog(tmp_path / "products.db")
+    with app.app_context():
+        browser = CatalogBrowser(per_page=20, ttl=None)
+        sizes = [len(browser.page(p).items) for p in range(1, 6)]
+    assert sizes == [20, 20, 20, 20, 15]
+
+
+def test_rows_added_after_anchors_do_not_grow_pages(tmp_path):
+    from models import db, Product
+
+    app = make_catalog(tmp_path / "products.db")
+    with app.app_context():
+        browser = CatalogBrowser(per_page=20, ttl=None)
+        browser.anchors()
+        # Land inside the cached ranges of the first and the last page
+        for i in range(30):
+            db.session.add(Product(asin=f"N{i:04d}", title="New", brand="Brand", main_cat="All Beauty",
+                                   image_url="", popularity=6 if i % 2 else 0))
+        db.session.commit()
+        assert len(browser.page(1).items) == 20
+        assert len(browser.page(5).items) == 20
+
+
+def all_pages(browser):
+    asins, page = [], 1
+    while True:
+        pagination = browser.page(page)
+        asins += [p.asin for p in pagination.items]
+        if page >= pagination.pages:
+            return asins
+        page += 1
+
+
+def test_rows_inserted_elsewhere_are_not_skipped(tmp_path):
+    from models import db, Product
+
+    app = make_catalog(tmp_path / "products.db")
+    with app.app_context():
+        browser = CatalogBrowser(per_page=20, ttl=None)
+        before = all_pages(browser)
+        # Another worker inserts into the first page's range; this browser is not told
+        db.session.add(Product(asin="N0001", title="New", brand="Brand", main_cat="All Beauty",
+                               image_url="", popularity=6))
+        db.session.commit()
+        first = [p.asin for p in browser.page(1).items]
+        assert len(first) == 20
+        # The overflowing page dropped the anchors: nothing is skipped from here on
+        assert sorted(first + all_pages(browser)[20:]) == sorted(before + ["N0001"])
+
+
+def test_product_added_rebuilds_anchors(tmp_path):
+    from models import db, Product
+
+    app = make_catalog(tmp_path / "products.db")
+    with app.app_context():
+        browser = CatalogBrowser(per_page=20, ttl=None)
+        assert browser.anchors("All Beauty")[0] == 95
+        product = Product(asin="N0001", title="New", brand="Brand", main_cat="All Beauty", image_url="",
+                          popularity=3)
+        db.session.add(product)
+        db.session.commit()
+        browser.product_added(product)
+        rows, anchors = browser.anchors("All Beauty")
+        assert rows == 96 and len(anchors) == 5
+        assert len(all_pages(browser)) == 96
+
+
+def test_anchors_match_offset_pages(tmp_path):
+    from models import Product
+
+    app = make_catalog(tmp_path / "products.db")
+    with app.app_context():
+        browser = CatalogBrowser(per_page=20, ttl=None)
+        ordered = Product.query.order_by(Product.popularity.desc(), Product.asin.desc()).all()
+        _, anchors = browser.anchors()
+        assert anchors == [(p.popularity, p.asin) for p in ordered[::20]]
+        assert all_pages(browser) == [p.asin for p in ordered]
+
+
+def test_create_indexes_on_existing_table(tmp_path):
+    from sqlalchemy import create_engine, text
+    from catalog import create_indexes, missing_indexes
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE products (asin VARCHAR(50) PRIMARY KEY, main_cat VARCHAR(200), "
+                          "popularity INTEGER)"))
+    assert len(missing_indexes(engine)) == 2
+    assert sorted(create_indexes(engine)) == ['ix_products_main_cat_popularity_asin',
+                                               'ix_products_popularity_asin']
+    assert missing_indexes(engine) == []
+    assert create_indexes(engine) == []
@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+import synthetic
+from events import InteractionLog
+from models import db, Interaction
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = synthetic.make_app(f"sqlite:///{tmp_path / 'events.db'}")
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def count(app):
+    with app.app_context():
+        n = Interaction.query.count()
+        db.session.remove()
+        return n
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_flush_on_size(app):
+    log = InteractionLog(app, batch_size=5, flush_interval=60).start()
+    try:
+        for i in range(4):
+            log.log(1, f"A{i}")
+        time.sleep(0.2)
+        assert count(app) == 0
+        log.log(1, "A4")
+        # The batch counter moves right after the commit, so wait for both
+        assert wait_for(lambda: count(app) == 5 and log.stats()['batches'] == 1)
+    finally:
+        log.stop()
+
+
+def test_flush_on_interval(app):
+    log = InteractionLog(app, batch_size=100, flush_interval=0.1).start()
+    try:
+        for i in range(3):
+            log.log(1, f"A{i}")
+        # The overlay is cleared right after the commit, so wait for both
+        assert wait_for(lambda: count(app) == 3 and log.pending(1) == [], timeout=2.0)
+    finally:
+        log.stop()
+
+
+def test_drain_on_stop(app):
+    log = InteractionLog(app, batch_size=100, flush_interval=60).start()
+    for i in range(7):
+        log.log(i % 2, f"A{i}")
+    assert count(app) == 0
+    log.stop()
+    assert count(app) == 7
+    assert log.stats()['dropped'] == 0
+
+
+def test_unwritable_batch_is_spilled_and_replayed(app, tmp_path, monkeypatch):
+    spill = tmp_path / 'spill.jsonl'
+    log = InteractionLog(app, batch_size=100, flush_interval=60, spill_path=str(spill)).start()
+    for i in range(3):
+        log.log(1, f"A{i}")
+
+    def down(events):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(log, '_write', down)
+    log.stop(timeout=0.5)
+    assert log.stats()['spilled'] == 3
+    assert spill.exists() and count(app) == 0
+
+    # The next process writes the spilled events first
+    restarted = InteractionLog(app, batch_size=100, flush_interval=60, spill_path=str(spill)).start()
+    restarted.stop()
+    assert count(app) == 3
+    assert restarted.stats()['replayed'] == 3
+    assert not spill.exists()
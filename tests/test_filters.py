@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from filters import ExclusionSet, ItemFilter, ItemFilters
+from idmap import IdMap
+from scoring import ScoringEngine
+
+
+@pytest.mark.parametrize("n_items", [1, 8, 13, 100])
+def test_bitset_operations_match_boolean_masks(n_items):
+    rng = np.random.default_rng(n_items)
+    a, b = rng.random(n_items) < 0.5, rng.random(n_items) < 0.3
+    fa, fb = ItemFilter.from_mask(a), ItemFilter.from_mask(b)
+    np.testing.assert_array_equal((fa & fb).mask(), a & b)
+    np.testing.assert_array_equal((fa | fb).mask(), a | b)
+    np.testing.assert_array_equal((fa - fb).mask(), a & ~b)
+    np.testing.assert_array_equal((~fa).mask(), ~a)
+    # Padding bits stay clear, so counts are exact
+    assert len(~fa) == n_items - a.sum() and len(ItemFilter.all(n_items)) == n_items
+    assert fa.indices().tolist() == np.flatnonzero(a).tolist()
+    assert all((i in fa) == a[i] for i in range(n_items)) and n_items not in fa
+
+
+def test_filters_must_cover_the_same_items():
+    with pytest.raises(ValueError):
+        ItemFilter.none(10) & ItemFilter.none(11)
+
+
+def test_groups_are_case_insensitive_and_lists_are_or():
+    # 'Olay' is small enough to be stored as member indices, the others as bitsets
+    brands = ["Olay"] + ["Nivea"] * 40 + ["unknown"] * 40 + ["Dove"] * 119
+    categories = ["Skin"] * 100 + ["Hair"] * 100
+    filters = ItemFilters(200, brands=brands, categories=categories)
+    assert len(filters.brand("olay")) == 1 and len(filters.brand(" NIVEA ")) == 40
+    assert len(filters.brand(["Olay", "Dove", "nope"])) == 120
+    assert "unknown" not in filters.brands and len(filters.brand("nope")) == 0
+
+    allowed = filters.query(category="Skin", brand=["Nivea", "Dove"])
+    assert allowed.indices().tolist() == list(range(1, 41)) + list(range(81, 100))
+    assert filters.query() is None
+
+
+def test_exclusion_set_merges_sources():
+    exclusion = ExclusionSet([5, 3], None).add(np.array([3, -1, 9])).add_asins(IdMap(["a", "b"]), ["b", "zz"])
+    assert exclusion.indices().tolist() == [1, 3, 5, 9] and len(exclusion) == 4
+
+
+@pytest.mark.parametrize("members", [np.arange(0, 300, 50), np.arange(0, 300, 2)])
+def test_constrained_recommend_is_the_masked_top_k(members):
+    rng = np.random.default_rng(0)
+    engine = ScoringEngine(rng.normal(size=(300, 8)))
+    vector = rng.normal(size=8)
+    allowed = ItemFilter.from_indices(members, 300)
+    exclude = members[:2]
+    scores = engine.score(vector)
+    expected = [i for i in np.argsort(-scores, kind='stable') if i in set(members) - set(exclude)][:5]
+    assert engine.recommend(vector, k=5, exclude=exclude, allowed=allowed).tolist() == expected
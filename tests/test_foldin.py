@@ -0,0 +1,51 @@
+import numpy as np
+import scipy.sparse
+
+from als import AlternatingLeastSquares
+from foldin import FoldIn, interaction_weight
+
+
+def make_matrix(n_users=40, n_items=30, seed=0):
+    rng = np.random.default_rng(seed)
+    return scipy.sparse.random(n_users, n_items, density=0.2, format='csr', random_state=seed,
+                               data_rvs=lambda n: rng.uniform(1, 5, n)).astype(np.float32)
+
+
+def test_fold_in_reproduces_trained_user_factors():
+    matrix = make_matrix()
+    snapshots = []
+    model = AlternatingLeastSquares(factors=6, iterations=5, cg_steps=12, regularization=0.1, alpha=2.0,
+                                    calculate_training_loss=False, random_state=0)
+    model.fit(matrix, callback=lambda *_: snapshots.append(model.item_factors.copy()))
+
+    # The last user half-step solved every user against the previous iteration's item factors
+    foldin = FoldIn(snapshots[-2], regularization=0.1, alpha=2.0)
+    for u in range(matrix.shape[0]):
+        row = matrix[u]
+        np.testing.assert_allclose(foldin.solve(row.indices, row.data), model.user_factors[u], rtol=1e-3,
+                                   atol=1e-4)
+
+
+def test_duplicates_are_summed_and_empty_is_zero():
+    foldin = FoldIn(np.random.default_rng(1).normal(size=(10, 4)), regularization=0.05, alpha=1.5)
+    np.testing.assert_allclose(foldin.solve([3, 3, 5], [1.0, 2.0, 1.0]), foldin.solve([3, 5], [3.0, 1.0]),
+                               rtol=1e-6)
+    assert not foldin.solve([]).any()
+
+
+def test_solve_many_matches_solve():
+    keep = np.ones(40)
+    keep[3] = 0
+    matrix = scipy.sparse.diags(keep).dot(make_matrix()).tocsr()
+    matrix.eliminate_zeros()
+    foldin = FoldIn(np.random.default_rng(2).normal(size=(30, 5)), regularization=0.05, alpha=1.0)
+    many = foldin.solve_many(matrix, block_nnz=16)
+    for u in range(matrix.shape[0]):
+        row = matrix[u]
+        np.testing.assert_allclose(many[u], foldin.solve(row.indices, row.data), rtol=1e-4, atol=1e-6)
+    assert not many[3].any()
+
+
+def test_interaction_weight_matches_the_notebook_formula():
+    weight = interaction_weight(4.0, helpful_votes=3, verified=1, age_seconds=1e6, decay=1e-7)
+    assert np.isclose(weight, 4.0 * (1 + np.log1p(3)) * np.exp(-0.1))
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from embeddings import EmbeddingStore, align
+from idmap import IdMap
+from recommender import adaptive_alpha
+
+
+@pytest.fixture
+def hybrid(recommender, monkeypatch):
+    """The shared Recommender with random content embeddings and hydration stubbed out (returns ASINs)."""
+    rng = np.random.default_rng(0)
+    monkeypatch.setattr(recommender, 'embeddings',
+                        EmbeddingStore.from_float(rng.normal(size=(len(recommender.item_ids), 16))))
+    monkeypatch.setattr(recommender, 'get_product_details', lambda asins: list(asins))
+    return recommender
+
+
+def test_int8_store_keeps_cosines():
+    embeddings = np.random.default_rng(1).normal(size=(50, 32)).astype(np.float32)
+    embeddings[7] = 0
+    store = EmbeddingStore.from_float(embeddings)
+    assert not store.has_embedding([7])[0] and store.has_embedding([6])[0]
+    exact = embeddings.dot(embeddings[3])
+    np.testing.assert_allclose(store.score(embeddings[3]), exact, atol=0.02 * np.abs(exact).max())
+
+
+def test_profile_ignores_items_without_embeddings():
+    store = EmbeddingStore.from_float(np.array([[1.0, 0.0], [0.0, 0.0], [0.0, 2.0]]))
+    np.testing.assert_allclose(store.profile([0, 1]), [1.0, 0.0], atol=0.01)
+    np.testing.assert_allclose(store.profile([0, 2]), np.array([1.0, 2.0]) / np.sqrt(5), atol=0.01)
+    assert not store.profile([1]).any()
+
+
+def test_align_orders_rows_by_model_index():
+    aligned, n_known = align(np.array([[1.0], [2.0], [3.0]]), ["b", "zz", "a"], IdMap(["a", "b", "c"]))
+    assert n_known == 2 and aligned.ravel().tolist() == [3.0, 1.0, 0.0]
+
+
+def test_adaptive_alpha_thresholds():
+    assert [adaptive_alpha(n) for n in (0, 1, 2, 4, 5, 50)] == [0.3, 0.3, 0.5, 0.5, 0.8, 0.8]
+
+
+def test_rank_hybrid_blends_als_and_content(hybrid):
+    user = 5
+    seen = hybrid.train_matrix[user].indices
+    vector = hybrid.als_model.user_factors[user]
+    top = hybrid.rank_hybrid(vector, seen, k=10, exclude=seen, n_candidates=40)
+
+    candidates = hybrid.engine.recommend(vector, k=40, exclude=seen)
+    alpha = adaptive_alpha(len(np.unique(seen)))
+    blended = (alpha * hybrid.engine.item_factors[candidates].dot(vector)
+               + (1 - alpha) * hybrid.embeddings.score(hybrid.embeddings.profile(np.unique(seen)), candidates))
+    np.testing.assert_array_equal(top, candidates[np.argsort(-blended, kind='stable')[:10]])
+
+
+def test_recommend_hybrid_paths(hybrid):
+    names = hybrid.user_ids.decode([5])
+    asins = hybrid.recommend_hybrid(names[0], k=5)
+    assert len(asins) == 5
+    seen = set(hybrid.decode_items(hybrid.train_matrix[5].indices))
+    assert not seen.intersection(asins)
+
+    # Unknown user with a session: fold-in of the session items, which are never returned
+    session = hybrid.decode_items([1, 2, 3])
+    asins = hybrid.recommend_hybrid("nobody", recent_asins=session, k=5)
+    assert len(asins) == 5 and not set(session).intersection(asins)
+
+    # Without embeddings the hybrid mode is the warm ALS path
+    hybrid.embeddings = None
+    assert hybrid.recommend_hybrid(names[0], k=5) == hybrid.recommend(names[0], k=5)
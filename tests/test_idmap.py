@@ -0,0 +1,27 @@
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+from idmap import IdMap
+
+
+def test_round_trip():
+    ids = IdMap(["B03", "B01", "B02"])
+    assert len(ids) == 3 and "B01" in ids and "B09" not in ids
+    encoded = ids.encode(["B02", "B09", "B03"])
+    assert encoded.dtype == np.int64 and encoded.tolist() == [2, -1, 0]
+    assert ids.decode(encoded[encoded >= 0]) == ["B02", "B03"]
+    assert ids.get("B01") == 1 and ids.get("B09") is None
+
+
+def test_matches_the_label_encoder():
+    encoder = LabelEncoder().fit(["u9", "u1", "u5", "u1"])
+    ids = IdMap.from_encoder(encoder)
+    names = ["u5", "u9", "u1"]
+    assert ids.encode(names).tolist() == encoder.transform(names).tolist()
+    assert ids.decode([0, 2]) == encoder.inverse_transform([0, 2]).tolist()
+
+
+def test_empty_inputs():
+    ids = IdMap(["a"])
+    assert ids.encode([]).tolist() == []
+    assert ids.decode(np.array([], dtype=np.int64)) == []
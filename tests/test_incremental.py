@@ -0,0 +1,190 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse
+
+import ann
+import quantized
+import synthetic
+from bundle import load_model, write_bundle
+from embeddings import EmbeddingStore
+from foldin import FoldIn
+from incremental import apply_delta, carry_item_stores, item_columns, run_update
+
+
+def make_version(path, n_items=200, factors=16, seed=0):
+    rng = np.random.default_rng(seed)
+    item_factors = rng.normal(0, 0.1, (n_items, factors)).astype(np.float32)
+    EmbeddingStore.from_float(rng.normal(0, 1, (n_items, 8))).save(path)
+    ann.IVFIndex.build(item_factors, n_lists=8).save(ann.index_path(path))
+    quantized.QuantizedIndex.build(item_factors, block_size=8, shortlist=32).save(quantized.index_path(path))
+    return item_factors
+
+
+def make_bundle(path, n_users=50, n_items=40, factors=8, seed=0):
+    rng = np.random.default_rng(seed)
+    train = scipy.sparse.random(n_users, n_items, density=0.1, format='csr', random_state=seed,
+                                data_rvs=lambda n: rng.uniform(1, 5, n))
+    write_bundle(str(path), rng.normal(0, 0.1, (n_users, factors)), rng.normal(0, 0.1, (n_items, factors)),
+                 train, synthetic.make_ids("U", n_users), synthetic.make_ids("B", n_items), list(range(10)),
+                 config={'cold_threshold': 2}, model_params={'regularization': 0.05, 'alpha': 1.0})
+    return load_model(str(path))
+
+
+def list_of_items(index):
+    return dict(zip(index.list_items.tolist(), np.repeat(np.arange(index.n_lists), np.diff(index.list_offsets))))
+
+
+def test_new_items_get_empty_embeddings(tmp_path):
+    src, dst = tmp_path / "v1", tmp_path / "v2"
+    src.mkdir()
+    dst.mkdir()
+    item_factors = make_version(str(src))
+    grown = np.vstack([item_factors, np.ones((5, item_factors.shape[1]), dtype=np.float32)])
+
+    carry_item_stores(str(src), str(dst), grown, np.arange(200, 205))
+
+    old, new = EmbeddingStore.load(str(src)), EmbeddingStore.load(str(dst))
+    assert new.n_items == 205
+    np.testing.assert_array_equal(new.codes[:200], old.codes)
+    np.testing.assert_array_equal(new.scales[:200], old.scales)
+    assert not new.scales[200:].any()
+
+
+def test_indexes_cover_new_items(tmp_path):
+    src, dst = tmp_path / "v1", tmp_path / "v2"
+    src.mkdir()
+    dst.mkdir()
+    item_factors = make_version(str(src))
+    grown = np.vstack([item_factors, np.ones((5, item_factors.shape[1]), dtype=np.float32)])
+
+    written = carry_item_stores(str(src), str(dst), grown, np.arange(200, 205))
+    assert sorted(written) == sorted(["item_embeddings.npy", "item_embeddings_scales.npy",
+                                      "ivf_ip.npz", "quantized_ip.npz"])
+
+    old_ivf = ann.IVFIndex.load(ann.index_path(str(src)))
+    ivf = ann.IVFIndex.load(ann.index_path(str(dst)))
+    np.testing.assert_array_equal(ivf.centroids, old_ivf.centroids)
+    assert sorted(ivf.list_items) == list(range(205))
+    # Unchanged items keep their list
+    old_lists, new_lists = list_of_items(old_ivf), list_of_items(ivf)
+    assert all(new_lists[i] == old_lists[i] for i in range(200))
+
+    store = quantized.QuantizedIndex.load(quantized.index_path(str(dst)), grown)
+    assert store.n_items == 205 and store.block_size == 8 and store.shortlist == 32
+    # The new items dominate every positive query
+    items, _ = store.search(np.ones(grown.shape[1], dtype=np.float32), k=5)
+    assert sorted(items) == list(range(200, 205))
+
+
+def test_unchanged_stores_are_linked(tmp_path):
+    src, dst = tmp_path / "v1", tmp_path / "v2"
+    src.mkdir()
+    dst.mkdir()
+    item_factors = make_version(str(src))
+    carry_item_stores(str(src), str(dst), item_factors, np.empty(0, dtype=np.int64))
+    for name in ("item_embeddings.npy", "ivf_ip.npz", "quantized_ip.npz"):
+        assert os.stat(src / name).st_ino == os.stat(dst / name).st_ino
+
+
+def test_updated_rows_match_a_full_rebuild(tmp_path):
+    src, dst = tmp_path / "v1", tmp_path / "v2"
+    src.mkdir()
+    dst.mkdir()
+    item_factors = make_version(str(src))
+    changed = np.array([3, 50, 199])
+    item_factors[changed] *= -2
+    carry_item_stores(str(src), str(dst), item_factors, changed)
+    store = quantized.QuantizedIndex.load(quantized.index_path(str(dst)), item_factors)
+    full = quantized.QuantizedIndex.build(item_factors, block_size=8)
+    np.testing.assert_array_equal(store.codes, full.codes)
+    np.testing.assert_array_equal(store.scales, full.scales)
+
+
+def test_item_columns_match_csc():
+    matrix = scipy.sparse.random(30, 20, density=0.2, format='csr', random_state=2)
+    csc = matrix.tocsc()
+    columns = item_columns(matrix, np.array([0, 5, 19]))
+    for i in (0, 5, 19):
+        users, values = columns[i]
+        np.testing.assert_array_equal(users, csc.indices[csc.indptr[i]:csc.indptr[i + 1]])
+        np.testing.assert_array_equal(values, csc.data[csc.indptr[i]:csc.indptr[i + 1]])
+
+
+def test_apply_delta_extends_ids_and_solves_touched_rows(tmp_path):
+    state = make_bundle(tmp_path / "v1")
+    old_user_factors = np.array(state.model.user_factors)
+    old_item_factors = np.array(state.model.item_factors)
+    old_row = state.train_matrix[3].toarray().ravel()
+
+    usernames = ["U03", "U03", "NEWUSER", "U10"]
+    asins = ["B05", "NEWITEM", "B05", "NEWITEM"]
+    weights = np.array([2.0, 1.0, 3.0, 4.0])
+    user_factors, item_factors, train, solved, stats = apply_delta(state, usernames, asins, weights)
+
+    assert stats['new_users'] == 1 and stats['new_items'] == 1
+    assert state.user_ids.get("NEWUSER") == 50 and state.item_ids.get("NEWITEM") == 40
+    assert train.shape == (51, 41) and user_factors.shape == (51, 8) and item_factors.shape == (41, 8)
+    assert train[3, 5] == old_row[5] + 2.0 and train[50, 5] == 3.0
+
+    # User half-step: exact fold-in of the merged row against the old items
+    foldin = FoldIn(old_item_factors, regularization=0.05, alpha=1.0)
+    for u in (3, 10, 50):
+        row = train[u]
+        known = row.indices < 40
+        np.testing.assert_allclose(user_factors[u], foldin.solve(row.indices[known], row.data[known]), rtol=1e-5)
+    untouched = np.setdiff1d(np.arange(50), [3, 10])
+    np.testing.assert_array_equal(user_factors[untouched], old_user_factors[untouched])
+
+    # Item half-step: only the new item, solved against the new user factors
+    assert solved.tolist() == [40]
+    expected = FoldIn(user_factors, regularization=0.05, alpha=1.0).solve([3, 10], [1.0, 4.0])
+    np.testing.assert_allclose(item_factors[40], expected, rtol=1e-5)
+    np.testing.assert_array_equal(item_factors[:40], old_item_factors)
+
+
+def test_update_items_resolves_touched_columns(tmp_path):
+    state = make_bundle(tmp_path / "v1")
+    user_factors, item_factors, train, solved, _ = apply_delta(state, ["U03"], ["B05"], np.array([2.0]),
+                                                               update_items=True)
+    assert solved.tolist() == [5]
+    column = train.tocsc()[:, 5]
+    expected = FoldIn(user_factors, regularization=0.05, alpha=1.0).solve(column.indices, column.data)
+    np.testing.assert_allclose(item_factors[5], expected, rtol=1e-5)
+
+
+def test_run_update_advances_watermark(tmp_path):
+    from models import db, Interaction, User
+
+    root = tmp_path / "models"
+    root.mkdir()
+    make_bundle(root / "v1")
+    app = synthetic.make_app(f"sqlite:///{tmp_path / 'live.db'}")
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id=1, username="U03", password="x"), User(id=2, username="NEWUSER", password="x")])
+        db.session.add_all([Interaction(user_id=1, product_asin="B05", interaction_type='purchase',
+                                        timestamp=datetime.utcnow()),
+                            Interaction(user_id=1, product_asin="B07", timestamp=datetime.utcnow())])
+        db.session.commit()
+
+        stats = run_update(str(root / "v1"), str(root), db.session, version="v2")
+        assert stats['watermark'] == 2 and stats['new_users'] == 0
+        v2 = load_model(str(root / "v2"))
+        assert v2.config['interaction_watermark'] == 2
+        # Nothing about the items changed: their arrays are shared with v1
+        for name in ("item_factors.npy", "item_factors_norm.npy", "item_ids.npy", "user_ids.npy"):
+            assert os.stat(root / "v1" / name).st_ino == os.stat(root / "v2" / name).st_ino
+        assert run_update(str(root / "v2"), str(root), db.session, version="v3") is None
+
+        db.session.add_all([Interaction(user_id=2, product_asin="B05", timestamp=datetime.utcnow()),
+                            Interaction(user_id=2, product_asin="NEWITEM", timestamp=datetime.utcnow())])
+        db.session.commit()
+        stats = run_update(str(root / "v2"), str(root), db.session, version="v3")
+        assert stats['watermark'] == 4 and stats['new_users'] == 1 and stats['new_items'] == 1
+        v3 = load_model(str(root / "v3"))
+        assert v3.train_matrix.shape == (51, 41)
+        assert v3.user_ids.get("NEWUSER") == 50 and v3.item_ids.get("NEWITEM") == 40
+        norm = np.asarray(v3.item_factors_norm)
+        np.testing.assert_allclose(np.linalg.norm(norm[40]), 1.0, rtol=1e-5)
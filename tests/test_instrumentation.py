@@ -0,0 +1,48 @@
+from instrumentation import Metrics, stats_metrics
+
+
+def test_counters_render_with_help_type_and_sorted_labels():
+    metrics = Metrics()
+    metrics.describe('requests_total', 'Requests.')
+    metrics.inc('requests_total', strategy='warm', region='eu')
+    metrics.inc('requests_total', 2, strategy='warm', region='eu')
+    metrics.inc('requests_total', strategy='say "hi"\n')
+    lines = metrics.render().splitlines()
+
+    assert lines[:2] == ['# HELP requests_total Requests.', '# TYPE requests_total counter']
+    assert 'requests_total{region="eu",strategy="warm"} 3' in lines
+    assert 'requests_total{strategy="say \\"hi\\"\\n"} 1' in lines
+    # One header per metric family
+    assert sum(line.startswith('# TYPE requests_total') for line in lines) == 1
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics()
+    metrics.set_buckets('batch_size', (1, 10))
+    for value in (1, 5, 50):
+        metrics.observe('batch_size', value)
+    lines = metrics.render().splitlines()
+
+    assert '# TYPE batch_size histogram' in lines
+    assert 'batch_size_bucket{le="1"} 1' in lines
+    assert 'batch_size_bucket{le="10"} 2' in lines
+    assert 'batch_size_bucket{le="+Inf"} 3' in lines
+    assert 'batch_size_sum 56.0' in lines and 'batch_size_count 3' in lines
+
+
+def test_collectors_skip_missing_values():
+    metrics = Metrics()
+    metrics.register_collector(lambda: [('model_info', 'gauge', {'version': 'v2'}, 1),
+                                        ('model_last_load_seconds', 'gauge', {}, None)])
+    assert metrics.render() == '# TYPE model_info gauge\nmodel_info{version="v2"} 1\n'
+
+
+def test_stats_are_counters_except_gauges():
+    stats = {'hits': 7, 'misses': 2, 'size': 5}
+    rows = list(stats_metrics('rec_cache', stats))
+    assert rows == [('rec_cache_hits_total', 'counter', {}, 7),
+                    ('rec_cache_misses_total', 'counter', {}, 2),
+                    ('rec_cache_size', 'gauge', {}, 5)]
+    rows = dict((name, kind) for name, kind, _, _ in stats_metrics('batcher', {'queue_depth': 0, 'batches': 3},
+                                                                      gauges=('queue_depth',)))
+    assert rows == {'batcher_queue_depth': 'gauge', 'batcher_batches_total': 'counter'}
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from idmap import IdMap
+from itemmeta import ItemMetadata, encode_values
+
+
+def catalog_frame():
+    # B3 is metadata-only; the model's A2 has no metadata row
+    return pd.DataFrame({
+        'asin': ['A1', 'A0', 'B3', 'A3', 'A1'],
+        'title': ['  Face   cream\n', None, 'Hair oil', 'Lip balm', 'duplicate'],
+        'brand': ['Dove', 'dove ', 'Unknown', None, 'Nivea'],
+        'main_cat': ['Skin', 'skin', 'Hair', 'SKIN', 'Hair'],
+        'category': [np.array(['Beauty', 'Face'], dtype=object), np.array([], dtype=object), 'Beauty', None,
+                     np.array(['x'], dtype=object)],
+        'image_url': ["['https://img/1.jpg', 'https://img/2.jpg']", '', 'https://img/3.jpg', None, ''],
+        'price': ['$1', '$2', '$3', '$4', '$5'],
+    })
+
+
+def make_catalog():
+    return ItemMetadata.from_frame(catalog_frame(), IdMap(np.array(['A0', 'A1', 'A2', 'A3'], dtype=object)))
+
+
+def test_encode_values_is_case_insensitive_and_keeps_first_spelling():
+    codes, names = encode_values(['Dove', None, ' dove', 'NIVEA', 'unknown', 'nan', 'Nivea', ''])
+    assert codes.tolist() == [0, -1, 0, 1, -1, -1, 1, -1]
+    assert names.tolist() == ['Dove', 'NIVEA']
+
+
+def test_rows_align_with_model_indices():
+    catalog = make_catalog()
+    assert (catalog.n_items, len(catalog)) == (4, 5)
+    assert catalog.rows(['A0', 'A2', 'B3', 'nope']).tolist() == [0, 2, 4, -1]
+    assert catalog.asins([4, 1]) == ['B3', 'A1']
+    assert catalog.known([0, 2, 4, -1]).tolist() == [True, False, True, False]
+    assert 'B3' in catalog and 'A2' not in catalog and 'nope' not in catalog
+
+
+def test_columns_are_decoded_per_row():
+    catalog = make_catalog()
+    # Duplicate ASINs keep their first row
+    assert catalog.title.take([1, 0, 2]) == ['Face cream', '', '']
+    assert catalog.image_url.take([1, 4, 3]) == ['https://img/1.jpg', 'https://img/3.jpg', '']
+    assert catalog.brands([0, 1, 3, 4]).tolist() == ['dove', 'dove', None, None]
+    assert catalog.main_cats([0, 2, 3, 4]).tolist() == ['skin', None, 'skin', 'Hair']
+    assert catalog.categories([1, 0, 4, 3]) == [['Beauty', 'Face'], [], ['Beauty'], []]
+
+
+def test_members_and_most_common_main_cat():
+    catalog = make_catalog()
+    assert catalog.members(' SKIN').tolist() == [0, 1, 3]
+    assert catalog.members('hair').tolist() == [4]
+    assert catalog.members('Shoes').tolist() == []
+    assert catalog.most_common_main_cat([4, 3, 0]) == 'skin'
+    # Ties go to the first main_cat seen among the rows
+    assert catalog.most_common_main_cat([4, 0, -1]) == 'Hair'
+    assert catalog.most_common_main_cat([2, -1]) is None
+
+
+def test_records_skip_items_without_metadata():
+    records = make_catalog().records(['A1', 'A2', 'B3', 'nope'])
+    assert list(records) == ['A1', 'B3']
+    assert records['A1'] == {'title': 'Face cream', 'brand': 'dove', 'main_cat': 'skin',
+                             'category': ['Beauty', 'Face']}
+    assert records['B3'] == {'title': 'Hair oil', 'brand': None, 'main_cat': 'Hair', 'category': ['Beauty']}
+
+
+def test_load_reads_the_parquet_columns(tmp_path):
+    path = tmp_path / "items_metadata.parquet"
+    catalog_frame().drop(columns=['category']).to_parquet(path)
+    item_ids = IdMap(np.array(['A0', 'A1', 'A2', 'A3'], dtype=object))
+    loaded = ItemMetadata.load(str(path), item_ids)
+    built = make_catalog()
+
+    assert loaded.item_ids is item_ids and len(loaded) == len(built)
+    assert loaded.title.take(range(5)) == built.title.take(range(5))
+    np.testing.assert_array_equal(loaded.main_cat_codes, built.main_cat_codes)
+    # A missing column loads as empty values
+    assert loaded.categories(range(5)) == [[]] * 5
@@ -0,0 +1,72 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from sklearn.preprocessing import LabelEncoder
+
+from foldin import interaction_weight
+from pipeline import RunningCodes, build, label_codes, temporal_split, write_synthetic_dumps
+
+
+def test_running_codes_are_stable_across_chunks():
+    codes = RunningCodes()
+    assert codes.encode(np.array(["b", "a", "b"], dtype=object)).tolist() == [0, 1, 0]
+    assert codes.encode(np.array(["c", "a"], dtype=object)).tolist() == [2, 1]
+    assert codes.ids == ["b", "a", "c"]
+
+
+def test_label_codes_match_label_encoder():
+    ids = np.array(["u3", "u1", "u2", "u0"], dtype=object)
+    classes, remap = label_codes(np.array([0, 1, 1, 3]), ids)
+    encoder = LabelEncoder().fit(["u3", "u1", "u0"])
+    assert classes.tolist() == encoder.classes_.tolist()
+    assert remap[[0, 1, 3]].tolist() == encoder.transform(["u3", "u1", "u0"]).tolist() and remap[2] == -1
+
+
+def test_temporal_split_per_user():
+    # User 0: 5 reviews (4 train), user 1: 1 review (dropped), user 2: 2 reviews (1 train)
+    user = np.array([0, 2, 0, 1, 0, 0, 2, 0])
+    ts = np.array([50, 9, 10, 7, 40, 30, 8, 20])
+    order, is_train = temporal_split(user, ts)
+    assert user[order].tolist() == [0, 0, 0, 0, 0, 2, 2]
+    assert ts[order].tolist() == [10, 20, 30, 40, 50, 8, 9]
+    assert is_train.tolist() == [True, True, True, True, False, True, False]
+
+
+def test_build_from_dumps(tmp_path):
+    reviews, meta = tmp_path / "reviews.json.gz", tmp_path / "meta.json.gz"
+    write_synthetic_dumps(str(reviews), str(meta), n_reviews=3000, n_meta=200, n_users=150, chunk_size=700)
+    out = tmp_path / "artifacts"
+    stats = build(str(reviews), str(meta), str(out), chunk_size=700, iterations=0)
+    assert stats['meta_items'] == 200 and stats['train'] + stats['test'] <= stats['reviews_kept']
+
+    # Same split and weights as a whole-file pandas pass (the notebook's way)
+    df = pd.read_json(reviews, lines=True, dtype=False)
+    df = df[df['verified'] == True]  # noqa: E712
+    df['votes'] = pd.to_numeric(df['vote'].astype(str).str.replace(',', ''), errors='coerce').fillna(0)
+    df['w'] = interaction_weight(df['overall'], df['votes'], age_seconds=df['unixReviewTime'].max()
+                                 - df['unixReviewTime'])
+    df = df.sort_values(['reviewerID', 'unixReviewTime'], kind='stable')
+    sizes = df.groupby('reviewerID')['asin'].transform('size')
+    df = df[sizes >= 2]
+    rank = df.groupby('reviewerID').cumcount()
+    n_train = np.maximum(1, (df.groupby('reviewerID')['asin'].transform('size') * 0.8).astype(int))
+    train = df[rank < n_train]
+
+    with open(out / "user_encoder.pkl", "rb") as f:
+        users = pickle.load(f)
+    with open(out / "item_encoder.pkl", "rb") as f:
+        items = pickle.load(f)
+    assert users.classes_.tolist() == sorted(train['reviewerID'].unique())
+    assert items.classes_.tolist() == sorted(train['asin'].unique())
+
+    matrix = scipy.sparse.load_npz(out / "train_matrix.npz")
+    expected = scipy.sparse.csr_matrix(
+        (train['w'], (users.transform(train['reviewerID']), items.transform(train['asin']))), shape=matrix.shape)
+    np.testing.assert_allclose(matrix.toarray(), expected.toarray(), rtol=1e-6)
+    # Held-out rows whose item was seen in training
+    test = df[(rank >= n_train) & df['asin'].isin(train['asin'])]
+    split = pd.read_parquet(out / "test.parquet")
+    assert len(split) == stats['test'] == len(test)
+    assert sorted(zip(split['user_id'], split['item_id'])) == sorted(zip(test['reviewerID'], test['asin']))
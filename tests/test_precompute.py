@@ -0,0 +1,31 @@
+import numpy as np
+
+from precompute import precompute_topn
+
+
+def test_batch_matches_single_user_path(recommender):
+    users = np.arange(0, 200, 7)
+    items, scores = recommender.recommend_batch_indices(users, k=10)
+    for row, user in enumerate(users):
+        vector = recommender.als_model.user_factors[user]
+        single = recommender.engine.recommend(vector, k=10, exclude=recommender.train_matrix[user].indices)
+        np.testing.assert_array_equal(items[row], single)
+        np.testing.assert_allclose(scores[row], recommender.engine.score(vector)[single], rtol=1e-5)
+
+
+def test_batch_by_username_skips_unknown_users(recommender):
+    names = recommender.user_ids.decode([4, 9])
+    results = recommender.recommend_batch([names[0], "nobody", names[1]], k=5)
+    assert results[1] == []
+    items, _ = recommender.recommend_batch_indices([4, 9], k=5)
+    assert results[0] == recommender.decode_items(items[0]) and results[2] == recommender.decode_items(items[1])
+
+
+def test_precompute_matches_batch(recommender, tmp_path):
+    n_users, top_n = precompute_topn(recommender, str(tmp_path), top_n=20, chunk_size=64)
+    assert (n_users, top_n) == (200, 20)
+    items = np.load(tmp_path / "topn_items.npy")
+    scores = np.load(tmp_path / "topn_scores.npy")
+    expected_items, expected_scores = recommender.recommend_batch_indices(np.arange(200), k=20)
+    np.testing.assert_array_equal(items, expected_items)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
@@ -0,0 +1,116 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from events import InteractionEvent
+from foldin import FoldIn
+from idmap import IdMap
+from profiles import ProfileStore
+
+Row = namedtuple('Row', ['id', 'user_id', 'product_asin', 'interaction_type', 'timestamp'])
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class FakeTable:
+    """The interactions table as seen by every worker process."""
+
+    def __init__(self):
+        self.rows = []
+        self.loads = 0
+        self.lookups = 0
+
+    def insert(self, user_id, asin, ts, interaction_type='view'):
+        row = Row(len(self.rows) + 1, user_id, asin, interaction_type, ts)
+        self.rows.append(row)
+        return row
+
+    def recent(self, user_id, limit=20):
+        self.loads += 1
+        rows = [r for r in self.rows if r.user_id == user_id]
+        return sorted(rows, key=lambda r: r.timestamp, reverse=True)[:limit]
+
+    def after(self, user_id, after_id, limit):
+        self.lookups += 1
+        return [r for r in self.rows if r.user_id == user_id and r.id > after_id][:limit]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1704110400.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_store(n_items=20, max_items=5):
+    item_factors = np.random.default_rng(0).normal(0, 0.1, (n_items, 4)).astype(np.float32)
+    return ProfileStore(IdMap([f"A{i}" for i in range(n_items)]), item_factors, FoldIn(item_factors),
+                        max_items=max_items, refresh_interval=5.0, clock=Clock())
+
+
+def get(store, table, user_id=1):
+    return store.get(user_id, lambda: table.recent(user_id),
+                     newer=lambda after_id: table.after(user_id, after_id, store.max_items))
+
+
+def test_rows_from_other_workers_are_folded_in():
+    store, table = make_store(), FakeTable()
+    table.insert(1, "A1", T0)
+    profile = get(store, table)
+    assert store.recent_asins(profile) == ["A1"]
+
+    # Written by another worker: this process never saw the event
+    table.insert(1, "A2", T0 + timedelta(seconds=5))
+    store.clock.now += 5
+    profile = get(store, table)
+    assert store.recent_asins(profile) == ["A2", "A1"]
+    assert profile.seen_id == 2
+    assert table.loads == 1 and store.hits == 1
+
+
+def test_catch_up_is_throttled():
+    store, table = make_store(), FakeTable()
+    table.insert(1, "A1", T0)
+    get(store, table)
+    table.insert(1, "A2", T0 + timedelta(seconds=1))
+    for _ in range(10):
+        store.clock.now += 0.4
+        profile = get(store, table)
+    # No lookup within refresh_interval of the load: the row from the other worker is not seen yet
+    assert table.lookups == 0
+    assert store.recent_asins(profile) == ["A1"]
+    store.clock.now += 1
+    profile = get(store, table)
+    assert table.lookups == 1
+    assert store.recent_asins(profile) == ["A2", "A1"]
+
+
+def test_own_events_are_not_applied_twice():
+    store, table = make_store(), FakeTable()
+    table.insert(1, "A1", T0)
+    profile = get(store, table)
+
+    event = InteractionEvent(1, "A3", 'purchase', T0 + timedelta(seconds=5, microseconds=250000))
+    store.record(event)
+    before = dict(profile.items)
+    # Flushed later; the row has the database's second resolution
+    table.insert(1, "A3", event.timestamp.replace(microsecond=0), 'purchase')
+    store.clock.now += 5
+    profile = get(store, table)
+    assert dict(profile.items) == before
+    assert profile.seen_id == 2
+
+
+def test_profile_far_behind_is_rebuilt():
+    store, table = make_store(max_items=3), FakeTable()
+    table.insert(1, "A1", T0)
+    get(store, table)
+    for i in range(3):
+        table.insert(1, f"A{i + 5}", T0 + timedelta(seconds=i + 1))
+    store.clock.now += 5
+    profile = get(store, table)
+    assert table.loads == 2 and store.misses == 2
+    assert store.recent_asins(profile)[0] == "A7"
+    assert profile.seen_id == 4
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from quantized import QuantizedIndex, index_path, quantize_blocks
+from scoring import ScoringEngine
+
+
+def low_rank_factors(n_items=3000, factors=32, seed=0):
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(8, factors)).astype(np.float32)
+    return ((rng.normal(size=(n_items, 8)).astype(np.float32).dot(basis)
+             + rng.normal(0, 0.5, (n_items, factors)).astype(np.float32)) * 0.1)
+
+
+def overlap(index, item_factors, queries, k=10):
+    engine = ScoringEngine(item_factors)
+    hits = sum(len(set(engine.top_k(engine.score(q), k).tolist()) & set(index.search(q, k)[0].tolist()))
+               for q in queries)
+    return hits / (k * len(queries))
+
+
+def test_blocks_dequantize_within_half_a_step():
+    vectors = np.random.default_rng(1).normal(size=(20, 16)).astype(np.float32)
+    codes, scales = quantize_blocks(vectors, block_size=4)
+    assert codes.dtype == np.int8 and scales.shape == (20, 4)
+    restored = codes.reshape(20, 4, 4).astype(np.float32) * scales[:, :, None]
+    assert np.all(np.abs(restored.reshape(20, 16) - vectors) <= np.repeat(scales, 4, axis=1) / 2 + 1e-7)
+    with pytest.raises(ValueError):
+        quantize_blocks(vectors, block_size=5)
+
+
+@pytest.mark.parametrize("block_size", [None, 8])
+def test_shortlist_re_ranking_overlaps_exact_search(block_size):
+    item_factors = low_rank_factors()
+    queries = np.random.default_rng(2).normal(size=(30, 32)).astype(np.float32)
+    index = QuantizedIndex.build(item_factors, block_size=block_size, shortlist=100)
+    assert overlap(index, item_factors, queries) >= 0.95
+    # Scores returned are the exact float32 ones
+    items, scores = index.search(queries[0], k=5)
+    np.testing.assert_allclose(scores, item_factors[items].dot(queries[0]), rtol=1e-5)
+
+
+def test_full_shortlist_is_exact():
+    item_factors = low_rank_factors(n_items=500)
+    queries = np.random.default_rng(3).normal(size=(10, 32)).astype(np.float32)
+    assert overlap(QuantizedIndex.build(item_factors, shortlist=500), item_factors, queries) == 1.0
+
+
+def test_exclusions_and_save_load(tmp_path):
+    item_factors = low_rank_factors(n_items=400)
+    index = QuantizedIndex.build(item_factors, block_size=8, shortlist=50)
+    query = item_factors[11]
+    best, _ = index.search(query, k=3)
+    items, _ = index.search(query, k=3, exclude=best)
+    assert not np.isin(items, best).any()
+
+    index.save(index_path(str(tmp_path)))
+    loaded = QuantizedIndex.load(index_path(str(tmp_path)), item_factors)
+    assert loaded.block_size == 8 and loaded.shortlist == 50
+    np.testing.assert_array_equal(loaded.search(query, k=10)[0], index.search(query, k=10)[0])
@@ -0,0 +1,104 @@
+import pytest
+
+from rec_cache import InMemoryBackend, RecommendationCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return RecommendationCache(InMemoryBackend(max_entries=100, clock=clock), ttl=300)
+
+
+def test_miss_then_hit(cache):
+    calls = []
+    compute = lambda: calls.append(1) or ['a', 'b']
+    assert cache.get_or_compute(1, 10, 'home', compute) == ['a', 'b']
+    assert cache.get_or_compute(1, 10, 'home', compute) == ['a', 'b']
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    # k and mode are part of the key
+    assert cache.get_or_compute(1, 12, 'home', lambda: ['c']) == ['c']
+    assert cache.get_or_compute(1, 10, 'recommend', lambda: ['d']) == ['d']
+
+
+def test_ttl_expiry(cache, clock):
+    cache.get_or_compute(1, 10, 'home', lambda: ['old'])
+    clock.now = 299
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['new']) == ['old']
+    clock.now = 300
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['new']) == ['new']
+
+
+def test_invalidate_is_per_user(cache):
+    cache.get_or_compute(1, 10, 'home', lambda: ['u1'])
+    cache.get_or_compute(2, 10, 'home', lambda: ['u2'])
+    cache.invalidate(1)
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['u1 fresh']) == ['u1 fresh']
+    assert cache.get_or_compute(2, 10, 'home', lambda: ['u2 fresh']) == ['u2']
+
+
+class StubModel:
+    def __init__(self, artifacts_dir):
+        self.version = artifacts_dir
+        self.products = None
+
+
+def test_invalidate_all_on_model_swap(cache, tmp_path):
+    from registry import ModelRegistry
+
+    registry = ModelRegistry(initial_path=str(tmp_path / 'v1'), loader=StubModel, poll_interval=0, warmup=False)
+    registry.add_listener(lambda old, new: cache.invalidate_all())
+    registry.start()
+    cache.get_or_compute(1, 10, 'home', lambda: ['u1'])
+    cache.get_or_compute(2, 10, 'home', lambda: ['u2'])
+    registry.reload(str(tmp_path / 'v2'), block=True)
+    assert registry.version == str(tmp_path / 'v2')
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['u1 v2']) == ['u1 v2']
+    assert cache.get_or_compute(2, 10, 'home', lambda: ['u2 v2']) == ['u2 v2']
+
+
+def test_invalidate_during_compute_is_not_served(cache):
+    def compute():
+        # An interaction is logged while the list is being computed from the old state
+        cache.invalidate(1)
+        return ['stale']
+
+    assert cache.get_or_compute(1, 10, 'home', compute) == ['stale']
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['fresh']) == ['fresh']
+
+
+def test_entry_expires_ttl_after_its_key_was_read(cache, clock):
+    def slow():
+        clock.now += 100
+        return ['slow']
+
+    cache.get_or_compute(1, 10, 'home', slow)
+    clock.now = 299
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['new']) == ['slow']
+    clock.now = 300
+    assert cache.get_or_compute(1, 10, 'home', lambda: ['new']) == ['new']
+
+
+def test_generation_counters_are_pruned(cache, clock):
+    backend = cache.backend
+    for user in range(50):
+        cache.invalidate(user)
+    assert backend.counters() == 50
+    clock.now = 301
+    cache.invalidate('other')
+    assert backend.counters() == 1
+    # An expired counter never comes back to a value an old entry may still be stored under
+    assert backend.counter(('gen', 0)) == 0
+    assert cache.backend.incr(('gen', 0), 300) > 50
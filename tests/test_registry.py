@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from registry import ModelRegistry, list_versions, warm_up
+
+
+class FakeModel:
+    def __init__(self, artifacts_dir):
+        if artifacts_dir.endswith("broken"):
+            raise ValueError("corrupt artifacts")
+        self.artifacts_dir = artifacts_dir
+        self.version = None
+        self.products = object()
+
+
+def make_versions(root, *names):
+    for name in names:
+        (root / name).mkdir()
+        (root / name / "als_weighted.pkl").write_bytes(b"")
+
+
+def test_only_complete_visible_versions_are_listed(tmp_path):
+    make_versions(tmp_path, "20260101", "20260102", ".20260103")
+    (tmp_path / "20260104").mkdir()
+    assert list_versions(str(tmp_path)) == ["20260101", "20260102"]
+
+
+def test_reload_swaps_atomically_and_notifies(tmp_path):
+    make_versions(tmp_path, "v1")
+    registry = ModelRegistry(root=str(tmp_path), loader=FakeModel, poll_interval=0, warmup=False).start()
+    swaps = []
+    registry.add_listener(lambda old, new: swaps.append((old, new)))
+    held = registry.current
+    assert registry.version == "v1"
+
+    make_versions(tmp_path, "v2")
+    assert registry.reload(block=True)
+    new = registry.current
+    assert registry.version == "v2" and new is not held
+    # A request that started on v1 keeps its reference; the product cache moves over
+    assert held.artifacts_dir.endswith("v1") and new.products is held.products
+    assert swaps == [(held, new)]
+    assert registry.metrics()['reloads'] == 2
+
+
+def test_failed_load_keeps_serving_the_old_version(tmp_path):
+    make_versions(tmp_path, "v1", "v2broken")
+    registry = ModelRegistry(root=str(tmp_path), loader=FakeModel, poll_interval=0, warmup=False)
+    registry.reload(str(tmp_path / "v1"), block=True)
+    with pytest.raises(ValueError):
+        registry.reload(block=True)
+    assert registry.version == "v1"
+    assert registry.failures == 1 and "corrupt" in registry.last_error
+
+
+def test_only_one_reload_runs_at_a_time(tmp_path):
+    make_versions(tmp_path, "v1")
+    release = threading.Event()
+
+    class SlowModel(FakeModel):
+        def __init__(self, artifacts_dir):
+            release.wait(5)
+            super().__init__(artifacts_dir)
+
+    registry = ModelRegistry(root=str(tmp_path), loader=SlowModel, poll_interval=0, warmup=False)
+    assert registry.reload() is True
+    assert registry.reload() is False
+    release.set()
+    deadline = time.monotonic() + 5
+    while registry.current is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert registry.version == "v1"
+
+
+def test_warm_up_runs_on_a_real_model(recommender):
+    warm_up(recommender, n_users=8)
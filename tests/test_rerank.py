@@ -0,0 +1,48 @@
+import numpy as np
+
+from rerank import Reranker, codes
+
+
+def unit_vectors(n, factors=4):
+    return np.eye(n, factors, dtype=np.float32)
+
+
+def test_popularity_debias_moves_popular_items_down():
+    vectors = unit_vectors(2)
+    reranker = Reranker(vectors, popularity=np.array([100, 3]), mmr_lambda=1.0)
+    items = np.array([0, 1])
+    # Equal scores: the less popular item wins
+    assert reranker.rerank(items, [1.0, 1.0], k=2).tolist() == [1, 0]
+    # Negative scores are multiplied, so the popular item still goes down
+    assert reranker.rerank(items, [-1.0, -1.0], k=2).tolist() == [1, 0]
+
+
+def test_popularity_debias_is_stronger_for_cold_users():
+    reranker = Reranker(unit_vectors(2), popularity=np.array([100, 3]), mmr_lambda=1.0)
+    items, scores = np.array([0, 1]), [2.0, 1.0]
+    assert reranker.rerank(items, scores, k=2, n_interactions=10).tolist() == [0, 1]
+    assert reranker.rerank(items, scores, k=2, n_interactions=0).tolist() == [1, 0]
+
+
+def test_brand_cap_limits_then_relaxes():
+    brands = np.array([0, 0, 0, 1, 0])
+    reranker = Reranker(unit_vectors(5, 8), brands=brands, mmr_lambda=1.0, max_per_brand=2)
+    items, scores = np.arange(5), [5.0, 4.0, 3.0, 2.0, 1.0]
+    assert reranker.rerank(items, scores, k=3).tolist() == [0, 1, 3]
+    # Only brand 0 is left after three picks: the cap is relaxed to fill k
+    assert reranker.rerank(items, scores, k=5).tolist() == [0, 1, 3, 2, 4]
+
+
+def test_missing_brands_are_never_capped():
+    brands = codes(['', None, 'unknown', 'Olay', 'olay ', 'Olay'])
+    assert brands[:3].tolist() == [-1, -1, -1]
+    reranker = Reranker(unit_vectors(6, 8), brands=brands, mmr_lambda=1.0, max_per_brand=1)
+    assert reranker.rerank(np.arange(6), [6.0, 5.0, 4.0, 3.0, 2.0, 1.0], k=4).tolist() == [0, 1, 2, 3]
+
+
+def test_mmr_prefers_dissimilar_items():
+    vectors = np.array([[1, 0], [1, 0], [0, 1]], dtype=np.float32)
+    items, scores = np.arange(3), [1.0, 0.99, 0.9]
+    assert Reranker(vectors, mmr_lambda=1.0).rerank(items, scores, k=3).tolist() == [0, 1, 2]
+    # Item 1 duplicates item 0: diversity moves the orthogonal item ahead of it
+    assert Reranker(vectors, mmr_lambda=0.5).rerank(items, scores, k=3).tolist() == [0, 2, 1]
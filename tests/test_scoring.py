@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from scoring import ScoringEngine
+
+
+def reference(scores, k):
+    return np.argsort(scores, kind='stable')[::-1][:k]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_top_k_matches_argsort_with_ties(seed):
+    rng = np.random.default_rng(seed)
+    scores = rng.integers(0, 4, 60).astype(np.float32)
+    scores[rng.random(60) < 0.2] = -np.inf
+    for k in (1, 5, 17, 59, 60, 100):
+        np.testing.assert_array_equal(ScoringEngine.top_k(scores, k), reference(scores, k))
+
+
+def test_top_k_edge_cases():
+    scores = np.array([0.5, 2.0, 1.0], dtype=np.float32)
+    assert ScoringEngine.top_k(scores, 0).tolist() == []
+    assert ScoringEngine.top_k(scores, 10).tolist() == [1, 2, 0]
+
+
+def test_recommend_excludes_and_ranks_by_inner_product():
+    rng = np.random.default_rng(0)
+    item_factors = rng.normal(size=(50, 8)).astype(np.float32)
+    engine = ScoringEngine(item_factors)
+    user = rng.normal(size=8).astype(np.float32)
+    scores = item_factors.dot(user)
+    expected = [i for i in reference(scores, 50) if i not in (3, 7)][:5]
+    assert engine.recommend(user, k=5, exclude=np.array([3, 7])).tolist() == expected
+
+
+def test_batch_top_k_matches_single_rows():
+    rng = np.random.default_rng(1)
+    scores = rng.normal(size=(6, 40)).astype(np.float32)
+    indices, values = ScoringEngine.top_k_batch(scores, 7)
+    for row in range(6):
+        np.testing.assert_array_equal(indices[row], ScoringEngine.top_k(scores[row], 7))
+        np.testing.assert_array_equal(values[row], scores[row, indices[row]])
+
+
+def test_normalized_factors_keep_zero_rows():
+    engine = ScoringEngine(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    np.testing.assert_allclose(engine.item_factors_norm, [[0.6, 0.8], [0.0, 0.0]])
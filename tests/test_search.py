@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+
+from search import B, K1, PostingList, SearchIndex, decode_varints, encode_varints
+
+
+def records():
+    return [
+        {'asin': 'A', 'title': 'hydrating face serum', 'brand': 'Glow', 'main_cat': 'Skin', 'popularity': 10},
+        {'asin': 'B', 'title': 'serum serum serum for hair', 'brand': 'Mane', 'main_cat': 'Hair', 'popularity': 0},
+        {'asin': 'C', 'title': 'face moisturizer', 'brand': 'Glow', 'main_cat': 'Skin', 'popularity': 500},
+        {'asin': 'D', 'title': 'lip balm', 'brand': 'Kiss', 'main_cat': 'Makeup', 'popularity': 3},
+    ]
+
+
+def test_varint_round_trip():
+    short = [0, 1, 127, 128, 300]
+    long = [0, 1, 127, 128, 16383, 16384, 2 ** 21, 2 ** 35 + 7, 5, 0]
+    for values in (short, long, []):
+        buf = encode_varints(values)
+        assert decode_varints(buf).tolist() == values
+    # One byte below 128, two up to 2**14
+    assert len(encode_varints([127])) == 1 and len(encode_varints([128])) == 2
+    assert encode_varints(long[:5]) == encode_varints(np.array(long)[:5].tolist())
+
+
+def test_posting_list_appends_gaps():
+    posting = PostingList([2, 5], [1, 3])
+    posting.append(40, 2)
+    docs, freqs = posting.decode()
+    assert docs.tolist() == [2, 5, 40] and freqs.tolist() == [1, 3, 2] and posting.df == 3
+
+
+def test_bm25_ranking_without_popularity():
+    index = SearchIndex.build(records(), popularity_weight=0.0)
+    # Field-weighted lengths: title tokens count 2, brand tokens 3
+    assert index.lengths.tolist() == [9, 13, 7, 7]
+
+    avg = index.lengths.mean()
+    idf = math.log(1 + (4 - 2 + 0.5) / (2 + 0.5))
+
+    def bm25(length, tf):
+        return idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg))
+
+    # B repeats 'serum' three times in a longer title, A has it once in a shorter one
+    assert bm25(13, 6) > bm25(9, 2)
+    assert index.search("serum", prefix=False) == ['B', 'A']
+
+
+def test_every_token_must_match_and_prefix_expands():
+    index = SearchIndex.build(records(), popularity_weight=0.0)
+    assert index.search("face serum") == ['A']
+    assert index.search("face moist") == ['C']
+    assert index.search("face moist", prefix=False) == []
+    assert index.search("glow", main_cat='Skin') and index.search("glow", main_cat='Hair') == []
+
+
+def test_popularity_breaks_near_ties():
+    index = SearchIndex.build(records(), popularity_weight=1.0)
+    assert index.search("face")[0] == 'C'
+
+
+def test_add_and_replace():
+    index = SearchIndex.build(records())
+    assert index.add({'asin': 'E', 'title': 'vitamin serum', 'main_cat': 'Skin'})
+    assert 'E' in index.search("vitamin")
+    assert not index.add({'asin': 'E', 'title': 'other'})
+    assert index.add({'asin': 'E', 'title': 'night cream'}, replace=True)
+    assert index.search("vitamin") == [] and index.search("night") == ['E']
+    assert len(index) == 5